@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models.user import User, UserResponse
 from database import get_users_collection
@@ -12,9 +12,14 @@ import os
 SECRET_KEY = os.getenv("SECRET_KEY", "macedo-si-secret-key-2025")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
+# EventSource cannot send headers, so the SSE stream takes a token in the
+# query string; it is scoped to the stream and short-lived since URLs end up in logs
+STREAM_TOKEN_SCOPE = "events"
+STREAM_TOKEN_EXPIRE_SECONDS = 60
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -50,8 +55,15 @@ async def authenticate_user(email: str, password: str) -> Optional[User]:
     
     return user
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserResponse:
-    """Get current authenticated user"""
+def create_stream_token(user: UserResponse) -> str:
+    """Create a short-lived token accepted only by the events stream"""
+    return create_access_token(
+        {"sub": user.email, "scope": STREAM_TOKEN_SCOPE},
+        timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    )
+
+async def user_from_token(token: str, scope: Optional[str] = None) -> UserResponse:
+    """Active user of a JWT issued for `scope` (None for access tokens)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -59,9 +71,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     )
     
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
@@ -74,6 +86,25 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     return UserResponse(**user_data)
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserResponse:
+    """Get current authenticated user"""
+    return await user_from_token(credentials.credentials)
+
+async def get_stream_user(
+    token: Optional[str] = Query(None, description="Token from POST /events/token, for EventSource"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> UserResponse:
+    """User of the events stream: Bearer header or a stream token in the query string"""
+    if credentials:
+        return await user_from_token(credentials.credentials)
+    if token:
+        return await user_from_token(token, STREAM_TOKEN_SCOPE)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 async def get_admin_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
     """Ensure current user is admin"""
     if current_user.role != "admin":
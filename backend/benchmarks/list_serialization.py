@@ -0,0 +1,115 @@
+"""Cost of turning stored contas a receber into a list response
+(what GET /financial/contas-receber does after the query).
+
+Paths compared:
+  validating  Model(**doc) per row, response_model validation, stdlib JSONResponse
+  orjson      the same through FastResponse, the app's default response class
+  trusted     one batched TypeAdapter validation, one dump_json
+  msgpack     trusted, negotiated with Accept: application/msgpack
+
+No Mongo needed: documents are shaped as they come back from the driver,
+dates included as midnight datetimes.
+
+    cd backend && python benchmarks/list_serialization.py [rows] [repeat]
+"""
+import asyncio
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+import msgpack
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models.financial import ContaReceber, HistoricoAction
+from responses import MSGPACK_MEDIA_TYPE, FastResponse, response_format
+from trusted import list_response, load_many
+
+def stored_contas(rows: int) -> List[dict]:
+    base = datetime(2025, 1, 1)
+    docs = []
+    for i in range(rows):
+        conta = ContaReceber(
+            empresa_id=f"empresa-{i % 50}",
+            empresa=f"Empresa {i % 50} Ltda",
+            situacao="pago" if i % 3 else "em_aberto",
+            descricao="Honorários contábeis",
+            documento=f"NF-{i:06d}",
+            forma_pagamento="boleto",
+            conta="Banco do Brasil",
+            centro_custo="Contabilidade",
+            plano_custo="Receitas de serviços",
+            data_emissao=(base + timedelta(days=i % 300)).date(),
+            data_vencimento=(base + timedelta(days=i % 300 + 30)).date(),
+            data_recebimento=(base + timedelta(days=i % 300 + 28)).date() if i % 3 else None,
+            valor_original=1500.0 + i,
+            cidade_atendimento="jacobina",
+            total_bruto=1500.0 + i,
+            total_liquido=1500.0 + i,
+            usuario_responsavel="financeiro",
+            historico=[
+                HistoricoAction(data=base, acao="Conta criada", usuario="financeiro"),
+                HistoricoAction(data=base, acao="Baixa realizada", usuario="financeiro", valor=1500.0 + i)
+            ]
+        )
+        doc = conta.model_dump()
+        for field in ("data_emissao", "data_vencimento", "data_recebimento"):
+            if doc[field] is not None:
+                doc[field] = datetime.combine(doc[field], datetime.min.time())
+        docs.append(doc)
+    return docs
+
+response_field = create_response_field(name="response", type_=List[ContaReceber])
+
+async def validating(docs: List[dict]) -> bytes:
+    contas = [ContaReceber(**doc) for doc in docs]
+    content = await serialize_response(field=response_field, response_content=contas)
+    return JSONResponse(content).body
+
+async def validating_orjson(docs: List[dict]) -> bytes:
+    contas = [ContaReceber(**doc) for doc in docs]
+    content = await serialize_response(field=response_field, response_content=contas)
+    return FastResponse(content).body
+
+async def trusted(docs: List[dict]) -> bytes:
+    contas = load_many(ContaReceber, docs)
+    return list_response(ContaReceber, contas).body
+
+async def trusted_msgpack(docs: List[dict]) -> bytes:
+    token = response_format.set(MSGPACK_MEDIA_TYPE)
+    try:
+        return await trusted(docs)
+    finally:
+        response_format.reset(token)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    docs = stored_contas(rows)
+
+    loop = asyncio.new_event_loop()
+    paths = {"validating": validating, "orjson": validating_orjson, "trusted": trusted, "msgpack": trusted_msgpack}
+    bodies = {name: loop.run_until_complete(path(docs)) for name, path in paths.items()}
+    # Same payload on every path
+    expected = json.loads(bodies["validating"])
+    assert json.loads(bodies["orjson"]) == expected
+    assert json.loads(bodies["trusted"]) == expected
+    assert msgpack.unpackb(bodies["msgpack"]) == expected
+
+    print(f"{rows} contas a receber, best of 5 x {repeat} runs")
+    baseline = None
+    for name, path in paths.items():
+        best = min(timeit.repeat(lambda: loop.run_until_complete(path(docs)), number=repeat, repeat=5)) / repeat
+        baseline = baseline or best
+        print(f"  {name:<12} {best * 1000:8.2f} ms/response  {1 / best:7.0f} responses/s  "
+              f"{baseline / best:5.2f}x  {len(bodies[name])} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson.codec_options import CodecOptions, TypeEncoder, TypeRegistry
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from typing import List, Optional, Tuple, Union
+from datetime import date, datetime
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -10,6 +15,15 @@ load_dotenv(ROOT_DIR / '.env')
 MONGO_URL = os.environ['MONGO_URL']
 DB_NAME = os.environ['DB_NAME']
 
+class DateEncoder(TypeEncoder):
+    """Store date fields as midnight datetimes so they can be range-queried"""
+    python_type = date
+
+    def transform_python(self, value):
+        return datetime.combine(value, datetime.min.time())
+
+CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([DateEncoder()]))
+
 class Database:
     client: AsyncIOMotorClient = None
     database = None
@@ -22,9 +36,131 @@ async def get_database() -> AsyncIOMotorClient:
 async def connect_to_mongo():
     """Create database connection"""
     db.client = AsyncIOMotorClient(MONGO_URL)
-    db.database = db.client[DB_NAME]
+    db.database = db.client.get_database(DB_NAME, codec_options=CODEC_OPTIONS)
     print(f"Connected to MongoDB: {DB_NAME}")
 
+async def create_indexes():
+    """Create the indexes the hot read paths rely on"""
+    database = await get_database()
+    await database.users.create_index("id", unique=True)
+    await database.users.create_index("updated_at")
+    await database.tasks.create_index("id", unique=True)
+    await database.tasks.create_index([("data_prazo", 1), ("status", 1)])
+    await database.tasks.create_index(
+        "idempotency_key", unique=True,
+        partialFilterExpression={"idempotency_key": {"$type": "string"}}
+    )
+    await database.task_templates.create_index("id", unique=True)
+    await database.fiscal.create_index("id", unique=True)
+    await database.fiscal.create_index(
+        "chave", unique=True,
+        partialFilterExpression={"chave": {"$type": "string"}}
+    )
+    await database.fiscal.create_index([("status", 1), ("vencimento", 1)])
+    await database.fiscal.create_index([("empresa_id", 1), ("status", 1)])
+    await database.clients.create_index("cidade")
+    await database.trabalhista.create_index([("empresa_id", 1), ("status", 1), ("prazo", 1)])
+    await database.trabalhista.create_index(
+        [("empresa_id", 1), ("funcionario.cpf", 1), ("data_solicitacao", 1)],
+        partialFilterExpression={"funcionario.cpf": {"$exists": True}}
+    )
+    await database.funcionarios.create_index("id", unique=True)
+    await database.funcionarios.create_index([("empresa_id", 1), ("cpf", 1)], unique=True)
+    await database.funcionarios.create_index([("empresa_id", 1), ("status", 1)])
+    await database.funcionarios.create_index("cpf")
+    await database.atendimento.create_index([("status", 1), ("sla", 1)])
+    await database.atendimento.create_index([("responsavel_id", 1), ("status", 1)])
+    await database.atendimento.create_index("created_at")
+    await database.atendimento.create_index("updated_at")
+    await database.atendimento.create_index("primeira_resposta_em", sparse=True)
+    await database.atendimento.create_index("resolvido_em", sparse=True)
+    await database.atendimento_rollups.create_index([("dia", 1), ("canal", 1), ("responsavel", 1)], unique=True)
+    await database.atendimento.create_index([("remetente", 1), ("status", 1)], sparse=True)
+    await database.configuracoes.create_index([("setor", 1), ("nome", 1), ("updated_at", -1)])
+    await database.atendimento_conversas.create_index([("ticket_id", 1), ("data", -1), ("id", -1)])
+    await database.atendimento_conversas.create_index("id", unique=True)
+    await database.atendimento_conversas.create_index(
+        "externo_id", unique=True,
+        partialFilterExpression={"externo_id": {"$type": "string"}}
+    )
+    await database.receitas.create_index([("empresa_id", 1), ("competencia", 1)], unique=True)
+    await database.task_reminders.create_index(
+        [("task_id", 1), ("data_prazo", 1), ("dias_restantes", 1)], unique=True
+    )
+    await database.task_reminders.create_index([("usuario_id", 1), ("created_at", -1)])
+
+async def migrate_embedded_conversas() -> int:
+    """Move conversas still embedded in tickets to atendimento_conversas,
+    counting them in conversas_count. Safe to rerun and to run on several
+    workers at once; returns the number of tickets migrated"""
+    database = await get_database()
+    migrated = 0
+    async for ticket_data in database.atendimento.find({"conversas": {"$exists": True}}, {"_id": 0, "id": 1, "conversas": 1}):
+        conversas = [
+            {**conversa, "id": conversa.get("id") or f"{ticket_data['id']}:{index}", "ticket_id": ticket_data["id"]}
+            for index, conversa in enumerate(ticket_data["conversas"] or [])
+        ]
+        await insert_many_idempotent(database.atendimento_conversas, conversas)
+        update = {"$inc": {"conversas_count": len(conversas)}, "$unset": {"conversas": ""}}
+        datas = [conversa["data"] for conversa in conversas if conversa.get("data")]
+        if datas:
+            update["$max"] = {"last_interaction_at": max(datas)}
+        # Messages are inserted idempotently above; the filter makes the count happen once
+        result = await database.atendimento.update_one({"id": ticket_data["id"], "conversas": {"$exists": True}}, update)
+        migrated += result.modified_count
+    return migrated
+
+async def insert_many_idempotent(collection, documents: List[dict]) -> List[dict]:
+    """Bulk insert skipping documents that hit a unique index; returns the inserted ones"""
+    if not documents:
+        return []
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if any(error["code"] != 11000 for error in write_errors):
+            raise
+        duplicated = {error["index"] for error in write_errors}
+        return [doc for index, doc in enumerate(documents) if index not in duplicated]
+    return documents
+
+async def find_one_and_update_checked(
+    collection,
+    query: dict,
+    update: Optional[Union[dict, list]],
+    conditions: Optional[dict] = None,
+    return_document: bool = ReturnDocument.AFTER,
+    projection: Optional[dict] = None
+) -> Tuple[Optional[dict], bool]:
+    """Conditional atomic update in one round trip.
+
+    `conditions` (access check, expected state) are folded into the filter so
+    a document that fails them is never written. Returns (document, True)
+    on success. Only when nothing matched, a lookup on `query` alone tells a
+    missing document (None, False) from one that failed the conditions
+    (None, True). An empty update reads the document under the same filter.
+    `return_document` is ReturnDocument.BEFORE or AFTER, which pymongo
+    defines as bools.
+    """
+    full_query = {"$and": [query, conditions]} if conditions else query
+    if update:
+        document = await collection.find_one_and_update(
+            full_query, update, projection=projection, return_document=return_document
+        )
+    else:
+        document = await collection.find_one(full_query, projection)
+    if document is not None:
+        return document, True
+    if not conditions:
+        return None, False
+    return None, await collection.count_documents(query, limit=1) > 0
+
+async def get_client_cidade(empresa_id: str) -> Optional[str]:
+    """Cidade of a client, whose municipal holidays its due dates skip"""
+    clients_collection = await get_clients_collection()
+    client_data = await clients_collection.find_one({"id": empresa_id}, {"_id": 0, "cidade": 1})
+    return client_data.get("cidade") if client_data else None
+
 async def close_mongo_connection():
     """Close database connection"""
     if db.client:
@@ -70,4 +206,40 @@ async def get_chats_collection():
 
 async def get_tasks_collection():
     database = await get_database()
-    return database.tasks
\ No newline at end of file
+    return database.tasks
+
+async def get_task_reminders_collection():
+    database = await get_database()
+    return database.task_reminders
+
+async def get_task_templates_collection():
+    database = await get_database()
+    return database.task_templates
+
+async def get_receitas_collection():
+    database = await get_database()
+    return database.receitas
+
+async def get_funcionarios_collection():
+    database = await get_database()
+    return database.funcionarios
+
+async def get_atendimento_conversas_collection():
+    database = await get_database()
+    return database.atendimento_conversas
+
+async def get_atendimento_rollups_collection():
+    database = await get_database()
+    return database.atendimento_rollups
+
+async def get_configuracoes_versao_collection():
+    database = await get_database()
+    return database.configuracoes_versao
+
+async def get_cache_versoes_collection():
+    database = await get_database()
+    return database.cache_versoes
+
+async def get_atendimento_inbound_falhas_collection():
+    database = await get_database()
+    return database.atendimento_inbound_falhas
\ No newline at end of file
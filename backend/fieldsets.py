@@ -0,0 +1,61 @@
+from functools import lru_cache
+from typing import Any, Callable, FrozenSet, List, Optional, Type
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel, create_model
+
+from trusted import STRICT_READS, list_response, load_many
+
+# Returned even when not asked for: the frontend keys rows by id
+ALWAYS_INCLUDED = frozenset({"id"})
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], fields: FrozenSet[str]) -> Type[BaseModel]:
+    """Model with only `fields` of `model`, built once per combination"""
+    definitions = {
+        name: (info.annotation, info)
+        for name, info in model.model_fields.items()
+        if name in fields
+    }
+    return create_model(f"{model.__name__}Fields", **definitions)
+
+class Fieldset:
+    """Top-level fields requested through ?fields= on a list route"""
+
+    def __init__(self, model: Type[BaseModel], fields: Optional[FrozenSet[str]] = None):
+        self.fields = fields
+        self.model = partial_model(model, fields) if fields else model
+
+    def load(self, docs: List[dict]) -> List[BaseModel]:
+        return load_many(self.model, docs)
+
+    def projection(self, default: Optional[dict] = None) -> Optional[dict]:
+        """Mongo projection of the requested fields, `default` when all are wanted"""
+        if not self.fields:
+            return default
+        return {"_id": 0, **{name: 1 for name in sorted(self.fields)}}
+
+    def response(self, items: List[BaseModel], key: Optional[str] = None, **meta: Any):
+        """Items serialized once with the (partial) model; the route's
+        response_model would validate them again and reject partial ones.
+        `key` and `meta` build a paged payload, {key: items, **meta}."""
+        if STRICT_READS and not self.fields:
+            return {key: items, **meta} if key else items
+        return list_response(self.model, items, key, **meta)
+
+def fieldset(model: Type[BaseModel]) -> Callable[..., Fieldset]:
+    """Dependency parsing ?fields=a,b,c against the fields of `model`"""
+    def dependency(
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return")
+    ) -> Fieldset:
+        if not fields:
+            return Fieldset(model)
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = names - model.model_fields.keys()
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+        return Fieldset(model, frozenset(names | (ALWAYS_INCLUDED & model.model_fields.keys())))
+    return dependency
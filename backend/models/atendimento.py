@@ -4,9 +4,17 @@ from datetime import datetime, date
 import uuid
 
 class Conversa(BaseModel):
-    data: datetime
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    ticket_id: Optional[str] = None
+    data: datetime = Field(default_factory=datetime.utcnow)
+    usuario_id: Optional[str] = None
     usuario: str
     mensagem: str
+    # Provider message id of inbound messages, used to drop redelivered webhooks
+    externo_id: Optional[str] = None
+
+class ConversaCreate(BaseModel):
+    mensagem: str = Field(..., min_length=1)
 
 class Ticket(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -17,10 +25,24 @@ class Ticket(BaseModel):
     prioridade: str = Field(..., pattern="^(baixa|media|alta|urgente)$")
     status: str = Field(..., pattern="^(aberto|em_andamento|resolvido|fechado|aguardando_cliente)$")
     responsavel: str
+    responsavel_id: Optional[str] = None
+    cidade: Optional[str] = None
+    # Phone/e-mail of tickets opened by inbound whatsapp/email messages
+    remetente: Optional[str] = None
     canal: str = Field(..., pattern="^(telefone|email|whatsapp|chat|presencial)$")
     data_abertura: date
     sla: datetime
+    sla_violado: bool = False
+    sla_violado_em: Optional[datetime] = None
+    primeira_resposta_em: Optional[datetime] = None
+    # First resolution; kept when the ticket is reopened
+    resolvido_em: Optional[datetime] = None
+    # Open tickets of the same empresa with a near-identical titulo/descricao
+    possiveis_duplicados: List[str] = []
+    # Legacy embedded thread; new messages live in atendimento_conversas
     conversas: List[Conversa] = []
+    conversas_count: int = 0
+    last_interaction_at: Optional[datetime] = None
     arquivos: List[str] = []
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -31,7 +53,9 @@ class TicketCreate(BaseModel):
     titulo: str
     descricao: str
     prioridade: str = Field(default="media", pattern="^(baixa|media|alta|urgente)$")
-    responsavel: str
+    # Both omitted: assigned to the least-loaded agent of the client's city
+    responsavel: Optional[str] = None
+    responsavel_id: Optional[str] = None
     canal: str = Field(..., pattern="^(telefone|email|whatsapp|chat|presencial)$")
     data_abertura: date
 
@@ -40,4 +64,14 @@ class TicketUpdate(BaseModel):
     descricao: Optional[str] = None
     prioridade: Optional[str] = None
     status: Optional[str] = None
-    responsavel: Optional[str] = None
\ No newline at end of file
+    responsavel: Optional[str] = None
+    responsavel_id: Optional[str] = None
+
+class InboundMessage(BaseModel):
+    canal: str = Field(..., pattern="^(whatsapp|email)$")
+    remetente: str
+    mensagem: str
+    assunto: Optional[str] = None
+    nome: Optional[str] = None
+    externo_id: Optional[str] = None
+    recebido_em: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
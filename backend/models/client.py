@@ -30,6 +30,7 @@ class Client(BaseModel):
     tipo_empresa: str = Field(..., pattern="^(matriz|filial)$")
     endereco: Address
     tipo_regime: str = Field(..., pattern="^(simples|lucro_presumido|lucro_real|mei)$")
+    anexo_simples: Optional[str] = Field(default=None, pattern="^(I|II|III|IV|V)$")
     empresa_grupo: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -50,6 +51,7 @@ class ClientCreate(BaseModel):
     tipo_empresa: str = Field(..., pattern="^(matriz|filial)$")
     endereco: Address
     tipo_regime: str = Field(..., pattern="^(simples|lucro_presumido|lucro_real|mei)$")
+    anexo_simples: Optional[str] = Field(default=None, pattern="^(I|II|III|IV|V)$")
     empresa_grupo: Optional[str] = None
 
 class ClientUpdate(BaseModel):
@@ -68,4 +70,5 @@ class ClientUpdate(BaseModel):
     tipo_empresa: Optional[str] = None
     endereco: Optional[Address] = None
     tipo_regime: Optional[str] = None
+    anexo_simples: Optional[str] = None
     empresa_grupo: Optional[str] = None
\ No newline at end of file
@@ -9,6 +9,8 @@ class Configuracoes(BaseModel):
     nome: str
     configuracoes: Dict[str, Any]
     updated_by: str
+    # Incremented on every update; exposed as the ETag
+    versao: int = 1
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
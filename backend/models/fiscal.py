@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime, date
 import uuid
 
@@ -17,6 +17,9 @@ class ObrigacaoFiscal(BaseModel):
     observacoes: Optional[str] = None
     valor: Optional[float] = None
     data_entrega: Optional[date] = None
+    periodo: Optional[str] = None
+    chave: Optional[str] = None
+    sped_resumo: Optional[Dict[str, Any]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -40,4 +43,24 @@ class ObrigacaoFiscalUpdate(BaseModel):
     responsavel: Optional[str] = None
     observacoes: Optional[str] = None
     valor: Optional[float] = None
-    data_entrega: Optional[date] = None
\ No newline at end of file
+    data_entrega: Optional[date] = None
+
+class CalendarioFiscalRequest(BaseModel):
+    ano: Optional[int] = Field(default=None, ge=2000, le=2100)
+    competencia: Optional[str] = Field(default=None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
+
+class ReceitaMensal(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    empresa_id: str
+    competencia: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
+    valor: float = Field(..., ge=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ReceitaMensalCreate(BaseModel):
+    empresa_id: str
+    competencia: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
+    valor: float = Field(..., ge=0)
+
+class CalculoPgdasRequest(BaseModel):
+    competencia: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
\ No newline at end of file
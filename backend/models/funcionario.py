@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime, date
+import uuid
+
+class EventoFuncionario(BaseModel):
+    solicitacao_id: str
+    tipo: str = Field(..., pattern="^(admissao|demissao)$")
+    data: date
+
+class Funcionario(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    empresa_id: str
+    empresa: str
+    cpf: str
+    nome: str
+    funcao: str
+    salario: Optional[float] = None
+    dependentes: int = 0
+    data_admissao: Optional[date] = None
+    data_demissao: Optional[date] = None
+    motivo_demissao: Optional[str] = None
+    status: str = Field(..., pattern="^(ativo|desligado)$")
+    historico: List[EventoFuncionario] = []
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
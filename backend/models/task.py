@@ -28,6 +28,11 @@ class Task(BaseModel):
     comentarios: List[TaskComment] = []
     tags: List[str] = []
     arquivos: List[str] = []
+    empresa_id: Optional[str] = None
+    empresa: Optional[str] = None
+    template_id: Optional[str] = None
+    competencia: Optional[str] = None
+    idempotency_key: Optional[str] = None
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class TaskCreate(BaseModel):
@@ -47,4 +52,47 @@ class TaskUpdate(BaseModel):
     responsavel_id: Optional[str] = None
     data_prazo: Optional[date] = None
     progresso: Optional[int] = None
-    tags: Optional[List[str]] = None
\ No newline at end of file
+    tags: Optional[List[str]] = None
+
+class TaskReminder(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    task_id: str
+    usuario_id: str
+    titulo: str
+    data_prazo: date
+    dias_restantes: int
+    lida: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TaskTemplateItem(BaseModel):
+    titulo: str
+    descricao: Optional[str] = None
+    prioridade: str = Field(default="media", pattern="^(baixa|media|alta|urgente)$")
+    dia_prazo: Optional[int] = Field(default=None, ge=1, le=31)
+    tags: List[str] = []
+
+class TaskTemplate(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    nome: str
+    descricao: Optional[str] = None
+    categoria: str = Field(..., pattern="^(comercial|financeiro|trabalhista|fiscal|contabil|atendimento)$")
+    itens: List[TaskTemplateItem]
+    criador_id: str
+    ativo: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TaskTemplateCreate(BaseModel):
+    nome: str
+    descricao: Optional[str] = None
+    categoria: str = Field(..., pattern="^(comercial|financeiro|trabalhista|fiscal|contabil|atendimento)$")
+    itens: List[TaskTemplateItem] = Field(..., min_length=1)
+
+class TaskTemplateTarget(BaseModel):
+    responsavel_id: str
+    empresa_id: Optional[str] = None
+    empresa: Optional[str] = None
+
+class TaskTemplateInstantiate(BaseModel):
+    competencia: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
+    alvos: List[TaskTemplateTarget] = Field(..., min_length=1)
\ No newline at end of file
@@ -10,12 +10,16 @@ class FuncionarioData(BaseModel):
     salario: Optional[float] = None
     data_admissao: Optional[date] = None
     motivo_demissao: Optional[str] = None
+    dependentes: int = Field(0, ge=0)
 
 class DetalheFolha(BaseModel):
     total_funcionarios: int
     total_proventos: float
     total_descontos: float
     total_liquido: float
+    total_inss: Optional[float] = None
+    total_irrf: Optional[float] = None
+    total_fgts: Optional[float] = None
 
 class SolicitacaoTrabalhista(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -54,4 +58,10 @@ class SolicitacaoTrabalhistaUpdate(BaseModel):
     status: Optional[str] = None
     observacoes: Optional[str] = None
     funcionario: Optional[FuncionarioData] = None
-    detalhes: Optional[DetalheFolha] = None
\ No newline at end of file
+    detalhes: Optional[DetalheFolha] = None
+
+class CalculoFolhaRequest(BaseModel):
+    competencia: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
+
+class LoteEsocialRequest(BaseModel):
+    competencia: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
\ No newline at end of file
@@ -0,0 +1,105 @@
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any
+
+import msgpack
+import orjson
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Set per request by NegotiationMiddleware from the Accept header
+response_format: ContextVar[str] = ContextVar("response_format", default=JSON_MEDIA_TYPE)
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__} to msgpack")
+
+def _quality(accept: str, media_type: str) -> float:
+    """q of `media_type` under the most specific matching Accept range (0 when none)"""
+    main_type = media_type.split("/")[0]
+    best_specificity, best_q = -1, 0.0
+    for media_range in accept.split(","):
+        name, *params = [part.strip() for part in media_range.split(";")]
+        name = name.lower()
+        if name == media_type:
+            specificity = 2
+        elif name == f"{main_type}/*":
+            specificity = 1
+        elif name == "*/*":
+            specificity = 0
+        else:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if specificity > best_specificity:
+            best_specificity, best_q = specificity, q
+    return best_q
+
+def negotiate(accept: str) -> str:
+    """MessagePack only when preferred over JSON; JSON on ties and by default"""
+    if not accept:
+        return JSON_MEDIA_TYPE
+    msgpack_q = _quality(accept, MSGPACK_MEDIA_TYPE)
+    if msgpack_q > 0 and msgpack_q > _quality(accept, JSON_MEDIA_TYPE):
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+def wants_msgpack() -> bool:
+    return response_format.get() == MSGPACK_MEDIA_TYPE
+
+def render(content: Any) -> bytes:
+    """Body in the negotiated format"""
+    if wants_msgpack():
+        return msgpack.packb(content, default=_msgpack_default)
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+class FastResponse(JSONResponse):
+    """Default response class: orjson or MessagePack when the client asked
+    for it with Accept.
+
+    Only the encoding step: routes returning models or dicts still go
+    through FastAPI's jsonable_encoder first, so dates arrive as strings.
+    List routes skip both through trusted.list_response.
+    """
+
+    def __init__(self, content: Any = None, *args, **kwargs):
+        # Response.__init__ renders the body and then builds the headers from media_type
+        self.media_type = response_format.get()
+        super().__init__(content, *args, **kwargs)
+        self.headers["Vary"] = "Accept"
+
+    def render(self, content: Any) -> bytes:
+        return render(content)
+
+class NegotiationMiddleware:
+    """Picks the response format of the request from its Accept header.
+
+    Plain ASGI so the context variable is set in the task that runs the
+    endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = Headers(scope=scope).get("accept", "")
+        token = response_format.set(negotiate(accept))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            response_format.reset(token)
@@ -1,13 +1,31 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Header
 from typing import List, Optional
-from models.atendimento import Ticket, TicketCreate, TicketUpdate
+from models.atendimento import Ticket, TicketCreate, TicketUpdate, Conversa, ConversaCreate
 from models.user import UserResponse
-from auth import get_current_user
-from database import get_atendimento_collection
+from auth import get_current_user, get_admin_user
+from fieldsets import Fieldset, fieldset
+from database import (
+    get_atendimento_collection, get_atendimento_conversas_collection, get_clients_collection,
+    find_one_and_update_checked
+)
+from pymongo import ReturnDocument
+from services.events import event_bus, ticket_event
+from services.sla import calcular_sla, carregar_config_sla, sla_monitor
+from services.atendimento_stats import get_atendimento_stats, MAX_DIAS
+from services.assignment import assignment_service
+from services.ticket_dedup import ticket_dedup, signature, ticket_text
+from services.inbound import PROVIDERS, inbound_queue, reprocessar_falhas
+from services.user_directory import user_directory
 from datetime import datetime
+import hmac
+import os
 
 router = APIRouter(prefix="/atendimento", tags=["Atendimento"])
 
+RESOLVED_STATUS = ["resolvido", "fechado"]
+
+INBOUND_WEBHOOK_TOKEN = os.getenv("INBOUND_WEBHOOK_TOKEN")
+
 def check_atendimento_access(user: UserResponse):
     """Check if user has access to atendimento module"""
     if user.role != "admin" and "atendimento" not in user.allowed_sectors:
@@ -16,6 +34,16 @@ def check_atendimento_access(user: UserResponse):
             detail="Access to atendimento module not allowed"
         )
 
+async def resolve_responsavel_nome(responsavel_id: str) -> str:
+    """Get the name of a responsavel, rejecting unknown users"""
+    entries = await user_directory.resolve([responsavel_id])
+    if responsavel_id not in entries:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Responsável não encontrado"
+        )
+    return entries[responsavel_id].name
+
 @router.post("/", response_model=Ticket)
 async def create_ticket(
     ticket_data: TicketCreate,
@@ -25,18 +53,101 @@ async def create_ticket(
     check_atendimento_access(current_user)
     atendimento_collection = await get_atendimento_collection()
     
-    # Calculate SLA (24 hours from now)
-    sla = datetime.utcnow().replace(hour=23, minute=59, second=59)
+    # The client's city picks the agent pool and the holiday calendar
+    clients_collection = await get_clients_collection()
+    client_data = await clients_collection.find_one({"id": ticket_data.empresa_id}, {"_id": 0, "cidade": 1})
+    cidade = client_data.get("cidade") if client_data else None
+    
+    if ticket_data.responsavel_id:
+        ticket_data.responsavel = await resolve_responsavel_nome(ticket_data.responsavel_id)
+    elif not ticket_data.responsavel:
+        agent = assignment_service.pick(cidade)
+        if agent is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Nenhum atendente disponível para a cidade do cliente"
+            )
+        ticket_data.responsavel_id, ticket_data.responsavel = agent
+    
+    # SLA target per prioridade, counted in business hours
+    now = datetime.utcnow()
+    sla = calcular_sla(now, ticket_data.prioridade, await carregar_config_sla(), cidade)
+    
+    # Near-duplicates among the company's open tickets (LSH lookup)
+    assinatura = signature(ticket_text(ticket_data.model_dump()))
     
     ticket = Ticket(
         **ticket_data.model_dump(),
+        cidade=cidade,
         status="aberto",
-        sla=sla
+        sla=sla,
+        possiveis_duplicados=ticket_dedup.query(ticket_data.empresa_id, assinatura),
+        created_at=now,
+        updated_at=now
     )
     
     await atendimento_collection.insert_one(ticket.model_dump())
+    sla_monitor.schedule(ticket.model_dump())
+    assignment_service.track(ticket.model_dump())
+    ticket_dedup.add(ticket.model_dump(), assinatura)
+    await event_bus.publish(ticket_event("ticket.created", ticket.model_dump()))
     return ticket
 
+@router.post("/inbound/{provider}", status_code=status.HTTP_202_ACCEPTED)
+async def receive_inbound(
+    provider: str,
+    request: Request,
+    x_webhook_token: Optional[str] = Header(None)
+):
+    """Webhook for inbound whatsapp/email messages; tickets are created in batches"""
+    if not INBOUND_WEBHOOK_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Inbound webhook not configured"
+        )
+    if not x_webhook_token or not hmac.compare_digest(x_webhook_token, INBOUND_WEBHOOK_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid webhook token"
+        )
+    
+    parser = PROVIDERS.get(provider)
+    if parser is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Provider not found"
+        )
+    
+    try:
+        messages = parser(await request.json())
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Payload inválido"
+        )
+    
+    # Would never fit, retrying cannot help
+    if len(messages) > inbound_queue.maxsize:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Payload com mais de {inbound_queue.maxsize} mensagens"
+        )
+    
+    # Backpressure: the provider retries later instead of piling up in memory
+    if not inbound_queue.offer(messages):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Fila de mensagens cheia",
+            headers={"Retry-After": "1"}
+        )
+    
+    return {"recebidas": len(messages)}
+
+@router.post("/inbound/falhas/reprocessar", dependencies=[Depends(get_admin_user)])
+async def reprocess_inbound_failures():
+    """Replay inbound batches that failed to be written (admin only)"""
+    return await reprocessar_falhas()
+
 @router.get("/", response_model=List[Ticket])
 async def get_tickets(
     current_user: UserResponse = Depends(get_current_user),
@@ -44,7 +155,8 @@ async def get_tickets(
     prioridade: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500)
+    limit: int = Query(100, ge=1, le=500),
+    fields: Fieldset = Depends(fieldset(Ticket))
 ):
     """Get tickets with filters"""
     check_atendimento_access(current_user)
@@ -69,12 +181,20 @@ async def get_tickets(
             {"descricao": {"$regex": search, "$options": "i"}}
         ]
     
-    tickets_cursor = atendimento_collection.find(query).skip(skip).limit(limit).sort("data_abertura", -1)
-    tickets = []
-    async for ticket_data in tickets_cursor:
-        tickets.append(Ticket(**ticket_data))
+    # The thread is served by /{ticket_id}/conversas
+    tickets_cursor = atendimento_collection.find(query, fields.projection({"conversas": 0})).skip(skip).limit(limit).sort("data_abertura", -1)
+    tickets = fields.load(await tickets_cursor.to_list(length=None))
     
-    return tickets
+    return fields.response(tickets)
+
+@router.get("/stats")
+async def get_stats(
+    current_user: UserResponse = Depends(get_current_user),
+    dias: int = Query(30, ge=1, le=MAX_DIAS)
+):
+    """Get atendimento statistics per canal and responsavel"""
+    check_atendimento_access(current_user)
+    return await get_atendimento_stats(dias)
 
 @router.get("/{ticket_id}", response_model=Ticket)
 async def get_ticket(
@@ -104,23 +224,146 @@ async def update_ticket(
     check_atendimento_access(current_user)
     atendimento_collection = await get_atendimento_collection()
     
-    # Check if ticket exists
-    existing_ticket = await atendimento_collection.find_one({"id": ticket_id})
-    if not existing_ticket:
+    # Update fields
+    update_data = ticket_update.model_dump(exclude_unset=True)
+    if update_data.get("responsavel_id"):
+        update_data["responsavel"] = await resolve_responsavel_nome(update_data["responsavel_id"])
+    elif update_data.get("responsavel"):
+        # Free-text responsavel is not an agent the assignment service can count
+        update_data["responsavel_id"] = None
+    expected = None
+    if update_data.get("prioridade"):
+        # The SLA needs the opening time and city: the only update path that reads first
+        current_ticket = await atendimento_collection.find_one(
+            {"id": ticket_id}, {"_id": 0, "prioridade": 1, "created_at": 1, "cidade": 1}
+        )
+        if not current_ticket:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Ticket not found"
+            )
+        if update_data["prioridade"] != current_ticket["prioridade"]:
+            # Re-prioritized tickets keep their opening time as the SLA start
+            update_data["sla"] = calcular_sla(
+                current_ticket["created_at"], update_data["prioridade"], await carregar_config_sla(),
+                current_ticket.get("cidade")
+            )
+            update_data["sla_violado"] = False
+            update_data["sla_violado_em"] = None
+            expected = {"prioridade": current_ticket["prioridade"]}
+    update = None
+    if update_data:
+        now = datetime.utcnow()
+        update_data["updated_at"] = now
+        update_fields = {field: {"$literal": value} for field, value in update_data.items()}
+        if update_data.get("status") in RESOLVED_STATUS:
+            # Only the first resolution counts for the stats: a reopened
+            # ticket keeps it, and resolving it again does not move it
+            update_fields["resolvido_em"] = {"$ifNull": ["$resolvido_em", now]}
+        update = [{"$set": update_fields}]
+    
+    updated_ticket_data, found = await find_one_and_update_checked(
+        atendimento_collection,
+        {"id": ticket_id},
+        update,
+        expected
+    )
+    if not updated_ticket_data:
+        if found:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ticket priority changed concurrently, try again"
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ticket not found"
         )
     
-    # Update fields
-    update_data = ticket_update.model_dump(exclude_unset=True)
-    if update_data:
-        update_data["updated_at"] = datetime.utcnow()
+    sla_monitor.schedule(updated_ticket_data)
+    assignment_service.track(updated_ticket_data)
+    ticket_dedup.track(updated_ticket_data)
+    await event_bus.publish(ticket_event("ticket.updated", updated_ticket_data))
+    return Ticket(**updated_ticket_data)
+
+@router.post("/{ticket_id}/conversas", response_model=Conversa)
+async def add_conversa(
+    ticket_id: str,
+    conversa_data: ConversaCreate,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Append a message to the ticket thread"""
+    check_atendimento_access(current_user)
+    atendimento_collection = await get_atendimento_collection()
+    
+    conversa = Conversa(
+        ticket_id=ticket_id,
+        usuario_id=current_user.id,
+        usuario=current_user.name,
+        mensagem=conversa_data.mensagem
+    )
+    
+    # Message first: the count only ever covers messages that were stored
+    conversas_collection = await get_atendimento_conversas_collection()
+    await conversas_collection.insert_one(conversa.model_dump())
+    ticket_data = await atendimento_collection.find_one_and_update(
+        {"id": ticket_id},
+        {
+            "$inc": {"conversas_count": 1},
+            "$set": {"last_interaction_at": conversa.data, "updated_at": conversa.data}
+        },
+        projection={"conversas": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not ticket_data:
+        await conversas_collection.delete_one({"id": conversa.id})
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
+    
+    if not ticket_data.get("primeira_resposta_em"):
         await atendimento_collection.update_one(
-            {"id": ticket_id}, 
-            {"$set": update_data}
+            {"id": ticket_id, "primeira_resposta_em": None},
+            {"$set": {"primeira_resposta_em": conversa.data}}
         )
+    await event_bus.publish(ticket_event("ticket.conversa", ticket_data))
+    return conversa
+
+@router.get("/{ticket_id}/conversas")
+async def get_conversas(
+    ticket_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    antes: Optional[datetime] = Query(None),
+    antes_id: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=100)
+):
+    """Get the ticket thread, newest first; pass `proximo` of the previous page
+    (antes and antes_id) to continue"""
+    check_atendimento_access(current_user)
+    atendimento_collection = await get_atendimento_collection()
+    ticket_data = await atendimento_collection.find_one({"id": ticket_id}, {"_id": 0, "conversas_count": 1})
+    if not ticket_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
+    
+    # Keyset on (data, id): messages committed in one inbound batch share a timestamp
+    query = {"ticket_id": ticket_id}
+    if antes and antes_id:
+        query["$or"] = [{"data": {"$lt": antes}}, {"data": antes, "id": {"$lt": antes_id}}]
+    elif antes:
+        query["data"] = {"$lt": antes}
+    
+    conversas_collection = await get_atendimento_conversas_collection()
+    conversas_cursor = conversas_collection.find(query).sort([("data", -1), ("id", -1)]).limit(limit)
+    conversas = []
+    async for conversa_data in conversas_cursor:
+        conversas.append(Conversa(**conversa_data))
     
-    # Return updated ticket
-    updated_ticket_data = await atendimento_collection.find_one({"id": ticket_id})
-    return Ticket(**updated_ticket_data)
\ No newline at end of file
+    return {
+        "conversas": conversas,
+        "total": ticket_data.get("conversas_count", 0),
+        "limit": limit,
+        "proximo": {"antes": conversas[-1].data, "antes_id": conversas[-1].id} if len(conversas) == limit else None
+    }
@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import timedelta
 from models.user import UserLogin, UserResponse, User, UserCreate, UserUpdate
 from auth import authenticate_user, create_access_token, get_password_hash, get_current_user, get_admin_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from database import get_users_collection
+from database import get_users_collection, find_one_and_update_checked
+from services.user_directory import user_directory
+from services.assignment import assignment_service
 from datetime import datetime
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -63,6 +65,8 @@ async def register(user_data: UserCreate):
     )
     
     await users_collection.insert_one(user.model_dump())
+    user_directory.upsert(user.model_dump())
+    await assignment_service.reconcile()
     
     return UserResponse(
         id=user.id,
@@ -95,25 +99,24 @@ async def update_user(user_id: str, user_update: UserUpdate):
     """Update user (admin only)"""
     users_collection = await get_users_collection()
     
-    # Check if user exists
-    existing_user = await users_collection.find_one({"id": user_id})
-    if not existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
     # Update fields
     update_data = user_update.model_dump(exclude_unset=True)
     if update_data:
         update_data["updated_at"] = datetime.utcnow()
-        await users_collection.update_one(
-            {"id": user_id}, 
-            {"$set": update_data}
+    
+    updated_user_data, _ = await find_one_and_update_checked(
+        users_collection,
+        {"id": user_id},
+        {"$set": update_data} if update_data else None
+    )
+    if not updated_user_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
     
-    # Return updated user
-    updated_user_data = await users_collection.find_one({"id": user_id})
+    user_directory.upsert(updated_user_data)
+    await assignment_service.reconcile()
     return UserResponse(**updated_user_data)
 
 @router.get("/users/{user_id}", dependencies=[Depends(get_admin_user)])
@@ -3,11 +3,21 @@ from typing import List, Optional
 from models.chat import Chat, ChatCreate, Message, MessageCreate
 from models.user import UserResponse
 from auth import get_current_user
+from fieldsets import Fieldset, fieldset
 from database import get_chats_collection
+from services.user_directory import user_directory
 from datetime import datetime
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+async def apply_user_names(messages: List[Message]) -> List[Message]:
+    """Refresh denormalized sender names from the user directory"""
+    entries = await user_directory.resolve(message.usuario_id for message in messages)
+    for message in messages:
+        if message.usuario_id in entries:
+            message.usuario_nome = entries[message.usuario_id].name
+    return messages
+
 @router.post("/", response_model=Chat)
 async def create_chat(
     chat_data: ChatCreate,
@@ -29,19 +39,20 @@ async def create_chat(
 async def get_user_chats(
     current_user: UserResponse = Depends(get_current_user),
     skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100)
+    limit: int = Query(50, ge=1, le=100),
+    fields: Fieldset = Depends(fieldset(Chat))
 ):
     """Get user's chats"""
     chats_collection = await get_chats_collection()
     
     query = {"participantes": current_user.id, "ativo": True}
     
-    chats_cursor = chats_collection.find(query).skip(skip).limit(limit).sort("updated_at", -1)
-    chats = []
-    async for chat_data in chats_cursor:
-        chats.append(Chat(**chat_data))
+    chats_cursor = chats_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("updated_at", -1)
+    chats = fields.load(await chats_cursor.to_list(length=None))
     
-    return chats
+    # Partial chats may leave mensagens out
+    await apply_user_names([message for chat in chats for message in getattr(chat, "mensagens", [])])
+    return fields.response(chats)
 
 @router.get("/{chat_id}", response_model=Chat)
 async def get_chat(
@@ -67,6 +78,7 @@ async def get_chat(
             detail="Acesso negado ao chat"
         )
     
+    await apply_user_names(chat.mensagens)
     return chat
 
 @router.post("/{chat_id}/message")
@@ -138,7 +150,7 @@ async def get_chat_messages(
     
     # Get messages with pagination
     messages = sorted(chat.mensagens, key=lambda x: x.timestamp, reverse=True)
-    paginated_messages = messages[skip:skip + limit]
+    paginated_messages = await apply_user_names(messages[skip:skip + limit])
     
     return {
         "messages": paginated_messages,
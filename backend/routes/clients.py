@@ -3,7 +3,8 @@ from typing import Optional, List
 from models.client import Client, ClientCreate, ClientUpdate
 from models.user import UserResponse
 from auth import get_current_user
-from database import get_clients_collection
+from fieldsets import Fieldset, fieldset
+from database import get_clients_collection, find_one_and_update_checked
 from datetime import datetime
 
 router = APIRouter(prefix="/clients", tags=["Clients"])
@@ -48,7 +49,8 @@ async def get_clients(
     status: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Fieldset = Depends(fieldset(Client))
 ):
     """Get clients with filters"""
     clients_collection = await get_clients_collection()
@@ -73,19 +75,12 @@ async def get_clients(
             {"responsavel": {"$regex": search, "$options": "i"}}
         ]
     
-    cursor = clients_collection.find(filter_query).skip(skip).limit(limit)
-    clients = []
-    async for client_data in cursor:
-        clients.append(Client(**client_data))
+    cursor = clients_collection.find(filter_query, fields.projection()).skip(skip).limit(limit)
+    clients = fields.load(await cursor.to_list(length=None))
     
     total = await clients_collection.count_documents(filter_query)
     
-    return {
-        "clients": clients,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
+    return fields.response(clients, "clients", total=total, skip=skip, limit=limit)
 
 @router.get("/{client_id}")
 async def get_client(
@@ -121,33 +116,30 @@ async def update_client(
     """Update client"""
     clients_collection = await get_clients_collection()
     
-    # Check if client exists
-    existing_client = await clients_collection.find_one({"id": client_id})
-    if not existing_client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
-        )
-        
-    client = Client(**existing_client)
-    
-    if not check_city_access(current_user, client.cidade):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied for this city"
-        )
-    
     # Update fields
     update_data = client_update.model_dump(exclude_unset=True)
     if update_data:
         update_data["updated_at"] = datetime.utcnow()
-        await clients_collection.update_one(
-            {"id": client_id}, 
-            {"$set": update_data}
+    
+    # City access is part of the filter
+    conditions = None if current_user.role == "admin" else {"cidade": {"$in": current_user.allowed_cities}}
+    updated_client_data, found = await find_one_and_update_checked(
+        clients_collection,
+        {"id": client_id},
+        {"$set": update_data} if update_data else None,
+        conditions
+    )
+    if not updated_client_data:
+        if found:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied for this city"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Client not found"
         )
     
-    # Return updated client
-    updated_client_data = await clients_collection.find_one({"id": client_id})
     return Client(**updated_client_data)
 
 @router.delete("/{client_id}")
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Header, Response
 from typing import List, Optional
 from models.configuracoes import Configuracoes, ConfiguracoesCreate, ConfiguracoesUpdate
 from models.user import UserResponse
 from auth import get_current_user
-from database import get_configuracoes_collection
+from fieldsets import Fieldset, fieldset
+from database import get_configuracoes_collection, find_one_and_update_checked
+from services.config import config_cache
+from responses import wants_msgpack
 from datetime import datetime
 
 router = APIRouter(prefix="/configuracoes", tags=["Configuracoes"])
 
+def config_etag(configuracao: Configuracoes) -> str:
+    """ETag of the versao the body carries, per negotiated format"""
+    suffix = "-msgpack" if wants_msgpack() else ""
+    return f'"{configuracao.id}-{configuracao.versao}{suffix}"'
+
 @router.post("/", response_model=Configuracoes)
 async def create_configuracao(
     config_data: ConfiguracoesCreate,
@@ -18,6 +26,7 @@ async def create_configuracao(
     
     configuracao = Configuracoes(**config_data.model_dump())
     await configuracoes_collection.insert_one(configuracao.model_dump())
+    await config_cache.invalidate()
     
     return configuracao
 
@@ -27,7 +36,8 @@ async def get_configuracoes(
     setor: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500)
+    limit: int = Query(100, ge=1, le=500),
+    fields: Fieldset = Depends(fieldset(Configuracoes))
 ):
     """Get configuracoes with filters"""
     configuracoes_collection = await get_configuracoes_collection()
@@ -43,16 +53,16 @@ async def get_configuracoes(
     if search:
         query["nome"] = {"$regex": search, "$options": "i"}
     
-    configs_cursor = configuracoes_collection.find(query).skip(skip).limit(limit).sort("updated_at", -1)
-    configs = []
-    async for config_data in configs_cursor:
-        configs.append(Configuracoes(**config_data))
+    configs_cursor = configuracoes_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("updated_at", -1)
+    configs = fields.load(await configs_cursor.to_list(length=None))
     
-    return configs
+    return fields.response(configs)
 
 @router.get("/{config_id}", response_model=Configuracoes)
 async def get_configuracao(
     config_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Get configuracao by ID"""
@@ -65,7 +75,13 @@ async def get_configuracao(
             detail="Configuracao not found"
         )
     
-    return Configuracoes(**config_data)
+    configuracao = Configuracoes(**config_data)
+    etag = config_etag(configuracao)
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Vary": "Accept"})
+    response.headers["ETag"] = etag
+    
+    return configuracao
 
 @router.put("/{config_id}", response_model=Configuracoes)
 async def update_configuracao(
@@ -76,23 +92,29 @@ async def update_configuracao(
     """Update configuracao"""
     configuracoes_collection = await get_configuracoes_collection()
     
-    # Check if config exists
-    existing_config = await configuracoes_collection.find_one({"id": config_id})
-    if not existing_config:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Configuracao not found"
-        )
-    
     # Update fields
     update_data = config_update.model_dump(exclude_unset=True)
+    update = None
     if update_data:
         update_data["updated_at"] = datetime.utcnow()
-        await configuracoes_collection.update_one(
-            {"id": config_id}, 
-            {"$set": update_data}
+        # Pipeline so documents written before versioning, read as the
+        # model's versao 1, go to 2 like any other; values are literals
+        update = [{"$set": {
+            **{field: {"$literal": value} for field, value in update_data.items()},
+            "versao": {"$add": [{"$ifNull": ["$versao", 1]}, 1]}
+        }}]
+    
+    updated_config_data, _ = await find_one_and_update_checked(
+        configuracoes_collection,
+        {"id": config_id},
+        update
+    )
+    if not updated_config_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Configuracao not found"
         )
+    if update_data:
+        await config_cache.invalidate()
     
-    # Return updated config
-    updated_config_data = await configuracoes_collection.find_one({"id": config_id})
     return Configuracoes(**updated_config_data)
\ No newline at end of file
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from models.user import UserResponse
+from auth import STREAM_TOKEN_EXPIRE_SECONDS, create_stream_token, get_current_user, get_stream_user
+from services.events import event_bus
+import asyncio
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+KEEPALIVE_SECONDS = 15
+
+@router.post("/token")
+async def create_events_token(current_user: UserResponse = Depends(get_current_user)):
+    """Short-lived token for opening the stream with EventSource (?token=)"""
+    return {"token": create_stream_token(current_user), "expires_in": STREAM_TOKEN_EXPIRE_SECONDS}
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    current_user: UserResponse = Depends(get_stream_user)
+):
+    """Server-sent events with task and ticket changes visible to the user"""
+    subscription = event_bus.subscribe(current_user)
+    
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event.id}\nevent: {event.tipo}\ndata: {event.model_dump_json()}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -3,7 +3,9 @@ from typing import List, Optional
 from models.financial import ContaReceber, ContaReceberCreate, FinancialClient, FinancialClientCreate, HistoricoAction
 from models.user import UserResponse
 from auth import get_current_user
-from database import get_contas_receber_collection, get_financial_clients_collection
+from fieldsets import Fieldset, fieldset
+from database import get_contas_receber_collection, get_financial_clients_collection, find_one_and_update_checked
+from services.business_calendar import business_calendar
 from datetime import datetime, date
 
 router = APIRouter(prefix="/financial", tags=["Financial"])
@@ -30,6 +32,9 @@ async def create_conta_receber(
     total_bruto = conta_data.valor_original
     total_liquido = total_bruto
     
+    # Due dates falling on weekends or holidays move to the next business day
+    conta_data.data_vencimento = business_calendar.adjust(conta_data.data_vencimento, conta_data.cidade_atendimento)
+    
     conta = ContaReceber(
         **conta_data.model_dump(),
         situacao="em_aberto",
@@ -56,7 +61,8 @@ async def get_contas_receber(
     situacao: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500)
+    limit: int = Query(100, ge=1, le=500),
+    fields: Fieldset = Depends(fieldset(ContaReceber))
 ):
     """Get contas a receber with filters"""
     check_financial_access(current_user)
@@ -83,12 +89,10 @@ async def get_contas_receber(
             {"descricao": {"$regex": search, "$options": "i"}}
         ]
     
-    contas_cursor = contas_collection.find(query).skip(skip).limit(limit).sort("data_vencimento", -1)
-    contas = []
-    async for conta_data in contas_cursor:
-        contas.append(ContaReceber(**conta_data))
+    contas_cursor = contas_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("data_vencimento", -1)
+    contas = fields.load(await contas_cursor.to_list(length=None))
     
-    return contas
+    return fields.response(contas)
 
 @router.get("/contas-receber/{conta_id}", response_model=ContaReceber)
 async def get_conta_receber(
@@ -121,15 +125,6 @@ async def baixar_conta_receber(
     """Dar baixa em conta a receber"""
     check_financial_access(current_user)
     contas_collection = await get_contas_receber_collection()
-    conta_data = await contas_collection.find_one({"id": conta_id})
-    
-    if not conta_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conta a receber not found"
-        )
-    
-    conta = ContaReceber(**conta_data)
     
     # Update conta
     historico_action = HistoricoAction(
@@ -140,21 +135,39 @@ async def baixar_conta_receber(
         valor=valor_recebido
     )
     
+    # Pipeline update: total_liquido comes from the stored valor_original and
+    # the historico entry is appended in the same write
     update_data = {
         "situacao": "pago",
-        "data_recebimento": data_recebimento,
-        "desconto_aplicado": desconto,
-        "acrescimo_aplicado": acrescimo,
-        "valor_quitado": valor_recebido,
-        "total_liquido": conta.valor_original - desconto + acrescimo,
-        "updated_at": datetime.utcnow(),
-        "$push": {"historico": historico_action.model_dump()}
+        "data_recebimento": {"$literal": data_recebimento},
+        "desconto_aplicado": {"$literal": desconto},
+        "acrescimo_aplicado": {"$literal": acrescimo},
+        "valor_quitado": {"$literal": valor_recebido},
+        "total_liquido": {"$add": [{"$subtract": ["$valor_original", desconto]}, acrescimo]},
+        "updated_at": {"$literal": datetime.utcnow()},
+        "historico": {"$concatArrays": [
+            {"$ifNull": ["$historico", []]},
+            {"$literal": [historico_action.model_dump()]}
+        ]}
     }
     
-    await contas_collection.update_one({"id": conta_id}, {"$set": update_data})
+    updated_conta_data, found = await find_one_and_update_checked(
+        contas_collection,
+        {"id": conta_id},
+        [{"$set": update_data}],
+        {"situacao": {"$ne": "pago"}}
+    )
+    if not updated_conta_data:
+        if found:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Conta a receber já está paga"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conta a receber not found"
+        )
     
-    # Get updated conta
-    updated_conta_data = await contas_collection.find_one({"id": conta_id})
     return ContaReceber(**updated_conta_data)
 
 # Financial Clients
@@ -187,7 +200,8 @@ async def get_financial_clients(
     tipo_honorario: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500)
+    limit: int = Query(100, ge=1, le=500),
+    fields: Fieldset = Depends(fieldset(FinancialClient))
 ):
     """Get financial clients with filters"""
     check_financial_access(current_user)
@@ -208,12 +222,10 @@ async def get_financial_clients(
     if search:
         query["empresa"] = {"$regex": search, "$options": "i"}
     
-    clients_cursor = financial_clients_collection.find(query).skip(skip).limit(limit).sort("empresa", 1)
-    clients = []
-    async for client_data in clients_cursor:
-        clients.append(FinancialClient(**client_data))
+    clients_cursor = financial_clients_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("empresa", 1)
+    clients = fields.load(await clients_cursor.to_list(length=None))
     
-    return clients
+    return fields.response(clients)
 
 @router.get("/dashboard-stats")
 async def get_dashboard_stats(current_user: UserResponse = Depends(get_current_user)):
@@ -1,13 +1,29 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
-from models.fiscal import ObrigacaoFiscal, ObrigacaoFiscalCreate, ObrigacaoFiscalUpdate
+from models.fiscal import (
+    ObrigacaoFiscal, ObrigacaoFiscalCreate, ObrigacaoFiscalUpdate, CalendarioFiscalRequest,
+    ReceitaMensal, ReceitaMensalCreate, CalculoPgdasRequest
+)
 from models.user import UserResponse
 from auth import get_current_user
-from database import get_fiscal_collection
-from datetime import datetime
+from fieldsets import Fieldset, fieldset
+from database import get_fiscal_collection, get_receitas_collection, find_one_and_update_checked, get_client_cidade
+from services.business_calendar import business_calendar
+from services.fiscal_calendar import generate_fiscal_calendar
+from services.simples_nacional import calcular_pgdas
+from services.sped import resumir_arquivo_sped
+from services.cache import SharedCache
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+import os
+import tempfile
 
 router = APIRouter(prefix="/fiscal", tags=["Fiscal"])
 
+# Dashboard stats per scope; every fiscal write invalidates them on all workers
+fiscal_stats_cache = SharedCache("fiscal_stats", ttl=300)
+
 def check_fiscal_access(user: UserResponse):
     """Check if user has access to fiscal module"""
     if user.role != "admin" and "fiscal" not in user.allowed_sectors:
@@ -25,12 +41,18 @@ async def create_obrigacao(
     check_fiscal_access(current_user)
     fiscal_collection = await get_fiscal_collection()
     
+    # Due dates falling on weekends or holidays (the client's city included) move to the next business day
+    obrigacao_data.vencimento = business_calendar.adjust(
+        obrigacao_data.vencimento, await get_client_cidade(obrigacao_data.empresa_id)
+    )
+    
     obrigacao = ObrigacaoFiscal(
         **obrigacao_data.model_dump(),
         status="pendente"
     )
     
     await fiscal_collection.insert_one(obrigacao.model_dump())
+    await fiscal_stats_cache.invalidate()
     return obrigacao
 
 @router.get("/", response_model=List[ObrigacaoFiscal])
@@ -40,7 +62,8 @@ async def get_obrigacoes(
     status: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500)
+    limit: int = Query(100, ge=1, le=500),
+    fields: Fieldset = Depends(fieldset(ObrigacaoFiscal))
 ):
     """Get obrigacoes fiscais with filters"""
     check_fiscal_access(current_user)
@@ -65,12 +88,10 @@ async def get_obrigacoes(
             {"responsavel": {"$regex": search, "$options": "i"}}
         ]
     
-    obrigacoes_cursor = fiscal_collection.find(query).skip(skip).limit(limit).sort("vencimento", -1)
-    obrigacoes = []
-    async for obrigacao_data in obrigacoes_cursor:
-        obrigacoes.append(ObrigacaoFiscal(**obrigacao_data))
+    obrigacoes_cursor = fiscal_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("vencimento", -1)
+    obrigacoes = fields.load(await obrigacoes_cursor.to_list(length=None))
     
-    return obrigacoes
+    return fields.response(obrigacoes)
 
 @router.get("/{obrigacao_id}", response_model=ObrigacaoFiscal)
 async def get_obrigacao(
@@ -100,24 +121,77 @@ async def update_obrigacao(
     check_fiscal_access(current_user)
     fiscal_collection = await get_fiscal_collection()
     
-    # Check if obrigacao exists
+    # Update fields
+    update_data = obrigacao_update.model_dump(exclude_unset=True)
+    if update_data:
+        update_data["updated_at"] = datetime.utcnow()
+    if update_data.get("vencimento"):
+        # Same business-day rule as on create; a missing obrigacao 404s below
+        existing = await fiscal_collection.find_one({"id": obrigacao_id}, {"_id": 0, "empresa_id": 1})
+        if existing:
+            update_data["vencimento"] = business_calendar.adjust(update_data["vencimento"], await get_client_cidade(existing["empresa_id"]))
+    
+    updated_obrigacao_data, _ = await find_one_and_update_checked(
+        fiscal_collection,
+        {"id": obrigacao_id},
+        {"$set": update_data} if update_data else None
+    )
+    if not updated_obrigacao_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Obrigacao not found"
+        )
+    if update_data:
+        await fiscal_stats_cache.invalidate()
+    
+    return ObrigacaoFiscal(**updated_obrigacao_data)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+@router.post("/{obrigacao_id}/sped", response_model=ObrigacaoFiscal)
+async def importar_sped(
+    obrigacao_id: str,
+    arquivo: UploadFile = File(...),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Upload a SPED file and attach its summary to the obrigacao"""
+    check_fiscal_access(current_user)
+    fiscal_collection = await get_fiscal_collection()
+    
     existing_obrigacao = await fiscal_collection.find_one({"id": obrigacao_id})
     if not existing_obrigacao:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Obrigacao not found"
         )
-    
-    # Update fields
-    update_data = obrigacao_update.model_dump(exclude_unset=True)
-    if update_data:
-        update_data["updated_at"] = datetime.utcnow()
-        await fiscal_collection.update_one(
-            {"id": obrigacao_id}, 
-            {"$set": update_data}
+    if existing_obrigacao["tipo"] != "sped":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Obrigacao is not a SPED delivery"
         )
     
-    # Return updated obrigacao
+    # Spool the upload to disk in chunks, then parse it memory-mapped; file
+    # writes and parsing both run off the event loop
+    with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as temp_file:
+        temp_path = temp_file.name
+        while chunk := await arquivo.read(UPLOAD_CHUNK_SIZE):
+            await run_in_threadpool(temp_file.write, chunk)
+    try:
+        resumo = await run_in_threadpool(resumir_arquivo_sped, temp_path)
+    finally:
+        os.unlink(temp_path)
+    
+    resumo["arquivo"] = arquivo.filename
+    resumo["importado_em"] = datetime.utcnow()
+    await fiscal_collection.update_one(
+        {"id": obrigacao_id},
+        {
+            "$set": {"sped_resumo": resumo, "updated_at": datetime.utcnow()},
+            "$addToSet": {"documentos": arquivo.filename}
+        }
+    )
+    await fiscal_stats_cache.invalidate()
+    
     updated_obrigacao_data = await fiscal_collection.find_one({"id": obrigacao_id})
     return ObrigacaoFiscal(**updated_obrigacao_data)
 
@@ -139,4 +213,131 @@ async def delete_obrigacao(
         )
     
     await fiscal_collection.delete_one({"id": obrigacao_id})
-    return {"message": "Obrigacao deleted successfully"}
\ No newline at end of file
+    await fiscal_stats_cache.invalidate()
+    return {"message": "Obrigacao deleted successfully"}
+
+VENCIMENTO_JANELAS = [7, 15, 30]
+
+@router.get("/stats/dashboard")
+async def get_fiscal_stats(
+    current_user: UserResponse = Depends(get_current_user),
+    empresa_id: Optional[str] = Query(None)
+):
+    """Get fiscal dashboard statistics"""
+    check_fiscal_access(current_user)
+    
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    cache_key = (today, empresa_id)
+    cached = await fiscal_stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    versao = fiscal_stats_cache.versao
+    
+    fiscal_collection = await get_fiscal_collection()
+    
+    base_query = {}
+    if empresa_id:
+        base_query["empresa_id"] = empresa_id
+    
+    em_aberto = {"status": {"$in": ["pendente", "em_andamento", "atrasado"]}}
+    janelas = {
+        f"{dias}_dias": {"$sum": {"$cond": [{"$lt": ["$vencimento", today + timedelta(days=dias + 1)]}, 1, 0]}}
+        for dias in VENCIMENTO_JANELAS
+    }
+    pipeline = [
+        {"$match": base_query},
+        {"$facet": {
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "tipo": [{"$group": {"_id": "$tipo", "count": {"$sum": 1}}}],
+            "vencimentos": [
+                {"$match": {**em_aberto, "vencimento": {"$gte": today, "$lt": today + timedelta(days=max(VENCIMENTO_JANELAS) + 1)}}},
+                {"$group": {"_id": None, **janelas}}
+            ],
+            "atrasadas": [
+                {"$match": {"$or": [
+                    {"status": "atrasado"},
+                    {"status": {"$in": ["pendente", "em_andamento"]}, "vencimento": {"$lt": today}}
+                ]}},
+                {"$count": "total"}
+            ]
+        }}
+    ]
+    
+    facets = {}
+    async for result in fiscal_collection.aggregate(pipeline):
+        facets = result
+    
+    status_stats = {status_item: 0 for status_item in ["pendente", "em_andamento", "entregue", "atrasado"]}
+    status_stats.update({item["_id"]: item["count"] for item in facets.get("status", [])})
+    type_stats = {type_item: 0 for type_item in ["pgdas", "dctf", "sped", "defis", "darf"]}
+    type_stats.update({item["_id"]: item["count"] for item in facets.get("tipo", [])})
+    vencimentos = facets.get("vencimentos") or [{}]
+    atrasadas = facets.get("atrasadas") or [{}]
+    
+    stats = {
+        "status_stats": status_stats,
+        "type_stats": type_stats,
+        "vencimentos_proximos": {f"{dias}_dias": vencimentos[0].get(f"{dias}_dias", 0) for dias in VENCIMENTO_JANELAS},
+        "atrasadas": atrasadas[0].get("total", 0)
+    }
+    fiscal_stats_cache.set(cache_key, stats, versao)
+    return stats
+
+@router.post("/calendario/gerar")
+async def gerar_calendario_fiscal(
+    calendario: CalendarioFiscalRequest,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Generate the obligations of every active client for a year or competencia"""
+    check_fiscal_access(current_user)
+    
+    if (calendario.ano is None) == (calendario.competencia is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe o ano ou a competência"
+        )
+    
+    resultado = await generate_fiscal_calendar(ano=calendario.ano, competencia=calendario.competencia)
+    await fiscal_stats_cache.invalidate()
+    return {"message": "Calendário fiscal gerado com sucesso", **resultado}
+
+@router.post("/receitas")
+async def registrar_receitas(
+    receitas: List[ReceitaMensalCreate],
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Register monthly revenues (one per empresa and competencia) used by the DAS calculation"""
+    check_fiscal_access(current_user)
+    receitas_collection = await get_receitas_collection()
+    
+    now = datetime.utcnow()
+    operations = []
+    for receita_data in receitas:
+        receita = ReceitaMensal(**receita_data.model_dump())
+        insert_only = {key: value for key, value in receita.model_dump().items() if key in ("id", "created_at")}
+        operations.append(UpdateOne(
+            {"empresa_id": receita.empresa_id, "competencia": receita.competencia},
+            {"$set": {"valor": receita.valor, "updated_at": now}, "$setOnInsert": insert_only},
+            upsert=True
+        ))
+    
+    if not operations:
+        return {"message": "Nenhuma receita informada", "inseridas": 0, "atualizadas": 0}
+    
+    result = await receitas_collection.bulk_write(operations, ordered=False)
+    return {
+        "message": "Receitas registradas com sucesso",
+        "inseridas": result.upserted_count,
+        "atualizadas": result.modified_count
+    }
+
+@router.post("/pgdas/calcular")
+async def calcular_das_pgdas(
+    calculo: CalculoPgdasRequest,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Compute the DAS of every Simples client and fill the PGDAS obligations of the competencia"""
+    check_fiscal_access(current_user)
+    resultado = await calcular_pgdas(calculo.competencia)
+    await fiscal_stats_cache.invalidate()
+    return resultado
\ No newline at end of file
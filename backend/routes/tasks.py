@@ -1,13 +1,54 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import List, Optional
-from models.task import Task, TaskCreate, TaskUpdate, TaskComment
+from models.task import (
+    Task, TaskCreate, TaskUpdate, TaskComment, TaskReminder,
+    TaskTemplate, TaskTemplateCreate, TaskTemplateInstantiate
+)
 from models.user import UserResponse
-from auth import get_current_user
-from database import get_tasks_collection
-from datetime import datetime
+from auth import get_current_user, get_admin_user
+from fieldsets import Fieldset, fieldset
+from database import (
+    get_tasks_collection, get_task_reminders_collection, get_task_templates_collection,
+    insert_many_idempotent, find_one_and_update_checked
+)
+from services.user_directory import user_directory
+from services.deadline_scheduler import deadline_scheduler
+from services.task_analytics import compute_task_analytics
+from services.events import event_bus, task_event
+from datetime import datetime, date
+import calendar
 
 router = APIRouter(prefix="/tasks", tags=["Tasks"])
 
+async def apply_user_names(tasks: List[Task]) -> List[Task]:
+    """Refresh denormalized user names from the user directory; partial
+    tasks (?fields=) only get the names whose id and name fields they carry"""
+    ids = set()
+    for task in tasks:
+        ids.update((getattr(task, "responsavel_id", None), getattr(task, "criador_id", None)))
+        ids.update(comment.usuario_id for comment in getattr(task, "comentarios", []))
+    entries = await user_directory.resolve(ids)
+    
+    for task in tasks:
+        if hasattr(task, "responsavel_nome") and getattr(task, "responsavel_id", None) in entries:
+            task.responsavel_nome = entries[task.responsavel_id].name
+        if hasattr(task, "criador_nome") and getattr(task, "criador_id", None) in entries:
+            task.criador_nome = entries[task.criador_id].name
+        for comment in getattr(task, "comentarios", []):
+            if comment.usuario_id in entries:
+                comment.usuario_nome = entries[comment.usuario_id].name
+    return tasks
+
+async def resolve_responsavel_nome(responsavel_id: str) -> str:
+    """Get the name of a responsavel, rejecting unknown users"""
+    entries = await user_directory.resolve([responsavel_id])
+    if responsavel_id not in entries:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Responsável não encontrado"
+        )
+    return entries[responsavel_id].name
+
 @router.post("/", response_model=Task)
 async def create_task(
     task_data: TaskCreate,
@@ -20,10 +61,12 @@ async def create_task(
         **task_data.model_dump(),
         criador_id=current_user.id,
         criador_nome=current_user.name,
-        responsavel_nome="Sistema"  # Will be updated when we get user info
+        responsavel_nome=await resolve_responsavel_nome(task_data.responsavel_id)
     )
     
     await tasks_collection.insert_one(task.model_dump())
+    deadline_scheduler.schedule(task.model_dump())
+    await event_bus.publish(task_event("task.created", task.model_dump()))
     return task
 
 @router.get("/", response_model=List[Task])
@@ -35,7 +78,8 @@ async def get_tasks(
     responsavel_id: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100)
+    limit: int = Query(50, ge=1, le=100),
+    fields: Fieldset = Depends(fieldset(Task))
 ):
     """Get tasks with filters"""
     tasks_collection = await get_tasks_collection()
@@ -65,12 +109,156 @@ async def get_tasks(
             {"descricao": {"$regex": search, "$options": "i"}}
         ]
     
-    tasks_cursor = tasks_collection.find(query).skip(skip).limit(limit).sort("data_criacao", -1)
+    tasks_cursor = tasks_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("data_criacao", -1)
+    tasks = fields.load(await tasks_cursor.to_list(length=None))
+    
+    return fields.response(await apply_user_names(tasks))
+
+@router.post("/templates", response_model=TaskTemplate)
+async def create_task_template(
+    template_data: TaskTemplateCreate,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Create task template"""
+    templates_collection = await get_task_templates_collection()
+    
+    template = TaskTemplate(
+        **template_data.model_dump(),
+        criador_id=current_user.id
+    )
+    
+    await templates_collection.insert_one(template.model_dump())
+    return template
+
+@router.get("/templates", response_model=List[TaskTemplate])
+async def get_task_templates(
+    current_user: UserResponse = Depends(get_current_user),
+    categoria: Optional[str] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    fields: Fieldset = Depends(fieldset(TaskTemplate))
+):
+    """Get task templates"""
+    templates_collection = await get_task_templates_collection()
+    
+    query = {"ativo": True}
+    if categoria:
+        query["categoria"] = categoria
+    
+    templates_cursor = templates_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("nome", 1)
+    templates = fields.load(await templates_cursor.to_list(length=None))
+    
+    return fields.response(templates)
+
+def competencia_date(competencia: str, dia: int) -> date:
+    """Day of the competencia month, clamped to the month's last day"""
+    year, month = (int(part) for part in competencia.split("-"))
+    return date(year, month, min(dia, calendar.monthrange(year, month)[1]))
+
+@router.post("/templates/{template_id}/instantiate", dependencies=[Depends(get_admin_user)])
+async def instantiate_task_template(
+    template_id: str,
+    instantiate_data: TaskTemplateInstantiate,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Create the template's tasks for every target of a competencia (admin only)"""
+    templates_collection = await get_task_templates_collection()
+    template_data = await templates_collection.find_one({"id": template_id})
+    
+    if not template_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Modelo de tarefa não encontrado"
+        )
+    
+    template = TaskTemplate(**template_data)
+    competencia = instantiate_data.competencia
+    
+    entries = await user_directory.resolve(alvo.responsavel_id for alvo in instantiate_data.alvos)
+    unknown = sorted({alvo.responsavel_id for alvo in instantiate_data.alvos} - entries.keys())
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Responsáveis não encontrados: {', '.join(unknown)}"
+        )
+    
+    # Same template, competencia, target and item always produce the same key
     tasks = []
-    async for task_data in tasks_cursor:
-        tasks.append(Task(**task_data))
+    for alvo in instantiate_data.alvos:
+        # Both ids: one empresa may have tasks for several responsáveis
+        target_key = f"{alvo.empresa_id or ''}:{alvo.responsavel_id}"
+        for index, item in enumerate(template.itens):
+            titulo = f"{item.titulo} - {alvo.empresa}" if alvo.empresa else item.titulo
+            task = Task(
+                titulo=titulo,
+                descricao=item.descricao,
+                prioridade=item.prioridade,
+                categoria=template.categoria,
+                responsavel_id=alvo.responsavel_id,
+                responsavel_nome=entries[alvo.responsavel_id].name,
+                criador_id=current_user.id,
+                criador_nome=current_user.name,
+                data_prazo=competencia_date(competencia, item.dia_prazo) if item.dia_prazo else None,
+                tags=item.tags,
+                empresa_id=alvo.empresa_id,
+                empresa=alvo.empresa,
+                template_id=template.id,
+                competencia=competencia,
+                idempotency_key=f"{template.id}:{competencia}:{target_key}:{index}"
+            )
+            tasks.append(task.model_dump())
     
-    return tasks
+    tasks_collection = await get_tasks_collection()
+    inserted = await insert_many_idempotent(tasks_collection, tasks)
+    for task_data in inserted:
+        deadline_scheduler.schedule(task_data)
+        await event_bus.publish(task_event("task.created", task_data))
+    
+    return {
+        "message": "Tarefas geradas com sucesso",
+        "competencia": competencia,
+        "criadas": len(inserted),
+        "existentes": len(tasks) - len(inserted)
+    }
+
+@router.get("/reminders", response_model=List[TaskReminder])
+async def get_task_reminders(
+    current_user: UserResponse = Depends(get_current_user),
+    apenas_nao_lidas: bool = Query(True),
+    limit: int = Query(50, ge=1, le=100),
+    fields: Fieldset = Depends(fieldset(TaskReminder))
+):
+    """Get deadline reminders for the current user"""
+    reminders_collection = await get_task_reminders_collection()
+    
+    query = {"usuario_id": current_user.id}
+    if apenas_nao_lidas:
+        query["lida"] = False
+    
+    reminders_cursor = reminders_collection.find(query, fields.projection()).limit(limit).sort("created_at", -1)
+    reminders = fields.load(await reminders_cursor.to_list(length=None))
+    
+    return fields.response(reminders)
+
+@router.put("/reminders/{reminder_id}/lida")
+async def mark_reminder_read(
+    reminder_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Mark a deadline reminder as read"""
+    reminders_collection = await get_task_reminders_collection()
+    result = await reminders_collection.update_one(
+        {"id": reminder_id, "usuario_id": current_user.id},
+        {"$set": {"lida": True}}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Lembrete não encontrado"
+        )
+    
+    return {"message": "Lembrete marcado como lido"}
 
 @router.get("/{task_id}", response_model=Task)
 async def get_task(
@@ -98,6 +286,7 @@ async def get_task(
             detail="Acesso negado à tarefa"
         )
     
+    await apply_user_names([task])
     return task
 
 @router.put("/{task_id}", response_model=Task)
@@ -109,43 +298,45 @@ async def update_task(
     """Update task"""
     tasks_collection = await get_tasks_collection()
     
-    # Check if task exists
-    existing_task = await tasks_collection.find_one({"id": task_id})
-    if not existing_task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tarefa não encontrada"
-        )
-    
-    task = Task(**existing_task)
-    
-    # Check access
-    if (current_user.role != "admin" and 
-        current_user.id != task.criador_id and 
-        current_user.id != task.responsavel_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Acesso negado à tarefa"
-        )
-    
     # Update fields
     update_data = task_update.model_dump(exclude_unset=True)
     if update_data:
         update_data["updated_at"] = datetime.utcnow()
         
+        if "responsavel_id" in update_data:
+            update_data["responsavel_nome"] = await resolve_responsavel_nome(update_data["responsavel_id"])
+        
         # Mark as completed if status is concluida
         if update_data.get("status") == "concluida":
             update_data["data_conclusao"] = datetime.utcnow()
             update_data["progresso"] = 100
-        
-        await tasks_collection.update_one(
-            {"id": task_id}, 
-            {"$set": update_data}
+    
+    # Ownership is part of the filter
+    conditions = None
+    if current_user.role != "admin":
+        conditions = {"$or": [{"criador_id": current_user.id}, {"responsavel_id": current_user.id}]}
+    updated_task_data, found = await find_one_and_update_checked(
+        tasks_collection,
+        {"id": task_id},
+        {"$set": update_data} if update_data else None,
+        conditions
+    )
+    if not updated_task_data:
+        if found:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Acesso negado à tarefa"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tarefa não encontrada"
         )
     
-    # Return updated task
-    updated_task_data = await tasks_collection.find_one({"id": task_id})
-    return Task(**updated_task_data)
+    deadline_scheduler.schedule(updated_task_data)
+    await event_bus.publish(task_event("task.updated", updated_task_data))
+    updated_task = Task(**updated_task_data)
+    await apply_user_names([updated_task])
+    return updated_task
 
 @router.post("/{task_id}/comment")
 async def add_comment(
@@ -235,4 +426,9 @@ async def get_tasks_stats(current_user: UserResponse = Depends(get_current_user)
         "status_stats": status_stats,
         "priority_stats": priority_stats,
         "category_stats": category_stats
-    }
\ No newline at end of file
+    }
+
+@router.get("/stats/analytics", dependencies=[Depends(get_admin_user)])
+async def get_tasks_analytics():
+    """Get workload and cycle-time analytics per responsavel and categoria (admin only)"""
+    return await compute_task_analytics()
\ No newline at end of file
@@ -1,13 +1,28 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from models.trabalhista import SolicitacaoTrabalhista, SolicitacaoTrabalhistaCreate, SolicitacaoTrabalhistaUpdate
+from models.trabalhista import SolicitacaoTrabalhista, SolicitacaoTrabalhistaCreate, SolicitacaoTrabalhistaUpdate, CalculoFolhaRequest, LoteEsocialRequest
+from models.funcionario import Funcionario
 from models.user import UserResponse
-from auth import get_current_user
-from database import get_trabalhista_collection
+from auth import get_current_user, get_admin_user
+from fieldsets import Fieldset, fieldset
+from database import (
+    get_trabalhista_collection, get_funcionarios_collection, get_clients_collection,
+    find_one_and_update_checked, get_client_cidade
+)
+from pymongo import ReturnDocument
+from services.business_calendar import business_calendar
+from services.folha import processar_folhas
+from services.esocial import carregar_eventos, dividir_lotes, iter_lote_xml, gerar_lotes_competencia
+from services.funcionarios import sync_solicitacao, backfill_funcionarios
+from services.cache import SharedCache
 from datetime import datetime
 
 router = APIRouter(prefix="/trabalhista", tags=["Trabalhista"])
 
+# Dashboard stats per scope; every trabalhista write invalidates them on all workers
+trabalhista_stats_cache = SharedCache("trabalhista_stats", ttl=60)
+
 def check_trabalhista_access(user: UserResponse):
     """Check if user has access to trabalhista module"""
     if user.role != "admin" and "trabalhista" not in user.allowed_sectors:
@@ -16,6 +31,11 @@ def check_trabalhista_access(user: UserResponse):
             detail="Access to trabalhista module not allowed"
         )
 
+async def get_empresa_ids_by_cities(cities: List[str]) -> List[str]:
+    """Ids of the clients located in the given cities"""
+    clients_collection = await get_clients_collection()
+    return await clients_collection.distinct("id", {"cidade": {"$in": cities}})
+
 @router.post("/", response_model=SolicitacaoTrabalhista)
 async def create_solicitacao(
     solicitacao_data: SolicitacaoTrabalhistaCreate,
@@ -25,12 +45,19 @@ async def create_solicitacao(
     check_trabalhista_access(current_user)
     trabalhista_collection = await get_trabalhista_collection()
     
+    # Deadlines falling on weekends or holidays (the client's city included) move to the next business day
+    solicitacao_data.prazo = business_calendar.adjust(
+        solicitacao_data.prazo, await get_client_cidade(solicitacao_data.empresa_id)
+    )
+    
     solicitacao = SolicitacaoTrabalhista(
         **solicitacao_data.model_dump(),
         status="pendente"
     )
     
     await trabalhista_collection.insert_one(solicitacao.model_dump())
+    await sync_solicitacao(solicitacao.model_dump())
+    await trabalhista_stats_cache.invalidate()
     return solicitacao
 
 @router.get("/", response_model=List[SolicitacaoTrabalhista])
@@ -40,7 +67,8 @@ async def get_solicitacoes(
     status: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500)
+    limit: int = Query(100, ge=1, le=500),
+    fields: Fieldset = Depends(fieldset(SolicitacaoTrabalhista))
 ):
     """Get solicitacoes trabalhistas with filters"""
     check_trabalhista_access(current_user)
@@ -65,12 +93,117 @@ async def get_solicitacoes(
             {"responsavel": {"$regex": search, "$options": "i"}}
         ]
     
-    solicitacoes_cursor = trabalhista_collection.find(query).skip(skip).limit(limit).sort("data_solicitacao", -1)
-    solicitacoes = []
-    async for solicitacao_data in solicitacoes_cursor:
-        solicitacoes.append(SolicitacaoTrabalhista(**solicitacao_data))
+    solicitacoes_cursor = trabalhista_collection.find(query, fields.projection()).skip(skip).limit(limit).sort("data_solicitacao", -1)
+    solicitacoes = fields.load(await solicitacoes_cursor.to_list(length=None))
+    
+    return fields.response(solicitacoes)
+
+@router.post("/folha/calcular")
+async def calcular_folha(
+    calculo: CalculoFolhaRequest,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Compute INSS, IRRF and FGTS of every open folha request of the competencia"""
+    check_trabalhista_access(current_user)
+    return await processar_folhas(calculo.competencia)
+
+@router.get("/esocial/{empresa_id}")
+async def get_lote_esocial(
+    empresa_id: str,
+    competencia: str = Query(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    lote: int = Query(1, ge=1),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Stream one eSocial lote (S-2200/S-2299/S-1200) of a company for the competencia"""
+    check_trabalhista_access(current_user)
+    dados = await carregar_eventos(empresa_id, competencia)
+    if not dados:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Empresa not found"
+        )
+    
+    lotes = dividir_lotes(dados["eventos"])
+    if lote > len(lotes):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Nenhum evento eSocial para este lote"
+        )
+    
+    grupo, eventos = lotes[lote - 1]
+    return StreamingResponse(
+        iter_lote_xml(dados["empresa"], grupo, eventos),
+        media_type="application/xml",
+        headers={
+            "Content-Disposition": f'attachment; filename="esocial_{empresa_id}_{competencia}_{lote:03d}.xml"',
+            "X-Esocial-Lotes": str(len(lotes))
+        }
+    )
+
+@router.post("/esocial/lotes", dependencies=[Depends(get_admin_user)])
+async def gerar_lotes_esocial(lote_request: LoteEsocialRequest):
+    """Write the eSocial lotes of every company with movement in the competencia"""
+    return await gerar_lotes_competencia(lote_request.competencia)
+
+@router.get("/funcionarios", response_model=List[Funcionario])
+async def get_funcionarios(
+    current_user: UserResponse = Depends(get_current_user),
+    empresa_id: Optional[str] = Query(None),
+    cpf: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, pattern="^(ativo|desligado)$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    fields: Fieldset = Depends(fieldset(Funcionario))
+):
+    """Get employees from the registry; filter by cpf for the history across companies"""
+    check_trabalhista_access(current_user)
+    funcionarios_collection = await get_funcionarios_collection()
+    
+    # Build query
+    query = {}
+    if empresa_id:
+        query["empresa_id"] = empresa_id
+    if cpf:
+        query["cpf"] = cpf
+    if status:
+        query["status"] = status
+    
+    funcionarios_cursor = funcionarios_collection.find(query, fields.projection()).sort("nome", 1).skip(skip).limit(limit)
+    funcionarios = fields.load(await funcionarios_cursor.to_list(length=None))
+    
+    return fields.response(funcionarios)
+
+@router.get("/funcionarios/headcount")
+async def get_headcount(
+    current_user: UserResponse = Depends(get_current_user),
+    empresa_id: Optional[str] = Query(None)
+):
+    """Active employees per company"""
+    check_trabalhista_access(current_user)
+    funcionarios_collection = await get_funcionarios_collection()
+    
+    match = {"status": "ativo"}
+    if empresa_id:
+        match["empresa_id"] = empresa_id
     
-    return solicitacoes
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$empresa_id", "empresa": {"$first": "$empresa"}, "ativos": {"$sum": 1}}},
+        {"$sort": {"_id": 1}}
+    ]
+    empresas = []
+    async for row in funcionarios_collection.aggregate(pipeline):
+        empresas.append({"empresa_id": row["_id"], "empresa": row["empresa"], "ativos": row["ativos"]})
+    
+    return {
+        "total": sum(empresa["ativos"] for empresa in empresas),
+        "empresas": empresas
+    }
+
+@router.post("/funcionarios/backfill", dependencies=[Depends(get_admin_user)])
+async def backfill_registro_funcionarios():
+    """Rebuild the employee registry from every admissao/demissao request"""
+    return await backfill_funcionarios()
 
 @router.get("/{solicitacao_id}", response_model=SolicitacaoTrabalhista)
 async def get_solicitacao(
@@ -100,25 +233,33 @@ async def update_solicitacao(
     check_trabalhista_access(current_user)
     trabalhista_collection = await get_trabalhista_collection()
     
-    # Check if solicitacao exists
-    existing_solicitacao = await trabalhista_collection.find_one({"id": solicitacao_id})
+    # Update fields
+    update_data = solicitacao_update.model_dump(exclude_unset=True)
+    if update_data:
+        update_data["updated_at"] = datetime.utcnow()
+    if update_data.get("prazo"):
+        # Same business-day rule as on create; a missing solicitacao 404s below
+        existing = await trabalhista_collection.find_one({"id": solicitacao_id}, {"_id": 0, "empresa_id": 1})
+        if existing:
+            update_data["prazo"] = business_calendar.adjust(update_data["prazo"], await get_client_cidade(existing["empresa_id"]))
+    
+    # The funcionarios registry needs the previous state; the new one is a plain $set away
+    existing_solicitacao, _ = await find_one_and_update_checked(
+        trabalhista_collection,
+        {"id": solicitacao_id},
+        {"$set": update_data} if update_data else None,
+        return_document=ReturnDocument.BEFORE
+    )
     if not existing_solicitacao:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Solicitacao not found"
         )
     
-    # Update fields
-    update_data = solicitacao_update.model_dump(exclude_unset=True)
+    updated_solicitacao_data = {**existing_solicitacao, **update_data}
     if update_data:
-        update_data["updated_at"] = datetime.utcnow()
-        await trabalhista_collection.update_one(
-            {"id": solicitacao_id}, 
-            {"$set": update_data}
-        )
-    
-    # Return updated solicitacao
-    updated_solicitacao_data = await trabalhista_collection.find_one({"id": solicitacao_id})
+        await sync_solicitacao(updated_solicitacao_data, existing_solicitacao)
+        await trabalhista_stats_cache.invalidate()
     return SolicitacaoTrabalhista(**updated_solicitacao_data)
 
 @router.delete("/{solicitacao_id}")
@@ -139,31 +280,70 @@ async def delete_solicitacao(
         )
     
     await trabalhista_collection.delete_one({"id": solicitacao_id})
+    await sync_solicitacao(existing_solicitacao)
+    await trabalhista_stats_cache.invalidate()
     return {"message": "Solicitacao deleted successfully"}
 
 @router.get("/stats/dashboard")
-async def get_dashboard_stats(current_user: UserResponse = Depends(get_current_user)):
+async def get_dashboard_stats(
+    current_user: UserResponse = Depends(get_current_user),
+    empresa_id: Optional[str] = Query(None)
+):
     """Get trabalhista dashboard statistics"""
     check_trabalhista_access(current_user)
+    
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    cities = None if current_user.role == "admin" else tuple(sorted(current_user.allowed_cities))
+    cache_key = (today, empresa_id, cities)
+    cached = await trabalhista_stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    versao = trabalhista_stats_cache.versao
+    
     trabalhista_collection = await get_trabalhista_collection()
     
-    # Count by status
-    status_stats = {}
-    status_list = ["pendente", "em_andamento", "concluido", "atrasado"]
+    # Build query
+    base_query = {}
+    if cities is not None:
+        empresa_ids = await get_empresa_ids_by_cities(list(cities))
+        if empresa_id:
+            empresa_ids = [item for item in empresa_ids if item == empresa_id]
+        base_query["empresa_id"] = {"$in": empresa_ids}
+    elif empresa_id:
+        base_query["empresa_id"] = empresa_id
     
-    for status_item in status_list:
-        count = await trabalhista_collection.count_documents({"status": status_item})
-        status_stats[status_item] = count
+    pipeline = [
+        {"$match": base_query},
+        {"$facet": {
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "tipo": [{"$group": {"_id": "$tipo", "count": {"$sum": 1}}}],
+            "atrasadas": [
+                {"$match": {"$or": [
+                    {"status": "atrasado"},
+                    {"status": {"$in": ["pendente", "em_andamento"]}, "prazo": {"$lt": today}}
+                ]}},
+                {"$group": {"_id": "$tipo", "count": {"$sum": 1}}}
+            ]
+        }}
+    ]
     
-    # Count by type
-    type_stats = {}
-    type_list = ["admissao", "demissao", "folha", "afastamento", "reclamacao"]
+    facets = {}
+    async for result in trabalhista_collection.aggregate(pipeline):
+        facets = result
     
-    for type_item in type_list:
-        count = await trabalhista_collection.count_documents({"tipo": type_item})
-        type_stats[type_item] = count
+    type_list = ["admissao", "demissao", "folha", "afastamento", "reclamacao"]
+    status_stats = {status_item: 0 for status_item in ["pendente", "em_andamento", "concluido", "atrasado"]}
+    status_stats.update({item["_id"]: item["count"] for item in facets.get("status", [])})
+    type_stats = {type_item: 0 for type_item in type_list}
+    type_stats.update({item["_id"]: item["count"] for item in facets.get("tipo", [])})
+    atrasadas_por_tipo = {type_item: 0 for type_item in type_list}
+    atrasadas_por_tipo.update({item["_id"]: item["count"] for item in facets.get("atrasadas", [])})
     
-    return {
+    stats = {
         "status_stats": status_stats,
-        "type_stats": type_stats
-    }
\ No newline at end of file
+        "type_stats": type_stats,
+        "atrasadas": sum(atrasadas_por_tipo.values()),
+        "atrasadas_por_tipo": atrasadas_por_tipo
+    }
+    trabalhista_stats_cache.set(cache_key, stats, versao)
+    return stats
\ No newline at end of file
@@ -1,11 +1,23 @@
 from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 from pathlib import Path
 
 # Import database connection
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, create_indexes, migrate_embedded_conversas
+from services.user_directory import user_directory
+from services.deadline_scheduler import deadline_scheduler
+from services.events import event_bus, transport_from_env, publish_task_reminder
+from services.business_calendar import business_calendar
+from services.sla import sla_monitor
+from services.assignment import assignment_service
+from services.ticket_dedup import ticket_dedup
+from services.inbound import inbound_queue
+from services.esocial import shutdown_process_pool
+from datetime import date
+from responses import FastResponse, NegotiationMiddleware
 
 # Import routes
 from routes.auth import router as auth_router
@@ -17,14 +29,39 @@ from routes.atendimento import router as atendimento_router
 from routes.configuracoes import router as configuracoes_router
 from routes.chat import router as chat_router
 from routes.tasks import router as tasks_router
+from routes.events import router as events_router
 
 # Lifespan events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    business_calendar.load(date.today().year - 1, date.today().year + 5)
     await connect_to_mongo()
+    await create_indexes()
+    await migrate_embedded_conversas()
+    event_bus.set_transport(transport_from_env())
+    await event_bus.start()
+    await user_directory.load()
+    deadline_scheduler.add_listener(publish_task_reminder)
+    await deadline_scheduler.load()
+    await sla_monitor.load()
+    await assignment_service.reconcile()
+    await ticket_dedup.load()
+    background_tasks = [
+        asyncio.create_task(user_directory.run()),
+        asyncio.create_task(deadline_scheduler.run()),
+        asyncio.create_task(sla_monitor.run()),
+        asyncio.create_task(assignment_service.run()),
+        asyncio.create_task(ticket_dedup.run()),
+        asyncio.create_task(inbound_queue.run())
+    ]
     yield
     # Shutdown
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    shutdown_process_pool()
+    await event_bus.stop()
     await close_mongo_connection()
 
 # Create the main app
@@ -32,7 +69,8 @@ app = FastAPI(
     title="Macedo SI API",
     description="Sistema Integrado de Gestão Contábil",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastResponse
 )
 
 # Create a router with the /api prefix
@@ -47,6 +85,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# JSON by default, MessagePack for clients sending Accept: application/msgpack
+app.add_middleware(NegotiationMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -73,6 +114,7 @@ api_router.include_router(atendimento_router)
 api_router.include_router(configuracoes_router)
 api_router.include_router(chat_router)
 api_router.include_router(tasks_router)
+api_router.include_router(events_router)
 
 # Include the API router in the main app
 app.include_router(api_router)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from database import get_atendimento_collection, get_users_collection
+
+logger = logging.getLogger(__name__)
+
+SETOR_ATENDIMENTO = "atendimento"
+# Tickets that still take an agent's time
+LOAD_STATUS = ["aberto", "em_andamento", "aguardando_cliente"]
+AGENT_FIELDS = {"_id": 0, "id": 1, "name": 1, "allowed_cities": 1, "allowed_sectors": 1}
+
+Pool = Tuple[str, Optional[str]]
+
+class AssignmentService:
+    """Least-loaded agent per (sector, city).
+
+    Each pool is a min-heap of (open tickets, seq, agent). Load changes push a
+    fresh entry and stale ones are skipped when they surface, so picking an
+    agent is O(log n). The agent each open ticket counts for is kept, so a
+    write only needs the ticket as stored afterwards. Counts are reconciled
+    against Mongo periodically.
+    """
+
+    def __init__(self):
+        self._names: Dict[str, str] = {}
+        self._loads: Dict[str, int] = {}
+        self._counted: Dict[str, str] = {}
+        self._pools: Dict[Pool, List[Tuple[int, int, str]]] = {}
+        self._agent_pools: Dict[str, Set[Pool]] = {}
+        self._counter = itertools.count()
+
+    def _push(self, agent_id: str):
+        entry_load = self._loads.get(agent_id, 0)
+        for pool in self._agent_pools.get(agent_id, ()):
+            heapq.heappush(self._pools[pool], (entry_load, next(self._counter), agent_id))
+
+    def _is_live(self, pool: Pool, entry: Tuple[int, int, str]) -> bool:
+        load, _, agent_id = entry
+        return pool in self._agent_pools.get(agent_id, ()) and self._loads.get(agent_id, 0) == load
+
+    def pick(self, cidade: Optional[str], setor: str = SETOR_ATENDIMENTO) -> Optional[Tuple[str, str]]:
+        """(id, name) of the least-loaded agent serving the city"""
+        heap = self._pools.get((setor, cidade))
+        while heap:
+            if self._is_live((setor, cidade), heap[0]):
+                agent_id = heap[0][2]
+                return agent_id, self._names[agent_id]
+            heapq.heappop(heap)
+        return None
+
+    def _add_load(self, agent_id: Optional[str], delta: int):
+        if not agent_id or agent_id not in self._agent_pools:
+            return
+        self._loads[agent_id] = max(self._loads.get(agent_id, 0) + delta, 0)
+        self._push(agent_id)
+
+    def track(self, ticket_data: dict):
+        """Apply the load change of a created/updated ticket"""
+        before = self._counted.pop(ticket_data["id"], None)
+        after = None
+        if ticket_data.get("status") in LOAD_STATUS and ticket_data.get("responsavel_id") in self._agent_pools:
+            after = ticket_data["responsavel_id"]
+            self._counted[ticket_data["id"]] = after
+        if before != after:
+            self._add_load(before, -1)
+            self._add_load(after, 1)
+
+    async def reconcile(self):
+        """Rebuild agents, pools and loads from Mongo"""
+        users_collection = await get_users_collection()
+        names: Dict[str, str] = {}
+        agent_pools: Dict[str, Set[Pool]] = {}
+        async for user_data in users_collection.find(
+            {"is_active": True, "allowed_sectors": SETOR_ATENDIMENTO}, AGENT_FIELDS
+        ):
+            names[user_data["id"]] = user_data["name"]
+            agent_pools[user_data["id"]] = {(SETOR_ATENDIMENTO, cidade) for cidade in user_data.get("allowed_cities", [])}
+
+        atendimento_collection = await get_atendimento_collection()
+        loads = {agent_id: 0 for agent_id in names}
+        counted: Dict[str, str] = {}
+        async for ticket_data in atendimento_collection.find(
+            {"status": {"$in": LOAD_STATUS}, "responsavel_id": {"$in": list(names)}},
+            {"_id": 0, "id": 1, "responsavel_id": 1}
+        ):
+            counted[ticket_data["id"]] = ticket_data["responsavel_id"]
+            loads[ticket_data["responsavel_id"]] += 1
+
+        pools: Dict[Pool, List[Tuple[int, int, str]]] = {}
+        for agent_id, agent_pool_keys in agent_pools.items():
+            for pool in agent_pool_keys:
+                pools.setdefault(pool, []).append((loads[agent_id], next(self._counter), agent_id))
+        for heap in pools.values():
+            heapq.heapify(heap)
+
+        self._names, self._loads, self._agent_pools, self._pools = names, loads, agent_pools, pools
+        self._counted = counted
+        logger.info("Assignment service tracking %d agents", len(names))
+
+    async def run(self, interval: float = 60.0):
+        """Reconcile periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Assignment reconcile failed")
+
+assignment_service = AssignmentService()
@@ -0,0 +1,169 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ReplaceOne
+
+from database import get_atendimento_collection, get_atendimento_rollups_collection
+
+# Upper bound (minutes) of each histogram bucket; a last open bucket holds the rest
+BUCKETS_MINUTOS = [5, 15, 30, 60, 120, 240, 480, 960, 1440, 2880, 5760, 10080, 20160]
+HIST_SIZE = len(BUCKETS_MINUTOS) + 1
+MAX_DIAS = 90
+MARCADOR_ID = "materializado_ate"
+
+def _bucket(inicio: str, fim: str) -> dict:
+    """Index of the histogram bucket of the minutes between two date fields"""
+    minutos = {"$divide": [{"$subtract": [fim, inicio]}, 60000]}
+    return {"$size": {"$filter": {"input": BUCKETS_MINUTOS, "as": "limite", "cond": {"$lt": ["$$limite", minutos]}}}}
+
+def _dia(field: str) -> dict:
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": field}}
+
+def rollup_pipeline(inicio: datetime, fim: datetime) -> List[dict]:
+    """Per (day, canal, responsavel) counters of tickets opened, first answered
+    and resolved in [inicio, fim); each event counts on the day it happened"""
+    periodo = {"$gte": inicio, "$lt": fim}
+    grupo = {"canal": "$canal", "responsavel": "$responsavel"}
+    return [
+        {"$match": {"$or": [
+            {"created_at": periodo},
+            {"primeira_resposta_em": periodo},
+            {"resolvido_em": periodo}
+        ]}},
+        {"$project": {"_id": 0, "canal": 1, "responsavel": 1, "sla": 1,
+                      "created_at": 1, "primeira_resposta_em": 1, "resolvido_em": 1}},
+        {"$facet": {
+            "abertos": [
+                {"$match": {"created_at": periodo}},
+                {"$group": {"_id": {**grupo, "dia": _dia("$created_at")}, "n": {"$sum": 1}}}
+            ],
+            "respostas": [
+                {"$match": {"primeira_resposta_em": periodo}},
+                {"$group": {
+                    "_id": {**grupo, "dia": _dia("$primeira_resposta_em"),
+                            "bucket": _bucket("$created_at", "$primeira_resposta_em")},
+                    "n": {"$sum": 1}
+                }}
+            ],
+            "resolucoes": [
+                {"$match": {"resolvido_em": periodo}},
+                {"$group": {
+                    "_id": {**grupo, "dia": _dia("$resolvido_em"),
+                            "bucket": _bucket("$created_at", "$resolvido_em"),
+                            "no_prazo": {"$lte": ["$resolvido_em", "$sla"]}},
+                    "n": {"$sum": 1}
+                }}
+            ]
+        }}
+    ]
+
+def _novo_rollup(dia: str, canal: str, responsavel: str) -> dict:
+    return {
+        "dia": dia, "canal": canal, "responsavel": responsavel,
+        "abertos": 0, "respondidos": 0, "resolvidos": 0, "sla_cumpridos": 0,
+        "primeira_resposta_hist": [0] * HIST_SIZE,
+        "resolucao_hist": [0] * HIST_SIZE
+    }
+
+async def calcular_rollups(inicio: datetime, fim: datetime) -> List[dict]:
+    atendimento_collection = await get_atendimento_collection()
+    facets = {}
+    async for result in atendimento_collection.aggregate(rollup_pipeline(inicio, fim)):
+        facets = result
+
+    rollups: Dict[Tuple[str, str, str], dict] = {}
+
+    def rollup(key: dict) -> dict:
+        chave = (key["dia"], key["canal"], key["responsavel"])
+        if chave not in rollups:
+            rollups[chave] = _novo_rollup(*chave)
+        return rollups[chave]
+
+    for row in facets.get("abertos", []):
+        rollup(row["_id"])["abertos"] += row["n"]
+    for row in facets.get("respostas", []):
+        doc = rollup(row["_id"])
+        doc["respondidos"] += row["n"]
+        doc["primeira_resposta_hist"][row["_id"]["bucket"]] += row["n"]
+    for row in facets.get("resolucoes", []):
+        doc = rollup(row["_id"])
+        doc["resolvidos"] += row["n"]
+        doc["resolucao_hist"][row["_id"]["bucket"]] += row["n"]
+        if row["_id"]["no_prazo"]:
+            doc["sla_cumpridos"] += row["n"]
+    return list(rollups.values())
+
+async def materializar_rollups(ate: date):
+    """Store the rollups of every closed day up to `ate` not stored yet"""
+    rollups_collection = await get_atendimento_rollups_collection()
+    marcador = await rollups_collection.find_one({"_id": MARCADOR_ID})
+    primeiro = ate - timedelta(days=MAX_DIAS - 1)
+    if marcador:
+        primeiro = max(primeiro, date.fromisoformat(marcador["ate"]) + timedelta(days=1))
+    if primeiro > ate:
+        return
+
+    inicio = datetime.combine(primeiro, time.min)
+    fim = datetime.combine(ate + timedelta(days=1), time.min)
+    operations = [
+        ReplaceOne({"dia": doc["dia"], "canal": doc["canal"], "responsavel": doc["responsavel"]}, doc, upsert=True)
+        for doc in await calcular_rollups(inicio, fim)
+    ]
+    operations.append(ReplaceOne({"_id": MARCADOR_ID}, {"ate": ate.isoformat()}, upsert=True))
+    await rollups_collection.bulk_write(operations, ordered=False)
+
+def percentil(hist: np.ndarray, p: float) -> Optional[float]:
+    """Percentile in minutes, interpolated inside the histogram bucket"""
+    total = hist.sum()
+    if total == 0:
+        return None
+    rank = p * total
+    acumulado = np.cumsum(hist)
+    index = int(np.searchsorted(acumulado, rank, side="left"))
+    inferior = BUCKETS_MINUTOS[index - 1] if index > 0 else 0
+    if index >= len(BUCKETS_MINUTOS):
+        return float(inferior)
+    anterior = acumulado[index - 1] if index > 0 else 0
+    fracao = (rank - anterior) / hist[index]
+    return round(inferior + (BUCKETS_MINUTOS[index] - inferior) * float(fracao), 1)
+
+def resumir(docs: List[dict]) -> dict:
+    primeira_resposta = np.sum([doc["primeira_resposta_hist"] for doc in docs], axis=0) if docs else np.zeros(HIST_SIZE)
+    resolucao = np.sum([doc["resolucao_hist"] for doc in docs], axis=0) if docs else np.zeros(HIST_SIZE)
+    resolvidos = sum(doc["resolvidos"] for doc in docs)
+    sla_cumpridos = sum(doc["sla_cumpridos"] for doc in docs)
+    return {
+        "abertos": sum(doc["abertos"] for doc in docs),
+        "resolvidos": resolvidos,
+        "sla_cumprimento": round(sla_cumpridos / resolvidos, 4) if resolvidos else None,
+        "primeira_resposta_minutos": {"p50": percentil(primeira_resposta, 0.5), "p90": percentil(primeira_resposta, 0.9)},
+        "resolucao_minutos": {"p50": percentil(resolucao, 0.5), "p90": percentil(resolucao, 0.9)}
+    }
+
+async def get_atendimento_stats(dias: int) -> dict:
+    """Stats of the last `dias` days: stored rollups for closed days, live for today"""
+    hoje = datetime.utcnow().date()
+    await materializar_rollups(hoje - timedelta(days=1))
+
+    primeiro = hoje - timedelta(days=dias - 1)
+    rollups_collection = await get_atendimento_rollups_collection()
+    docs = []
+    async for doc in rollups_collection.find(
+        {"dia": {"$gte": primeiro.isoformat(), "$lt": hoje.isoformat()}}, {"_id": 0}
+    ):
+        docs.append(doc)
+    docs.extend(await calcular_rollups(datetime.combine(hoje, time.min), datetime.combine(hoje + timedelta(days=1), time.min)))
+
+    por_canal: Dict[str, List[dict]] = {}
+    por_responsavel: Dict[str, List[dict]] = {}
+    for doc in docs:
+        por_canal.setdefault(doc["canal"], []).append(doc)
+        por_responsavel.setdefault(doc["responsavel"], []).append(doc)
+
+    return {
+        "periodo": {"inicio": primeiro.isoformat(), "fim": hoje.isoformat()},
+        **resumir(docs),
+        "por_canal": {canal: resumir(items) for canal, items in sorted(por_canal.items())},
+        "por_responsavel": {responsavel: resumir(items) for responsavel, items in sorted(por_responsavel.items())}
+    }
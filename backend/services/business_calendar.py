@@ -0,0 +1,195 @@
+import unicodedata
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# (month, day, name)
+NATIONAL_HOLIDAYS: List[Tuple[int, int, str]] = [
+    (1, 1, "Confraternização Universal"),
+    (4, 21, "Tiradentes"),
+    (5, 1, "Dia do Trabalho"),
+    (9, 7, "Independência do Brasil"),
+    (10, 12, "Nossa Senhora Aparecida"),
+    (11, 2, "Finados"),
+    (11, 15, "Proclamação da República"),
+    (12, 25, "Natal"),
+]
+
+# Dia Nacional de Zumbi e da Consciência Negra became a national holiday in 2024
+CONSCIENCIA_NEGRA_SINCE = 2024
+
+# Every year has more business days than this; sizes range extensions by rank
+MIN_BUSINESS_DAYS_PER_YEAR = 200
+
+# Days relative to Easter Sunday
+MOVEABLE_HOLIDAYS: List[Tuple[int, str]] = [
+    (-48, "Carnaval"),
+    (-47, "Carnaval"),
+    (-2, "Sexta-feira Santa"),
+    (60, "Corpus Christi"),
+]
+
+CITY_HOLIDAYS: Dict[str, List[Tuple[int, int, str]]] = {
+    "jacobina": [(7, 2, "Independência da Bahia")],
+    "ourolandia": [(7, 2, "Independência da Bahia")],
+    "umburanas": [(7, 2, "Independência da Bahia")],
+    "uberlandia": [(8, 15, "Nossa Senhora da Abadia"), (8, 31, "Aniversário de Uberlândia")],
+}
+
+def normalize_city(city: Optional[str]) -> Optional[str]:
+    """'Ourolândia' -> 'ourolandia'"""
+    if not city:
+        return None
+    normalized = unicodedata.normalize("NFKD", city).encode("ascii", "ignore").decode()
+    return normalized.strip().lower()
+
+def easter(year: int) -> date:
+    """Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def national_holidays(year: int) -> List[date]:
+    holidays = [date(year, month, day) for month, day, _ in NATIONAL_HOLIDAYS]
+    if year >= CONSCIENCIA_NEGRA_SINCE:
+        holidays.append(date(year, 11, 20))
+    easter_day = easter(year)
+    holidays.extend(easter_day + timedelta(days=offset) for offset, _ in MOVEABLE_HOLIDAYS)
+    return holidays
+
+class _CityCalendar:
+    """Precomputed lookup arrays for one city over the loaded range"""
+
+    def __init__(self, is_business: np.ndarray):
+        size = is_business.size
+        positions = np.arange(size)
+        self.is_business = is_business
+        self.business_days = np.flatnonzero(is_business).astype(np.int32)
+        # Rank of the first business day on or after each day (size when none is left)
+        self.next_rank = np.searchsorted(self.business_days, positions, side="left").astype(np.int32)
+        # Rank of the last business day on or before each day (-1 when none)
+        self.prev_rank = (np.searchsorted(self.business_days, positions, side="right") - 1).astype(np.int32)
+
+class BusinessCalendar:
+    """Business-day calendar per city, precomputed for a range of years.
+
+    Lookups are array indexing by day offset, so adjust() and
+    add_business_days() are O(1) and have vectorized variants.
+    """
+
+    def __init__(self):
+        self.first_year: Optional[int] = None
+        self.last_year: Optional[int] = None
+        self._start: Optional[np.datetime64] = None
+        self._cities: Dict[Optional[str], _CityCalendar] = {}
+
+    def load(self, first_year: int, last_year: int):
+        days = np.arange(f"{first_year}-01-01", f"{last_year + 1}-01-01", dtype="datetime64[D]")
+        # 1970-01-01 was a Thursday; shift so Monday == 0
+        weekday = (days.astype(np.int64) + 3) % 7
+        weekdays = weekday < 5
+
+        national = np.array(
+            [holiday for year in range(first_year, last_year + 1) for holiday in national_holidays(year)],
+            dtype="datetime64[D]"
+        )
+        base = weekdays & ~np.isin(days, national)
+
+        cities: Dict[Optional[str], _CityCalendar] = {None: _CityCalendar(base)}
+        for city, holidays in CITY_HOLIDAYS.items():
+            local = np.array(
+                [date(year, month, day) for year in range(first_year, last_year + 1) for month, day, _ in holidays],
+                dtype="datetime64[D]"
+            )
+            cities[city] = _CityCalendar(base & ~np.isin(days, local))
+
+        self.first_year = first_year
+        self.last_year = last_year
+        self._start = days[0]
+        self._cities = cities
+
+    def _ensure_loaded(self, year_min: int, year_max: int):
+        if self._start is None or year_min < self.first_year or year_max > self.last_year:
+            current = date.today().year
+            first = min(year_min, self.first_year or current)
+            last = max(year_max, self.last_year or current)
+            self.load(first, last)
+
+    def _extend_to_ranks(self, rank_min: int, rank_max: int, size: int) -> bool:
+        """Load more years when business-day ranks fall outside the loaded
+        range; True when the range changed and indexes must be recomputed"""
+        if rank_min < 0:
+            self._ensure_loaded(self.first_year - 1 - (-rank_min) // MIN_BUSINESS_DAYS_PER_YEAR, self.last_year)
+            return True
+        if rank_max >= size:
+            self._ensure_loaded(self.first_year, self.last_year + 1 + (rank_max - size) // MIN_BUSINESS_DAYS_PER_YEAR)
+            return True
+        return False
+
+    def _calendar(self, city: Optional[str]) -> _CityCalendar:
+        return self._cities.get(normalize_city(city), self._cities[None])
+
+    def _index(self, day: date) -> int:
+        # Reaching past the loaded range extends it by whole years
+        self._ensure_loaded(day.year - 1, day.year + 1)
+        return int((np.datetime64(day, "D") - self._start).astype(np.int64))
+
+    def _to_date(self, index: int) -> date:
+        return (self._start + np.timedelta64(int(index), "D")).astype(date)
+
+    def is_business_day(self, day: date, city: Optional[str] = None) -> bool:
+        index = self._index(day)
+        return bool(self._calendar(city).is_business[index])
+
+    def adjust(self, day: date, city: Optional[str] = None, backward: bool = False) -> date:
+        """Move a non-business day to the next (or previous) business day"""
+        index = self._index(day)
+        calendar = self._calendar(city)
+        rank = calendar.prev_rank[index] if backward else calendar.next_rank[index]
+        return self._to_date(calendar.business_days[rank])
+
+    def add_business_days(self, day: date, days: int, city: Optional[str] = None) -> date:
+        """Business day `days` business days after day (day itself is adjusted
+        forward first); negative `days` count backwards from the adjusted day,
+        as numpy.busday_offset(roll="forward") does"""
+        while True:
+            index = self._index(day)
+            calendar = self._calendar(city)
+            rank = int(calendar.next_rank[index]) + int(days)
+            if not self._extend_to_ranks(rank, rank, calendar.business_days.size):
+                return self._to_date(calendar.business_days[rank])
+
+    def _indexes(self, days: np.ndarray) -> np.ndarray:
+        days = np.asarray(days, dtype="datetime64[D]")
+        if days.size:
+            years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+            self._ensure_loaded(int(years.min()) - 1, int(years.max()) + 1)
+        return (days - self._start).astype(np.int64)
+
+    def adjust_many(self, days: np.ndarray, city: Optional[str] = None, backward: bool = False) -> np.ndarray:
+        """Vectorized adjust() over a datetime64[D] array"""
+        indexes = self._indexes(days)
+        calendar = self._calendar(city)
+        ranks = (calendar.prev_rank if backward else calendar.next_rank)[indexes]
+        return self._start + calendar.business_days[ranks].astype("timedelta64[D]")
+
+    def add_business_days_many(self, days: np.ndarray, count, city: Optional[str] = None) -> np.ndarray:
+        """Vectorized add_business_days(); count may be a scalar or an array"""
+        count = np.asarray(count, dtype=np.int64)
+        while True:
+            indexes = self._indexes(days)
+            calendar = self._calendar(city)
+            ranks = calendar.next_rank[indexes] + count
+            if not ranks.size or not self._extend_to_ranks(int(ranks.min()), int(ranks.max()), calendar.business_days.size):
+                return self._start + calendar.business_days[ranks].astype("timedelta64[D]")
+
+business_calendar = BusinessCalendar()
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from pymongo import ReturnDocument
+
+from database import get_cache_versoes_collection
+
+# How stale another worker's invalidation may be before this process notices it
+CHECK_INTERVAL = 1.0
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, ttl: float, maxsize: int = 256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+class SharedCache:
+    """TTLCache whose invalidation reaches every worker.
+
+    invalidate() bumps a version counter in Mongo (cache_versoes, one
+    document per cache name); reads compare the local version with it at
+    most once per check_interval and drop every entry when it changed.
+    Callers pass the version read before computing a value to set(), so a
+    value computed while an invalidation happened is not stored.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 256, check_interval: float = CHECK_INTERVAL):
+        self.name = name
+        self.check_interval = check_interval
+        self.versao: Optional[int] = None
+        self._checked_at = 0.0
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    async def _sync(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        versoes_collection = await get_cache_versoes_collection()
+        versao_data = await versoes_collection.find_one({"_id": self.name})
+        versao = versao_data["versao"] if versao_data else 0
+        if versao != self.versao:
+            self._cache.clear()
+            self.versao = versao
+        self._checked_at = time.monotonic()
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        await self._sync()
+        return self._cache.get(key)
+
+    def set(self, key: Hashable, value: Any, versao: Optional[int]):
+        """Store a value computed at `versao` (self.versao after get())"""
+        if versao == self.versao:
+            self._cache.set(key, value)
+
+    async def invalidate(self) -> int:
+        """Bump the version after a write; returns the new version"""
+        versoes_collection = await get_cache_versoes_collection()
+        versao_data = await versoes_collection.find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"versao": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._cache.clear()
+        self.versao = versao_data["versao"]
+        self._checked_at = time.monotonic()
+        return self.versao
@@ -0,0 +1,86 @@
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+
+from database import get_configuracoes_collection, get_configuracoes_versao_collection
+
+M = TypeVar("M", bound=BaseModel)
+
+VERSAO_ID = "configuracoes"
+# How stale another worker's write may be before this process notices it
+CHECK_INTERVAL = 1.0
+
+class ConfigCache:
+    """Read-through cache of configuracoes payloads keyed by (setor, nome).
+
+    Every write bumps a global version counter; a read compares the cached
+    version with it at most once per CHECK_INTERVAL (one find_one by _id)
+    and drops everything when another worker changed a configuracao.
+    Cached payloads are shared: callers must treat them as read-only.
+    """
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._versao: Optional[int] = None
+        self._checked_at = 0.0
+        self._entries: Dict[Hashable, Any] = {}
+
+    async def _sync(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        versao_collection = await get_configuracoes_versao_collection()
+        versao_data = await versao_collection.find_one({"_id": VERSAO_ID})
+        versao = versao_data["versao"] if versao_data else 0
+        if versao != self._versao:
+            self._entries.clear()
+            self._versao = versao
+        self._checked_at = time.monotonic()
+
+    async def get(self, setor: str, nome: str) -> Optional[Dict[str, Any]]:
+        await self._sync()
+        key: Tuple[str, str] = (setor, nome)
+        if key in self._entries:
+            return self._entries[key]
+        versao = self._versao
+        configuracoes_collection = await get_configuracoes_collection()
+        config_data = await configuracoes_collection.find_one(
+            {"setor": setor, "nome": nome},
+            {"_id": 0, "configuracoes": 1},
+            sort=[("updated_at", -1)]
+        )
+        # Missing documents are cached too, callers fall back to their defaults
+        payload = config_data["configuracoes"] if config_data else None
+        # Not stored when an invalidation happened during the read: it may be stale
+        if self._versao == versao:
+            self._entries[key] = payload
+        return payload
+
+    async def invalidate(self) -> int:
+        """Bump the global version after a write; returns the new version"""
+        versao_collection = await get_configuracoes_versao_collection()
+        versao_data = await versao_collection.find_one_and_update(
+            {"_id": VERSAO_ID},
+            {"$inc": {"versao": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._entries.clear()
+        self._versao = versao_data["versao"]
+        self._checked_at = time.monotonic()
+        return self._versao
+
+config_cache = ConfigCache()
+
+async def get_configuracao(setor: str, nome: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Return the `configuracoes` payload of a setor/nome document"""
+    payload = await config_cache.get(setor, nome)
+    return default if payload is None else payload
+
+async def get_configuracao_model(setor: str, nome: str, model: Type[M], default: Optional[M] = None) -> Optional[M]:
+    """Typed access: the payload validated as `model`, or `default` when missing"""
+    payload = await config_cache.get(setor, nome)
+    if payload is None:
+        return default
+    return model.model_validate(payload)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import get_tasks_collection, get_task_reminders_collection
+from models.task import TaskReminder
+from services.timers import TimerHeap
+
+logger = logging.getLogger(__name__)
+
+OPEN_TASK_STATUS = ["pendente", "em_andamento"]
+TASK_DEADLINE_FIELDS = {"_id": 0, "id": 1, "titulo": 1, "status": 1, "responsavel_id": 1, "data_prazo": 1}
+
+def reminder_offsets_from_env() -> List[int]:
+    """Reminder offsets in days before data_prazo, e.g. TASK_REMINDER_OFFSETS=3,1,0"""
+    raw = os.getenv("TASK_REMINDER_OFFSETS", "3,1,0")
+    return sorted({int(value) for value in raw.split(",") if value.strip()}, reverse=True)
+
+def as_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+ReminderListener = Callable[[TaskReminder], Awaitable[None]]
+
+class DeadlineScheduler:
+    """Emits reminders as task deadlines approach.
+
+    Only deadlines inside a rolling window are kept in memory. The window is
+    loaded with a range query on data_prazo and extended once it runs out,
+    so ticks never scan the tasks collection.
+    """
+
+    def __init__(self, offsets: Optional[List[int]] = None, window_days: int = 7):
+        self.offsets = offsets if offsets is not None else reminder_offsets_from_env()
+        self.window_days = window_days
+        self.listeners: List[ReminderListener] = []
+        self._timers = TimerHeap()
+        self._loaded_until: Optional[date] = None
+        self._wakeup = asyncio.Event()
+
+    @property
+    def max_offset(self) -> int:
+        return max(self.offsets, default=0)
+
+    def add_listener(self, listener: ReminderListener):
+        self.listeners.append(listener)
+
+    def _timers_for(self, task_data: dict, today: date):
+        prazo = as_date(task_data.get("data_prazo"))
+        if prazo is None or task_data.get("status") not in OPEN_TASK_STATUS:
+            return []
+        timers = []
+        for offset in self.offsets:
+            fire_day = prazo - timedelta(days=offset)
+            if fire_day >= today:
+                timers.append((datetime.combine(fire_day, time.min), offset))
+        return timers
+
+    def schedule(self, task_data: dict):
+        """Track a created or updated task"""
+        if self._loaded_until is None:
+            return
+        prazo = as_date(task_data.get("data_prazo"))
+        if prazo is not None and prazo > self._loaded_until:
+            # Picked up by the range query when the window reaches it
+            self._timers.cancel(task_data["id"])
+            return
+        self._timers.replace(task_data["id"], [
+            (when, {**task_data, "offset": offset})
+            for when, offset in self._timers_for(task_data, datetime.utcnow().date())
+        ])
+        self._wakeup.set()
+
+    async def load_window(self, start: date, end: date):
+        """Load open tasks whose data_prazo falls in [start, end]"""
+        tasks_collection = await get_tasks_collection()
+        query = {
+            "data_prazo": {
+                "$gte": datetime.combine(start, time.min),
+                "$lte": datetime.combine(end, time.min)
+            },
+            "status": {"$in": OPEN_TASK_STATUS}
+        }
+        today = datetime.utcnow().date()
+        count = 0
+        async for task_data in tasks_collection.find(query, TASK_DEADLINE_FIELDS):
+            self._timers.replace(task_data["id"], [
+                (when, {**task_data, "offset": offset})
+                for when, offset in self._timers_for(task_data, today)
+            ])
+            count += 1
+        self._loaded_until = end
+        logger.info("Deadline scheduler loaded %d tasks due until %s", count, end)
+
+    async def load(self):
+        """Initial load: every deadline with a reminder from today on"""
+        self._timers.clear()
+        today = datetime.utcnow().date()
+        await self.load_window(today, today + timedelta(days=self.max_offset + self.window_days))
+
+    async def _extend_window_if_needed(self, today: date):
+        # Reminders fire up to max_offset days before the deadline
+        if self._loaded_until - timedelta(days=self.max_offset) <= today:
+            start = self._loaded_until + timedelta(days=1)
+            await self.load_window(start, self._loaded_until + timedelta(days=self.window_days))
+
+    async def _emit(self, payload: dict):
+        prazo = as_date(payload["data_prazo"])
+        reminder = TaskReminder(
+            task_id=payload["id"],
+            usuario_id=payload["responsavel_id"],
+            titulo=payload["titulo"],
+            data_prazo=prazo,
+            dias_restantes=payload["offset"]
+        )
+        reminders_collection = await get_task_reminders_collection()
+        try:
+            await reminders_collection.insert_one(reminder.model_dump())
+        except DuplicateKeyError:
+            # Already emitted by another worker or before a restart
+            return
+        for listener in self.listeners:
+            try:
+                await listener(reminder)
+            except Exception:
+                logger.exception("Task reminder listener failed")
+
+    async def run(self, max_sleep: float = 60.0):
+        """Fire due reminders until cancelled"""
+        while True:
+            now = datetime.utcnow()
+            try:
+                await self._extend_window_if_needed(now.date())
+                for _, _, payload in self._timers.pop_due(now):
+                    await self._emit(payload)
+            except Exception:
+                logger.exception("Deadline scheduler tick failed")
+
+            next_deadline = self._timers.next_deadline()
+            timeout = max_sleep
+            if next_deadline is not None:
+                timeout = min(max_sleep, max((next_deadline - datetime.utcnow()).total_seconds(), 0))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+deadline_scheduler = DeadlineScheduler()
@@ -0,0 +1,343 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import XMLGenerator
+
+import numpy as np
+
+from database import ROOT_DIR, get_clients_collection, get_funcionarios_collection, get_trabalhista_collection
+from services.folha import calcular_folha, carregar_quadro, carregar_tabelas, competencia_range
+
+# 1 - Produção, 2 - Produção restrita
+TP_AMB = os.getenv("ESOCIAL_TP_AMB", "2")
+VER_PROC = "macedo-si-1.0"
+ESOCIAL_DIR = Path(os.getenv("ESOCIAL_DIR", str(ROOT_DIR / "esocial")))
+ESOCIAL_WORKERS = int(os.getenv("ESOCIAL_WORKERS", str(os.cpu_count() or 2)))
+
+# An envioLoteEventos carries at most 50 events of a single group
+LOTE_MAX = 50
+GRUPO_NAO_PERIODICOS = "2"
+GRUPO_PERIODICOS = "3"
+
+NS_LOTE = "http://www.esocial.gov.br/schema/lote/eventos/envio/v1_1_1"
+NS_EVENTOS = {
+    "S-2200": ("evtAdmissao", "http://www.esocial.gov.br/schema/evt/evtAdmissao/v_S_01_02_00"),
+    "S-2299": ("evtDeslig", "http://www.esocial.gov.br/schema/evt/evtDeslig/v_S_01_02_00"),
+    "S-1200": ("evtRemun", "http://www.esocial.gov.br/schema/evt/evtRemun/v_S_01_02_00"),
+}
+GRUPOS = {"S-2200": GRUPO_NAO_PERIODICOS, "S-2299": GRUPO_NAO_PERIODICOS, "S-1200": GRUPO_PERIODICOS}
+
+# Company payroll item codes reported in S-1200 (ideTabRubr "1")
+RUBRICAS = {"salario": "1000", "inss": "9201", "irrf": "9203"}
+COD_CATEG_EMPREGADO = "101"
+# Tabela 19 - "Rescisão sem justa causa, por iniciativa do empregador"
+MTV_DESLIG_PADRAO = "02"
+
+def somente_digitos(valor: str) -> str:
+    return re.sub(r"\D", "", valor or "")
+
+def formatar_valor(valor: float) -> str:
+    return f"{valor:.2f}"
+
+def formatar_data(valor) -> str:
+    return valor.strftime("%Y-%m-%d") if valor else ""
+
+class _Writer:
+    """Thin helper over XMLGenerator for nested elements"""
+
+    def __init__(self, xml: XMLGenerator):
+        self.xml = xml
+
+    def open(self, name: str, attrs: Optional[Dict[str, str]] = None):
+        self.xml.startElement(name, attrs or {})
+
+    def close(self, name: str):
+        self.xml.endElement(name)
+
+    def text(self, name: str, value):
+        if value is None or value == "":
+            return
+        self.xml.startElement(name, {})
+        self.xml.characters(str(value))
+        self.xml.endElement(name)
+
+def _ide_evento(w: _Writer, per_apur: Optional[str] = None):
+    w.open("ideEvento")
+    w.text("indRetif", "1")
+    if per_apur:
+        w.text("indApuracao", "1")
+        w.text("perApur", per_apur)
+    w.text("tpAmb", TP_AMB)
+    w.text("procEmi", "1")
+    w.text("verProc", VER_PROC)
+    w.close("ideEvento")
+
+def _ide_empregador(w: _Writer, cnpj: str):
+    w.open("ideEmpregador")
+    w.text("tpInsc", "1")
+    w.text("nrInsc", cnpj[:8])
+    w.close("ideEmpregador")
+
+def _escrever_s2200(w: _Writer, empresa: dict, evento: dict):
+    _ide_evento(w)
+    _ide_empregador(w, empresa["cnpj"])
+    w.open("trabalhador")
+    w.text("cpfTrab", evento["cpf"])
+    w.text("nmTrab", evento["nome"])
+    w.close("trabalhador")
+    w.open("vinculo")
+    w.text("matricula", evento["matricula"])
+    w.text("tpRegTrab", "1")
+    w.text("tpRegPrev", "1")
+    w.open("infoRegimeTrab")
+    w.open("infoCeletista")
+    w.text("dtAdm", evento["data"])
+    w.text("tpAdmissao", "1")
+    w.text("indAdmissao", "1")
+    w.text("tpRegJor", "1")
+    w.text("natAtividade", "1")
+    w.close("infoCeletista")
+    w.close("infoRegimeTrab")
+    w.open("infoContrato")
+    w.text("nmCargo", evento["funcao"])
+    w.text("codCateg", COD_CATEG_EMPREGADO)
+    if evento.get("salario"):
+        w.open("remuneracao")
+        w.text("vrSalFx", formatar_valor(evento["salario"]))
+        w.text("undSalFixo", "5")
+        w.close("remuneracao")
+    w.open("duracao")
+    w.text("tpContr", "1")
+    w.close("duracao")
+    w.close("infoContrato")
+    w.close("vinculo")
+
+def _escrever_s2299(w: _Writer, empresa: dict, evento: dict):
+    _ide_evento(w)
+    _ide_empregador(w, empresa["cnpj"])
+    w.open("ideVinculo")
+    w.text("cpfTrab", evento["cpf"])
+    w.text("matricula", evento["matricula"])
+    w.close("ideVinculo")
+    w.open("infoDeslig")
+    w.text("mtvDeslig", evento.get("mtv_deslig") or MTV_DESLIG_PADRAO)
+    w.text("dtDeslig", evento["data"])
+    w.text("indPagtoAPI", "N")
+    w.text("pensAlim", "0")
+    w.close("infoDeslig")
+
+def _escrever_s1200(w: _Writer, empresa: dict, evento: dict):
+    _ide_evento(w, per_apur=evento["competencia"])
+    _ide_empregador(w, empresa["cnpj"])
+    w.open("ideTrabalhador")
+    w.text("cpfTrab", evento["cpf"])
+    w.close("ideTrabalhador")
+    w.open("dmDev")
+    w.text("ideDmDev", f"{evento['competencia']}-{evento['matricula'][:20]}")
+    w.text("codCateg", COD_CATEG_EMPREGADO)
+    w.open("infoPerApur")
+    w.open("ideEstabLot")
+    w.text("tpInsc", "1")
+    w.text("nrInsc", empresa["cnpj"])
+    w.text("codLotacao", "1")
+    w.open("remunPerApur")
+    w.text("matricula", evento["matricula"])
+    for rubrica, valor in evento["rubricas"]:
+        w.open("itensRemun")
+        w.text("codRubr", rubrica)
+        w.text("ideTabRubr", "1")
+        w.text("vrRubr", formatar_valor(valor))
+        w.close("itensRemun")
+    w.close("remunPerApur")
+    w.close("ideEstabLot")
+    w.close("infoPerApur")
+    w.close("dmDev")
+
+WRITERS = {"S-2200": _escrever_s2200, "S-2299": _escrever_s2299, "S-1200": _escrever_s1200}
+
+def matricula(funcionario_id: str) -> str:
+    """eSocial matricula is limited to 30 characters"""
+    return funcionario_id.replace("-", "")[:30]
+
+def evento_id(cnpj: str, gerado_em: datetime, sequencia: int) -> str:
+    """ID + tpInsc + nrInsc (14) + AAAAMMDDHHMMSS + sequence (5)"""
+    return f"ID1{cnpj[:8].ljust(14, '0')}{gerado_em:%Y%m%d%H%M%S}{sequencia:05d}"
+
+def dividir_lotes(eventos: List[dict]) -> List[Tuple[str, List[dict]]]:
+    """Split events into lotes of one group and at most LOTE_MAX events"""
+    lotes = []
+    for grupo in (GRUPO_NAO_PERIODICOS, GRUPO_PERIODICOS):
+        do_grupo = [evento for evento in eventos if GRUPOS[evento["tipo"]] == grupo]
+        for inicio in range(0, len(do_grupo), LOTE_MAX):
+            lotes.append((grupo, do_grupo[inicio:inicio + LOTE_MAX]))
+    return lotes
+
+def iter_lote_xml(empresa: dict, grupo: str, eventos: List[dict]) -> Iterator[bytes]:
+    """Yield the envioLoteEventos document one event at a time"""
+    buffer = io.BytesIO()
+    xml = XMLGenerator(buffer, encoding="utf-8", short_empty_elements=True)
+    w = _Writer(xml)
+
+    def drain() -> bytes:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    xml.startDocument()
+    w.open("eSocial", {"xmlns": NS_LOTE})
+    w.open("envioLoteEventos", {"grupo": grupo})
+    w.open("ideEmpregador")
+    w.text("tpInsc", "1")
+    w.text("nrInsc", empresa["cnpj"][:8])
+    w.close("ideEmpregador")
+    w.open("ideTransmissor")
+    w.text("tpInsc", "1")
+    w.text("nrInsc", empresa["cnpj"])
+    w.close("ideTransmissor")
+    w.open("eventos")
+    yield drain()
+
+    for evento in eventos:
+        tag, namespace = NS_EVENTOS[evento["tipo"]]
+        w.open("evento", {"Id": evento["id"]})
+        w.open("eSocial", {"xmlns": namespace})
+        w.open(tag, {"Id": evento["id"]})
+        WRITERS[evento["tipo"]](w, empresa, evento)
+        w.close(tag)
+        w.close("eSocial")
+        w.close("evento")
+        yield drain()
+
+    w.close("eventos")
+    w.close("envioLoteEventos")
+    w.close("eSocial")
+    xml.endDocument()
+    yield drain()
+
+def gravar_lotes(dados: dict, diretorio: str) -> List[dict]:
+    """Write every lote of a company to disk; runs inside worker processes"""
+    empresa = dados["empresa"]
+    destino = Path(diretorio)
+    destino.mkdir(parents=True, exist_ok=True)
+    arquivos = []
+    for numero, (grupo, eventos) in enumerate(dividir_lotes(dados["eventos"]), start=1):
+        path = destino / f"{empresa['id']}_{dados['competencia']}_{numero:03d}.xml"
+        with open(path, "wb") as file:
+            for chunk in iter_lote_xml(empresa, grupo, eventos):
+                file.write(chunk)
+        arquivos.append({"arquivo": str(path), "grupo": grupo, "eventos": len(eventos)})
+    return arquivos
+
+async def carregar_eventos(empresa_id: str, competencia: str) -> Optional[dict]:
+    """Plain (picklable) event data of a company for a competencia"""
+    inicio, fim = competencia_range(competencia)
+    clients_collection = await get_clients_collection()
+    client_data = await clients_collection.find_one(
+        {"id": empresa_id}, {"_id": 0, "id": 1, "nome_empresa": 1, "cnpj": 1}
+    )
+    if not client_data:
+        return None
+    empresa = {"id": empresa_id, "nome": client_data["nome_empresa"], "cnpj": somente_digitos(client_data["cnpj"])}
+
+    trabalhista_collection = await get_trabalhista_collection()
+    solicitacoes = []
+    async for solicitacao_data in trabalhista_collection.find(
+        {"empresa_id": empresa_id, "tipo": {"$in": ["admissao", "demissao", "folha"]},
+         "data_solicitacao": {"$gte": inicio, "$lt": fim}},
+        {"_id": 0, "tipo": 1, "data_solicitacao": 1, "funcionario": 1}
+    ).sort("data_solicitacao", 1):
+        solicitacoes.append(solicitacao_data)
+
+    funcionarios_collection = await get_funcionarios_collection()
+    matriculas = {}
+    async for funcionario_data in funcionarios_collection.find({"empresa_id": empresa_id}, {"_id": 0, "id": 1, "cpf": 1}):
+        matriculas[funcionario_data["cpf"]] = matricula(funcionario_data["id"])
+
+    gerado_em = datetime.utcnow()
+    eventos = []
+
+    def adicionar(tipo: str, **dados):
+        eventos.append({"id": evento_id(empresa["cnpj"], gerado_em, len(eventos) + 1), "tipo": tipo, **dados})
+
+    for solicitacao in solicitacoes:
+        funcionario = solicitacao.get("funcionario")
+        if solicitacao["tipo"] == "folha" or not funcionario:
+            continue
+        cpf = somente_digitos(funcionario["cpf"])
+        comum = {"cpf": cpf, "matricula": matriculas.get(funcionario["cpf"], cpf)}
+        if solicitacao["tipo"] == "admissao":
+            adicionar("S-2200", nome=funcionario["nome"], funcao=funcionario["funcao"],
+                      salario=funcionario.get("salario"),
+                      data=formatar_data(funcionario.get("data_admissao") or solicitacao["data_solicitacao"]),
+                      **comum)
+        else:
+            adicionar("S-2299", data=formatar_data(solicitacao["data_solicitacao"]), **comum)
+
+    if any(solicitacao["tipo"] == "folha" for solicitacao in solicitacoes):
+        quadro = await carregar_quadro([empresa_id], inicio, fim)
+        if quadro:
+            salarios = np.array([funcionario["salario"] for funcionario in quadro], dtype=float)
+            dependentes = np.array([funcionario["dependentes"] for funcionario in quadro], dtype=float)
+            folha = calcular_folha(salarios, dependentes, await carregar_tabelas())
+            for index, funcionario in enumerate(quadro):
+                rubricas = [(RUBRICAS["salario"], float(salarios[index]))]
+                rubricas += [(RUBRICAS[nome], float(folha[nome][index])) for nome in ("inss", "irrf") if folha[nome][index] > 0]
+                adicionar("S-1200", competencia=competencia, cpf=somente_digitos(funcionario["cpf"]),
+                          matricula=matricula(funcionario["id"]), rubricas=rubricas)
+
+    return {"empresa": empresa, "competencia": competencia, "eventos": eventos}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def process_pool() -> ProcessPoolExecutor:
+    """Pool shared by the whole process, started on first use.
+
+    Workers are spawned, not forked: a fork of the server process copies
+    locks held by motor's and uvicorn's threads, which can deadlock the child.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=ESOCIAL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_process_pool():
+    """Stop the worker processes (shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+async def gerar_lotes_competencia(competencia: str) -> dict:
+    """Write the eSocial lotes of every company with movement in the competencia,
+    one task per company on the shared process pool"""
+    inicio, fim = competencia_range(competencia)
+    trabalhista_collection = await get_trabalhista_collection()
+    empresa_ids = await trabalhista_collection.distinct(
+        "empresa_id",
+        {"tipo": {"$in": ["admissao", "demissao", "folha"]}, "data_solicitacao": {"$gte": inicio, "$lt": fim}}
+    )
+    dados = [d for d in await asyncio.gather(*(carregar_eventos(e, competencia) for e in empresa_ids)) if d and d["eventos"]]
+    if not dados:
+        return {"competencia": competencia, "empresas": 0, "eventos": 0, "arquivos": []}
+
+    diretorio = str(ESOCIAL_DIR / competencia)
+    loop = asyncio.get_running_loop()
+    pool = process_pool()
+    resultados = await asyncio.gather(*(
+        loop.run_in_executor(pool, gravar_lotes, empresa_dados, diretorio) for empresa_dados in dados
+    ))
+
+    arquivos = [arquivo for resultado in resultados for arquivo in resultado]
+    return {
+        "competencia": competencia,
+        "empresas": len(dados),
+        "eventos": sum(len(empresa_dados["eventos"]) for empresa_dados in dados),
+        "arquivos": arquivos
+    }
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Callable, List, Optional, Set
+
+from pydantic import BaseModel, Field
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from database import get_database
+from models.user import UserResponse
+
+logger = logging.getLogger(__name__)
+
+class Event(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    tipo: str
+    recurso: str
+    recurso_id: str
+    dados: dict = {}
+    # Audience: users listed explicitly plus anyone allowed in one of the sectors
+    usuarios: List[str] = []
+    setores: List[str] = []
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+Dispatch = Callable[[Event], None]
+
+class InMemoryTransport:
+    """Delivers events inside the current process (single node and tests)"""
+
+    async def start(self, dispatch: Dispatch):
+        self._dispatch = dispatch
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: Event):
+        self._dispatch(event)
+
+class MongoTransport:
+    """Fans events out across workers through a capped collection.
+
+    Every worker, including the publisher, receives events by tailing the
+    collection, so delivery order is the same everywhere.
+    """
+
+    def __init__(self, collection_name: str = "events", size_bytes: int = 16 * 1024 * 1024):
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self._task: Optional[asyncio.Task] = None
+
+    async def _collection(self):
+        database = await get_database()
+        return database[self.collection_name]
+
+    async def start(self, dispatch: Dispatch):
+        database = await get_database()
+        try:
+            await database.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        self._task = asyncio.create_task(self._tail(dispatch))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _tail(self, dispatch: Dispatch):
+        # Resume by position, never by comparing _ids: they are ObjectIds made
+        # by each publisher's driver, so they do not sort in insert order
+        # across workers. The cursor walks the capped collection in $natural
+        # (insert) order; after a reopen it skips up to the last document seen.
+        collection = await self._collection()
+        last = await collection.find_one({}, sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+        while True:
+            try:
+                # Gone only if the capped collection turned over since: every
+                # remaining document is newer, deliver them all
+                skipping = last_id is not None and await collection.count_documents({"_id": last_id}, limit=1) > 0
+                cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT, sort=[("$natural", 1)])
+                async for event_data in cursor:
+                    event_id = event_data.pop("_id")
+                    if skipping:
+                        skipping = event_id != last_id
+                        continue
+                    last_id = event_id
+                    dispatch(Event(**event_data))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event transport tail failed")
+            # Tailable cursors die on an empty collection; retry shortly
+            await asyncio.sleep(0.5)
+
+    async def publish(self, event: Event):
+        collection = await self._collection()
+        await collection.insert_one(event.model_dump())
+
+def transport_from_env():
+    if os.getenv("EVENT_TRANSPORT", "memory") == "mongo":
+        return MongoTransport()
+    return InMemoryTransport()
+
+class Subscription:
+    def __init__(self, user: UserResponse, maxsize: int = 100):
+        self.user = user
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def accepts(self, event: Event) -> bool:
+        if self.user.role == "admin" or self.user.id in event.usuarios:
+            return True
+        return any(setor in self.user.allowed_sectors for setor in event.setores)
+
+    def deliver(self, event: Event):
+        if self.queue.full():
+            # Slow consumer: drop the oldest event rather than block publishers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Event:
+        return await self.queue.get()
+
+class EventBus:
+    """Publish/subscribe hub for change notifications"""
+
+    def __init__(self, transport=None):
+        self.transport = transport or InMemoryTransport()
+        self._subscriptions: Set[Subscription] = set()
+
+    def set_transport(self, transport):
+        self.transport = transport
+
+    async def start(self):
+        await self.transport.start(self._dispatch)
+
+    async def stop(self):
+        await self.transport.stop()
+
+    def _dispatch(self, event: Event):
+        for subscription in list(self._subscriptions):
+            if subscription.accepts(event):
+                subscription.deliver(event)
+
+    async def publish(self, event: Event):
+        try:
+            await self.transport.publish(event)
+        except Exception:
+            # Notifications must never fail the write that triggered them
+            logger.exception("Failed to publish event %s", event.tipo)
+
+    def subscribe(self, user: UserResponse) -> Subscription:
+        subscription = Subscription(user)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+event_bus = EventBus()
+
+def task_event(tipo: str, task_data: dict) -> Event:
+    return Event(
+        tipo=tipo,
+        recurso="task",
+        recurso_id=task_data["id"],
+        dados={key: task_data.get(key) for key in ("titulo", "status", "prioridade", "responsavel_id", "data_prazo")},
+        usuarios=[task_data["criador_id"], task_data["responsavel_id"]]
+    )
+
+def ticket_event(tipo: str, ticket_data: dict) -> Event:
+    return Event(
+        tipo=tipo,
+        recurso="ticket",
+        recurso_id=ticket_data["id"],
+        dados={key: ticket_data.get(key) for key in ("titulo", "status", "prioridade", "responsavel", "empresa")},
+        setores=["atendimento"]
+    )
+
+async def publish_task_reminder(reminder):
+    await event_bus.publish(Event(
+        tipo="task.reminder",
+        recurso="task",
+        recurso_id=reminder.task_id,
+        dados=reminder.model_dump(mode="json"),
+        usuarios=[reminder.usuario_id]
+    ))
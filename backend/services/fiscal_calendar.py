@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from database import get_clients_collection, get_fiscal_collection, insert_many_idempotent
+from models.fiscal import ObrigacaoFiscal
+from services.business_calendar import business_calendar
+
+LAST_DAY = "ultimo"
+
+@dataclass(frozen=True)
+class ObligationRule:
+    tipo: str
+    nome: str
+    periodicidade: str
+    # Due date: `dia` of the month `meses_apos` months after the period ends
+    meses_apos: int
+    dia: Union[int, str]
+    # `dia` counts business days instead of calendar days
+    dia_util: bool = False
+    # Non-business due dates move back (federal taxes) instead of forward
+    antecipa: bool = False
+
+OBLIGATION_RULES: Dict[str, List[ObligationRule]] = {
+    "simples": [
+        ObligationRule("pgdas", "PGDAS-D", "mensal", 1, 20),
+        ObligationRule("defis", "DEFIS", "anual", 3, 31),
+    ],
+    "mei": [
+        ObligationRule("pgdas", "DAS-MEI", "mensal", 1, 20),
+        ObligationRule("defis", "DASN-SIMEI", "anual", 5, 31),
+    ],
+    "lucro_presumido": [
+        ObligationRule("dctf", "DCTFWeb", "mensal", 1, 15),
+        ObligationRule("sped", "EFD-Contribuições", "mensal", 2, 10, dia_util=True),
+        ObligationRule("sped", "ECF", "anual", 7, LAST_DAY),
+        ObligationRule("darf", "DARF IRPJ/CSLL", "trimestral", 1, LAST_DAY, antecipa=True),
+    ],
+    "lucro_real": [
+        ObligationRule("dctf", "DCTFWeb", "mensal", 1, 15),
+        ObligationRule("sped", "EFD-Contribuições", "mensal", 2, 10, dia_util=True),
+        ObligationRule("sped", "ECF", "anual", 7, LAST_DAY),
+        ObligationRule("darf", "DARF IRPJ/CSLL Estimativa", "mensal", 1, LAST_DAY, antecipa=True),
+    ],
+}
+
+PERIOD_MONTHS = {"mensal": 1, "trimestral": 3, "anual": 12}
+
+def period_ends(periodicidade: str, first_month: np.datetime64, last_month: np.datetime64) -> np.ndarray:
+    """Last month of every period that ends inside [first_month, last_month]"""
+    months = np.arange(first_month, last_month + 1, dtype="datetime64[M]")
+    step = PERIOD_MONTHS[periodicidade]
+    month_number = months.astype(int) % 12 + 1
+    return months[month_number % step == 0]
+
+def period_labels(periodicidade: str, ends: np.ndarray) -> List[str]:
+    years = ends.astype("datetime64[Y]").astype(int) + 1970
+    months = ends.astype(int) % 12 + 1
+    if periodicidade == "mensal":
+        return [f"{year}-{month:02d}" for year, month in zip(years, months)]
+    if periodicidade == "trimestral":
+        return [f"{year}-T{month // 3}" for year, month in zip(years, months)]
+    return [str(year) for year in years]
+
+def due_dates(rule: ObligationRule, ends: np.ndarray, cidade: Optional[str] = None) -> np.ndarray:
+    """Vectorized due dates, moved to a business day of the client's city"""
+    due_month = ends + np.timedelta64(rule.meses_apos, "M")
+    month_first_day = due_month.astype("datetime64[D]")
+    month_last_day = (due_month + np.timedelta64(1, "M")).astype("datetime64[D]") - np.timedelta64(1, "D")
+    if rule.dia_util:
+        return business_calendar.add_business_days_many(month_first_day, rule.dia - 1, cidade)
+    if rule.dia == LAST_DAY:
+        due = month_last_day
+    else:
+        due = np.minimum(month_first_day + np.timedelta64(rule.dia - 1, "D"), month_last_day)
+    return business_calendar.adjust_many(due, cidade, backward=rule.antecipa)
+
+def calendar_range(ano: Optional[int], competencia: Optional[str]):
+    if competencia:
+        month = np.datetime64(competencia, "M")
+        return month, month
+    return np.datetime64(f"{ano}-01", "M"), np.datetime64(f"{ano}-12", "M")
+
+async def generate_fiscal_calendar(ano: Optional[int] = None, competencia: Optional[str] = None) -> dict:
+    """Create every obligation of every active client for a year or a competencia.
+
+    Obligations are keyed by empresa_id:tipo:periodo, so running the job
+    again only inserts what is missing.
+    """
+    first_month, last_month = calendar_range(ano, competencia)
+
+    clients_collection = await get_clients_collection()
+    clients_by_regime: Dict[str, List[dict]] = {}
+    projection = {"_id": 0, "id": 1, "nome_empresa": 1, "tipo_regime": 1, "cidade": 1, "responsavel": 1}
+    async for client_data in clients_collection.find({"status": "ativa"}, projection):
+        clients_by_regime.setdefault(client_data["tipo_regime"], []).append(client_data)
+
+    now = datetime.utcnow()
+    obrigacoes = []
+    for regime, clients in clients_by_regime.items():
+        for rule in OBLIGATION_RULES.get(regime, []):
+            ends = period_ends(rule.periodicidade, first_month, last_month)
+            if ends.size == 0:
+                continue
+            periodos = period_labels(rule.periodicidade, ends)
+            vencimentos_por_cidade = {}
+            for client_data in clients:
+                cidade = client_data.get("cidade")
+                if cidade not in vencimentos_por_cidade:
+                    vencimentos_por_cidade[cidade] = due_dates(rule, ends, cidade).astype(object)
+                for periodo, vencimento in zip(periodos, vencimentos_por_cidade[cidade]):
+                    obrigacoes.append(ObrigacaoFiscal.model_construct(
+                        empresa_id=client_data["id"],
+                        empresa=client_data["nome_empresa"],
+                        tipo=rule.tipo,
+                        nome=f"{rule.nome} {periodo}",
+                        periodicidade=rule.periodicidade,
+                        vencimento=vencimento,
+                        status="pendente",
+                        responsavel=client_data["responsavel"],
+                        periodo=periodo,
+                        chave=f"{client_data['id']}:{rule.tipo}:{periodo}",
+                        created_at=now,
+                        updated_at=now
+                    ).model_dump())
+
+    fiscal_collection = await get_fiscal_collection()
+    inserted = await insert_many_idempotent(fiscal_collection, obrigacoes)
+    return {
+        "clientes": sum(len(clients) for clients in clients_by_regime.values()),
+        "geradas": len(inserted),
+        "existentes": len(obrigacoes) - len(inserted)
+    }
@@ -0,0 +1,147 @@
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+from pymongo import UpdateOne
+
+from database import get_funcionarios_collection, get_trabalhista_collection
+from models.trabalhista import DetalheFolha
+from services.config import get_configuracao
+
+CONFIG_SETOR = "trabalhista"
+CONFIG_NOME = "tabelas_folha"
+
+# Used while no `tabelas_folha` document exists in configuracoes (tables in force from 05/2025)
+TABELAS_PADRAO = {
+    # [upper bound of the bracket, rate]
+    "inss": {"faixas": [[1518.00, 0.075], [2793.88, 0.09], [4190.83, 0.12], [8157.41, 0.14]]},
+    # [upper bound (null for the last bracket), rate, amount to deduct]
+    "irrf": {
+        "faixas": [
+            [2428.80, 0.0, 0.0],
+            [2826.65, 0.075, 182.16],
+            [3751.05, 0.15, 394.16],
+            [4664.68, 0.225, 675.49],
+            [None, 0.275, 908.73]
+        ],
+        "deducao_dependente": 189.59,
+        "desconto_simplificado": 607.20
+    },
+    "fgts": {"aliquota": 0.08}
+}
+
+async def carregar_tabelas() -> dict:
+    return await get_configuracao(CONFIG_SETOR, CONFIG_NOME, default=TABELAS_PADRAO)
+
+def calcular_inss(salarios: np.ndarray, tabela: dict) -> np.ndarray:
+    """Progressive INSS: each bracket's rate applies only to the slice inside it"""
+    limites = np.array([faixa[0] for faixa in tabela["faixas"]])
+    aliquotas = np.array([faixa[1] for faixa in tabela["faixas"]])
+    inferiores = np.concatenate(([0.0], limites[:-1]))
+    fatias = np.clip(salarios[:, None] - inferiores[None, :], 0, limites - inferiores)
+    return np.round(fatias @ aliquotas, 2)
+
+def calcular_irrf(salarios: np.ndarray, inss: np.ndarray, dependentes: np.ndarray, tabela: dict) -> np.ndarray:
+    """Monthly IRRF using the more favourable of legal and simplified deductions"""
+    limites = np.array([faixa[0] if faixa[0] is not None else np.inf for faixa in tabela["faixas"]])
+    aliquotas = np.array([faixa[1] for faixa in tabela["faixas"]])
+    parcelas = np.array([faixa[2] for faixa in tabela["faixas"]])
+    deducoes = np.maximum(inss + dependentes * tabela["deducao_dependente"], tabela["desconto_simplificado"])
+    base = np.maximum(salarios - deducoes, 0)
+    faixa = np.searchsorted(limites, base, side="left")
+    return np.round(np.maximum(base * aliquotas[faixa] - parcelas[faixa], 0), 2)
+
+def calcular_folha(salarios: np.ndarray, dependentes: np.ndarray, tabelas: dict) -> Dict[str, np.ndarray]:
+    """Payroll for a whole roster at once (one element per employee)"""
+    inss = calcular_inss(salarios, tabelas["inss"])
+    irrf = calcular_irrf(salarios, inss, dependentes, tabelas["irrf"])
+    fgts = np.round(salarios * tabelas["fgts"]["aliquota"], 2)
+    return {"inss": inss, "irrf": irrf, "fgts": fgts, "liquido": np.round(salarios - inss - irrf, 2)}
+
+def competencia_range(competencia: str):
+    year, month = (int(part) for part in competencia.split("-"))
+    inicio = datetime(year, month, 1)
+    fim = datetime(year + month // 12, month % 12 + 1, 1)
+    return inicio, fim
+
+async def carregar_quadro(empresa_ids: List[str], inicio: datetime, fim: datetime) -> List[dict]:
+    """Employees on the payroll of the competencia, from the funcionarios registry"""
+    funcionarios_collection = await get_funcionarios_collection()
+    query = {
+        "empresa_id": {"$in": empresa_ids},
+        "$and": [
+            {"$or": [{"data_admissao": None}, {"data_admissao": {"$lt": fim}}]},
+            {"$or": [{"status": "ativo"}, {"data_demissao": {"$gte": inicio}}]}
+        ]
+    }
+    projection = {"_id": 0, "id": 1, "empresa_id": 1, "cpf": 1, "nome": 1, "salario": 1, "dependentes": 1}
+    quadro = []
+    async for funcionario_data in funcionarios_collection.find(query, projection).sort([("empresa_id", 1), ("cpf", 1)]):
+        funcionario_data["salario"] = funcionario_data.get("salario") or 0.0
+        funcionario_data["dependentes"] = funcionario_data.get("dependentes") or 0
+        quadro.append(funcionario_data)
+    return quadro
+
+async def processar_folhas(competencia: str) -> dict:
+    """Fill DetalheFolha of every open folha request of a competencia in one batch"""
+    inicio, fim = competencia_range(competencia)
+    trabalhista_collection = await get_trabalhista_collection()
+    solicitacoes = []
+    async for solicitacao_data in trabalhista_collection.find(
+        {"tipo": "folha", "status": {"$ne": "concluido"}, "data_solicitacao": {"$gte": inicio, "$lt": fim}},
+        {"_id": 0, "id": 1, "empresa_id": 1}
+    ):
+        solicitacoes.append(solicitacao_data)
+
+    if not solicitacoes:
+        return {"competencia": competencia, "empresas": 0, "funcionarios": 0, "atualizadas": 0, "resultados": []}
+
+    empresa_ids = sorted({solicitacao["empresa_id"] for solicitacao in solicitacoes})
+    empresa_index = {empresa_id: index for index, empresa_id in enumerate(empresa_ids)}
+    quadro = await carregar_quadro(empresa_ids, inicio, fim)
+
+    tabelas = await carregar_tabelas()
+    empresas = np.array([empresa_index[funcionario["empresa_id"]] for funcionario in quadro], dtype=int)
+    salarios = np.array([funcionario["salario"] for funcionario in quadro], dtype=float)
+    dependentes = np.array([funcionario["dependentes"] for funcionario in quadro], dtype=float)
+    folha = calcular_folha(salarios, dependentes, tabelas)
+
+    # Per-company totals in one pass
+    def por_empresa(valores: np.ndarray) -> np.ndarray:
+        return np.round(np.bincount(empresas, weights=valores, minlength=len(empresa_ids)), 2)
+
+    funcionarios = np.bincount(empresas, minlength=len(empresa_ids))
+    proventos = por_empresa(salarios)
+    inss = por_empresa(folha["inss"])
+    irrf = por_empresa(folha["irrf"])
+    fgts = por_empresa(folha["fgts"])
+    liquido = por_empresa(folha["liquido"])
+
+    detalhes = {}
+    for empresa_id, index in empresa_index.items():
+        detalhes[empresa_id] = DetalheFolha(
+            total_funcionarios=int(funcionarios[index]),
+            total_proventos=float(proventos[index]),
+            total_descontos=round(float(inss[index] + irrf[index]), 2),
+            total_liquido=float(liquido[index]),
+            total_inss=float(inss[index]),
+            total_irrf=float(irrf[index]),
+            total_fgts=float(fgts[index])
+        ).model_dump()
+
+    now = datetime.utcnow()
+    result = await trabalhista_collection.bulk_write([
+        UpdateOne(
+            {"id": solicitacao["id"]},
+            {"$set": {"detalhes": detalhes[solicitacao["empresa_id"]], "updated_at": now}}
+        )
+        for solicitacao in solicitacoes
+    ], ordered=False)
+
+    return {
+        "competencia": competencia,
+        "empresas": len(empresa_ids),
+        "funcionarios": len(quadro),
+        "atualizadas": result.modified_count,
+        "resultados": [{"empresa_id": empresa_id, **detalhes[empresa_id]} for empresa_id in empresa_ids]
+    }
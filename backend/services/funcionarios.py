@@ -0,0 +1,112 @@
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from pymongo import UpdateOne
+
+from database import get_funcionarios_collection, get_trabalhista_collection
+from models.funcionario import EventoFuncionario, Funcionario
+
+TIPOS_VINCULO = ["admissao", "demissao"]
+BATCH_SIZE = 500
+
+def montar_funcionario(solicitacoes: List[dict]) -> Funcionario:
+    """Current state of one employee from its admissao/demissao requests, oldest first"""
+    ultima = solicitacoes[-1]
+    dados = ultima["funcionario"]
+    admissoes = [s for s in solicitacoes if s["tipo"] == "admissao"]
+    demissoes = [s for s in solicitacoes if s["tipo"] == "demissao"]
+    ativo = ultima["tipo"] == "admissao"
+    data_admissao = None
+    if admissoes:
+        admissao = admissoes[-1]
+        data_admissao = admissao["funcionario"].get("data_admissao") or admissao["data_solicitacao"]
+    return Funcionario(
+        empresa_id=ultima["empresa_id"],
+        empresa=ultima["empresa"],
+        cpf=dados["cpf"],
+        nome=dados["nome"],
+        funcao=dados["funcao"],
+        salario=dados.get("salario"),
+        dependentes=dados.get("dependentes") or 0,
+        data_admissao=data_admissao,
+        data_demissao=None if ativo or not demissoes else demissoes[-1]["data_solicitacao"],
+        motivo_demissao=None if ativo else dados.get("motivo_demissao"),
+        status="ativo" if ativo else "desligado",
+        historico=[
+            EventoFuncionario(solicitacao_id=s["id"], tipo=s["tipo"], data=s["data_solicitacao"])
+            for s in solicitacoes
+        ]
+    )
+
+def upsert_operation(funcionario: Funcionario, now: datetime) -> UpdateOne:
+    data = funcionario.model_dump(exclude={"id", "created_at", "updated_at"})
+    data["updated_at"] = now
+    return UpdateOne(
+        {"empresa_id": funcionario.empresa_id, "cpf": funcionario.cpf},
+        {"$set": data, "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now}},
+        upsert=True
+    )
+
+async def _iter_vinculos(query: dict) -> AsyncIterator[dict]:
+    trabalhista_collection = await get_trabalhista_collection()
+    query = {"funcionario.cpf": {"$exists": True}, **query, "tipo": {"$in": TIPOS_VINCULO}}
+    projection = {"_id": 0, "id": 1, "empresa_id": 1, "empresa": 1, "tipo": 1,
+                  "data_solicitacao": 1, "funcionario": 1}
+    cursor = trabalhista_collection.find(query, projection).sort(
+        [("empresa_id", 1), ("funcionario.cpf", 1), ("data_solicitacao", 1), ("created_at", 1)]
+    )
+    async for solicitacao_data in cursor:
+        yield solicitacao_data
+
+async def sync_funcionario(empresa_id: str, cpf: str):
+    """Rebuild one registry entry after an admissao/demissao request changes"""
+    solicitacoes = [s async for s in _iter_vinculos({"empresa_id": empresa_id, "funcionario.cpf": cpf})]
+    funcionarios_collection = await get_funcionarios_collection()
+    if not solicitacoes:
+        await funcionarios_collection.delete_one({"empresa_id": empresa_id, "cpf": cpf})
+        return
+    await funcionarios_collection.bulk_write([upsert_operation(montar_funcionario(solicitacoes), datetime.utcnow())])
+
+async def sync_solicitacao(solicitacao_data: dict, anterior: Optional[dict] = None):
+    """Keep the registry in step with a created/updated/deleted trabalhista request"""
+    chaves = set()
+    for data in (anterior, solicitacao_data):
+        if data and data.get("tipo") in TIPOS_VINCULO and data.get("funcionario"):
+            chaves.add((data["empresa_id"], data["funcionario"]["cpf"]))
+    for empresa_id, cpf in chaves:
+        await sync_funcionario(empresa_id, cpf)
+
+async def backfill_funcionarios() -> dict:
+    """Rebuild the whole registry from the existing trabalhista requests in one sorted pass"""
+    funcionarios_collection = await get_funcionarios_collection()
+    now = datetime.utcnow()
+    operations = []
+    total = 0
+    atual = []
+    chave_atual = None
+
+    async def flush():
+        nonlocal operations
+        if operations:
+            await funcionarios_collection.bulk_write(operations, ordered=False)
+            operations = []
+
+    async for solicitacao_data in _iter_vinculos({}):
+        chave = (solicitacao_data["empresa_id"], solicitacao_data["funcionario"]["cpf"])
+        if chave != chave_atual and atual:
+            operations.append(upsert_operation(montar_funcionario(atual), now))
+            total += 1
+            atual = []
+            if len(operations) >= BATCH_SIZE:
+                await flush()
+        chave_atual = chave
+        atual.append(solicitacao_data)
+    if atual:
+        operations.append(upsert_operation(montar_funcionario(atual), now))
+        total += 1
+    await flush()
+
+    # Entries whose requests no longer exist
+    removidos = await funcionarios_collection.delete_many({"updated_at": {"$lt": now}})
+    return {"funcionarios": total, "removidos": removidos.deleted_count}
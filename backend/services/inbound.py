@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import os
+import re
+import uuid
+from datetime import datetime
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from database import (
+    get_atendimento_collection, get_atendimento_conversas_collection, get_atendimento_inbound_falhas_collection,
+    get_clients_collection, insert_many_idempotent
+)
+from models.atendimento import Conversa, InboundMessage, Ticket
+from services.assignment import assignment_service
+from services.cache import TTLCache
+from services.events import event_bus, ticket_event
+from services.sla import calcular_sla, carregar_config_sla, sla_monitor
+from services.ticket_dedup import signature, ticket_dedup, ticket_text
+
+logger = logging.getLogger(__name__)
+
+INBOUND_QUEUE_SIZE = int(os.getenv("INBOUND_QUEUE_SIZE", "1000"))
+# A batch waits this long for more messages before being committed
+FLUSH_INTERVAL = 0.02
+BATCH_MAX = 200
+# A failing batch is retried after RETRY_BACKOFF, then twice as long, and so
+# on, before it goes to the dead-letter collection
+COMMIT_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# Inbound batches remembered on a ticket, so a retried $inc applies once
+LOTES_RECENTES = 20
+
+INBOUND_OPEN_STATUS = ["aberto", "em_andamento", "aguardando_cliente"]
+NAO_IDENTIFICADO = "Não identificado"
+NAO_ATRIBUIDO = "Não atribuído"
+TITULO_MAX = 80
+
+# Providers: raw webhook payload -> InboundMessage list
+
+def parse_whatsapp_cloud(payload: dict) -> List[InboundMessage]:
+    """WhatsApp Cloud API webhook (entry[].changes[].value.messages[]); text messages only"""
+    messages = []
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            nomes = {contact.get("wa_id"): contact.get("profile", {}).get("name") for contact in value.get("contacts", [])}
+            for message in value.get("messages", []):
+                if message.get("type") != "text":
+                    continue
+                recebido_em = datetime.utcfromtimestamp(int(message["timestamp"])) if message.get("timestamp") else datetime.utcnow()
+                messages.append(InboundMessage(
+                    canal="whatsapp",
+                    remetente=message["from"],
+                    mensagem=message["text"]["body"],
+                    nome=nomes.get(message["from"]),
+                    externo_id=message.get("id"),
+                    recebido_em=recebido_em
+                ))
+    return messages
+
+def parse_email(payload) -> List[InboundMessage]:
+    """Inbound e-mail relay posting {from, subject, text, message_id} objects"""
+    messages = []
+    for item in payload if isinstance(payload, list) else [payload]:
+        nome, endereco = parseaddr(item["from"])
+        messages.append(InboundMessage(
+            canal="email",
+            remetente=endereco,
+            nome=nome or None,
+            assunto=item.get("subject"),
+            mensagem=item.get("text") or "",
+            externo_id=item.get("message_id")
+        ))
+    return messages
+
+def parse_fake(payload) -> List[InboundMessage]:
+    """Local provider for development: InboundMessage objects as JSON"""
+    return [InboundMessage(**item) for item in (payload if isinstance(payload, list) else [payload])]
+
+PROVIDERS = {"whatsapp": parse_whatsapp_cloud, "email": parse_email, "fake": parse_fake}
+
+# Sender -> client matching
+
+def phone_key(value: Optional[str]) -> Optional[str]:
+    """Last 8 digits: survives country/area code and the extra mobile 9 differences"""
+    digits = re.sub(r"\D", "", value or "")
+    return digits[-8:] if len(digits) >= 8 else None
+
+def chave_remetente(message: InboundMessage) -> str:
+    if message.canal == "email":
+        return message.remetente.strip().lower()
+    return phone_key(message.remetente) or message.remetente
+
+contatos_cache = TTLCache(ttl=300, maxsize=1)
+
+async def carregar_contatos() -> Dict[str, dict]:
+    """Active clients keyed by e-mail and phone key"""
+    contatos = contatos_cache.get("contatos")
+    if contatos is not None:
+        return contatos
+    contatos = {}
+    clients_collection = await get_clients_collection()
+    projection = {"_id": 0, "id": 1, "nome_empresa": 1, "cidade": 1, "email": 1, "whatsapp": 1, "telefone": 1}
+    async for client_data in clients_collection.find({"status": "ativa"}, projection):
+        if client_data.get("email"):
+            contatos.setdefault(client_data["email"].strip().lower(), client_data)
+        for field in ("whatsapp", "telefone"):
+            key = phone_key(client_data.get(field))
+            if key:
+                contatos.setdefault(key, client_data)
+    contatos_cache.set("contatos", contatos)
+    return contatos
+
+def novo_ticket(message: InboundMessage, remetente: str, cliente: Optional[dict], config_sla: dict, now: datetime) -> Ticket:
+    cidade = cliente.get("cidade") if cliente else None
+    agent = assignment_service.pick(cidade)
+    ticket = Ticket(
+        empresa_id=cliente["id"] if cliente else "",
+        empresa=cliente["nome_empresa"] if cliente else NAO_IDENTIFICADO,
+        titulo=(message.assunto or message.mensagem)[:TITULO_MAX] or message.canal,
+        descricao=message.mensagem,
+        prioridade="media",
+        status="aberto",
+        responsavel=agent[1] if agent else NAO_ATRIBUIDO,
+        responsavel_id=agent[0] if agent else None,
+        cidade=cidade,
+        remetente=remetente,
+        canal=message.canal,
+        data_abertura=now.date(),
+        sla=calcular_sla(now, "media", config_sla, cidade),
+        created_at=now,
+        updated_at=now
+    )
+    if cliente:
+        ticket.possiveis_duplicados = ticket_dedup.query(ticket.empresa_id, signature(ticket_text(ticket.model_dump())))
+    # Counted right away so the rest of the batch spreads over other agents
+    assignment_service.track(ticket.model_dump())
+    return ticket
+
+async def plan_batch(messages: List[InboundMessage]) -> Optional[dict]:
+    """Reads for a batch: the tickets to create or update and the conversas to
+    insert (None when every message was already stored). The plan is fixed
+    once built, so its writes can be retried or replayed as they are."""
+    conversas_collection = await get_atendimento_conversas_collection()
+    externos = [message.externo_id for message in messages if message.externo_id]
+    vistos = set()
+    if externos:
+        vistos = set(await conversas_collection.distinct("externo_id", {"externo_id": {"$in": externos}}))
+    pendentes = []
+    for message in messages:
+        # Providers redeliver webhooks they consider unacknowledged
+        if message.externo_id:
+            if message.externo_id in vistos:
+                continue
+            vistos.add(message.externo_id)
+        pendentes.append(message)
+    if not pendentes:
+        return None
+
+    atendimento_collection = await get_atendimento_collection()
+    remetentes = {chave_remetente(message) for message in pendentes}
+    abertos: Dict[str, dict] = {}
+    async for ticket_data in atendimento_collection.find(
+        {"remetente": {"$in": list(remetentes)}, "status": {"$in": INBOUND_OPEN_STATUS}}, {"_id": 0, "conversas": 0}
+    ).sort("created_at", 1):
+        abertos[ticket_data["remetente"]] = ticket_data
+
+    contatos = await carregar_contatos()
+    config_sla = await carregar_config_sla()
+    now = datetime.utcnow()
+    novos: Dict[str, Ticket] = {}
+    conversas = []
+    atualizados: Dict[str, dict] = {}
+    for message in pendentes:
+        remetente = chave_remetente(message)
+        if remetente in abertos:
+            ticket_id = abertos[remetente]["id"]
+            resumo = atualizados.setdefault(ticket_id, {"count": 0, "last": message.recebido_em})
+            resumo["count"] += 1
+            resumo["last"] = max(resumo["last"], message.recebido_em)
+        else:
+            if remetente not in novos:
+                novos[remetente] = novo_ticket(message, remetente, contatos.get(remetente), config_sla, now)
+            ticket = novos[remetente]
+            ticket.conversas_count += 1
+            ticket.last_interaction_at = max(ticket.last_interaction_at or message.recebido_em, message.recebido_em)
+            ticket_id = ticket.id
+        conversas.append(Conversa(
+            ticket_id=ticket_id,
+            data=message.recebido_em,
+            usuario=message.nome or message.remetente,
+            mensagem=message.mensagem,
+            externo_id=message.externo_id
+        ).model_dump())
+
+    return {
+        "lote": str(uuid.uuid4()),
+        "criado_em": now,
+        "novos": [ticket.model_dump() for ticket in novos.values()],
+        "atualizados": atualizados,
+        "abertos": [ticket_data for ticket_data in abertos.values() if ticket_data["id"] in atualizados],
+        "conversas": conversas
+    }
+
+async def write_plan(plan: dict):
+    """One bulk_write on tickets and one insert_many on conversas. Both are
+    idempotent: new tickets are upserted by id, the $inc of an existing
+    ticket is guarded by the lote id and conversas are unique by id."""
+    lote = plan["lote"]
+    operations = [
+        UpdateOne({"id": ticket_data["id"]}, {"$setOnInsert": ticket_data}, upsert=True)
+        for ticket_data in plan["novos"]
+    ]
+    operations += [
+        UpdateOne(
+            {"id": ticket_id, "inbound_lotes": {"$ne": lote}},
+            {"$inc": {"conversas_count": resumo["count"]},
+             "$max": {"last_interaction_at": resumo["last"]},
+             "$set": {"updated_at": plan["criado_em"]},
+             "$push": {"inbound_lotes": {"$each": [lote], "$slice": -LOTES_RECENTES}}}
+        )
+        for ticket_id, resumo in plan["atualizados"].items()
+    ]
+    atendimento_collection = await get_atendimento_collection()
+    await atendimento_collection.bulk_write(operations, ordered=False)
+    conversas_collection = await get_atendimento_conversas_collection()
+    await insert_many_idempotent(conversas_collection, plan["conversas"])
+
+async def publish_plan(plan: dict):
+    """In-process indexes and events, once the plan is stored"""
+    for ticket_data in plan["novos"]:
+        sla_monitor.schedule(ticket_data)
+        ticket_dedup.add(ticket_data)
+        await event_bus.publish(ticket_event("ticket.created", ticket_data))
+    for ticket_data in plan["abertos"]:
+        await event_bus.publish(ticket_event("ticket.conversa", ticket_data))
+
+async def commit_batch(messages: List[InboundMessage]) -> dict:
+    """Turn a batch of inbound messages into new tickets or conversas"""
+    plan = await plan_batch(messages)
+    if plan is None:
+        return {"tickets": 0, "conversas": 0}
+    await write_plan(plan)
+    await publish_plan(plan)
+    return {"tickets": len(plan["novos"]), "conversas": len(plan["conversas"])}
+
+async def reprocessar_falhas() -> dict:
+    """Replay the batches in atendimento_inbound_falhas; those failing again stay"""
+    falhas_collection = await get_atendimento_inbound_falhas_collection()
+    reprocessadas = 0
+    pendentes = 0
+    async for falha in falhas_collection.find({}, {"_id": 0}).sort("created_at", 1):
+        try:
+            if falha.get("plano"):
+                await write_plan(falha["plano"])
+                await publish_plan(falha["plano"])
+            else:
+                await commit_batch([InboundMessage(**message) for message in falha["mensagens"]])
+        except Exception:
+            logger.exception("Replay of inbound batch %s failed", falha["id"])
+            pendentes += 1
+            continue
+        await falhas_collection.delete_one({"id": falha["id"]})
+        reprocessadas += 1
+    return {"reprocessadas": reprocessadas, "pendentes": pendentes}
+
+class InboundQueue:
+    """Bounded in-process queue of inbound messages with group commit.
+
+    The first message of a batch waits FLUSH_INTERVAL for company, then
+    everything queued (up to BATCH_MAX) is written together. A batch that
+    fails is retried with exponential backoff and then stored in
+    atendimento_inbound_falhas (with its plan, when it got that far) to be
+    replayed by reprocessar_falhas(): the webhook has already answered 202.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = INBOUND_QUEUE_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        batch_max: int = BATCH_MAX,
+        retries: int = COMMIT_RETRIES,
+        backoff: float = RETRY_BACKOFF
+    ):
+        self.flush_interval = flush_interval
+        self.batch_max = batch_max
+        self.retries = retries
+        self.backoff = backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._committing: Optional[Tuple[List[InboundMessage], Optional[dict]]] = None
+
+    @property
+    def maxsize(self) -> int:
+        return self._queue.maxsize
+
+    def offer(self, messages: List[InboundMessage]) -> bool:
+        """Enqueue all messages or none (False when there is no room; callers
+        reject payloads larger than maxsize, which would never fit)"""
+        if self._queue.maxsize - self._queue.qsize() < len(messages):
+            return False
+        for message in messages:
+            self._queue.put_nowait(message)
+        return True
+
+    def _drain(self, batch: List[InboundMessage]) -> List[InboundMessage]:
+        while len(batch) < self.batch_max and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _commit(self, batch: List[InboundMessage], plan: Optional[dict] = None):
+        # Kept until the commit is over: a commit cut short by shutdown is
+        # finished with the same plan (its writes are idempotent)
+        self._committing = (batch, plan)
+        for attempt in range(self.retries + 1):
+            try:
+                if plan is None:
+                    plan = await plan_batch(batch)
+                    if plan is None:
+                        break
+                    self._committing = (batch, plan)
+                await write_plan(plan)
+                await publish_plan(plan)
+                break
+            except Exception as e:
+                erro = e
+                logger.warning("Inbound batch of %d messages failed (attempt %d): %r", len(batch), attempt + 1, e)
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+        else:
+            await self._dead_letter(batch, plan, erro)
+        self._committing = None
+
+    async def _dead_letter(self, batch: List[InboundMessage], plan: Optional[dict], erro: Exception):
+        try:
+            falhas_collection = await get_atendimento_inbound_falhas_collection()
+            await falhas_collection.insert_one({
+                "id": str(uuid.uuid4()),
+                "mensagens": [message.model_dump() for message in batch],
+                "plano": plan,
+                "erro": repr(erro),
+                "created_at": datetime.utcnow()
+            })
+            logger.error("Inbound batch of %d messages moved to atendimento_inbound_falhas", len(batch))
+        except Exception:
+            # Last resort, the messages are at least in the log
+            logger.exception("Inbound batch lost: %s", [message.model_dump_json() for message in batch])
+
+    async def run(self):
+        """Commit batches until cancelled; what is still queued is flushed on shutdown"""
+        batch: List[InboundMessage] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                await asyncio.sleep(self.flush_interval)
+                batch = self._drain(batch)
+                committing, batch = batch, []
+                await self._commit(committing)
+        except asyncio.CancelledError:
+            if self._committing is not None:
+                await self._commit(*self._committing)
+            while batch or not self._queue.empty():
+                committing, batch = self._drain(batch), []
+                await self._commit(committing)
+            raise
+
+inbound_queue = InboundQueue()
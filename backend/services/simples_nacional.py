@@ -0,0 +1,131 @@
+from datetime import datetime
+from typing import List
+
+import numpy as np
+from pymongo import UpdateOne
+
+from database import get_clients_collection, get_fiscal_collection, get_receitas_collection
+
+# Upper RBT12 bound of each bracket (LC 123/2006, as amended by LC 155/2016)
+FAIXAS_RBT12 = np.array([180_000.00, 360_000.00, 720_000.00, 1_800_000.00, 3_600_000.00, 4_800_000.00])
+
+ANEXOS = ["I", "II", "III", "IV", "V"]
+
+# Nominal rate per annex (rows) and bracket (columns)
+ALIQUOTAS_NOMINAIS = np.array([
+    [0.0400, 0.0730, 0.0950, 0.1070, 0.1430, 0.1900],
+    [0.0450, 0.0780, 0.1000, 0.1120, 0.1470, 0.3000],
+    [0.0600, 0.1120, 0.1350, 0.1600, 0.2100, 0.3300],
+    [0.0450, 0.0900, 0.1020, 0.1400, 0.2200, 0.3300],
+    [0.1550, 0.1800, 0.1950, 0.2050, 0.2300, 0.3050],
+])
+
+PARCELAS_A_DEDUZIR = np.array([
+    [0.00, 5_940.00, 13_860.00, 22_500.00, 87_300.00, 378_000.00],
+    [0.00, 5_940.00, 13_860.00, 22_500.00, 85_500.00, 720_000.00],
+    [0.00, 9_360.00, 17_640.00, 35_640.00, 125_640.00, 648_000.00],
+    [0.00, 8_100.00, 12_420.00, 39_780.00, 183_780.00, 828_000.00],
+    [0.00, 4_500.00, 9_900.00, 17_100.00, 62_100.00, 540_000.00],
+])
+
+def competencia_anterior(competencia: str, meses: int) -> str:
+    month = np.datetime64(competencia, "M") - np.timedelta64(meses, "M")
+    return str(month)
+
+def calcular_rbt12(receita_mes: np.ndarray, receita_anterior: np.ndarray, meses: np.ndarray) -> np.ndarray:
+    """RBT12 per company (LC 123/2006, art. 18): the revenue of the previous
+    12 months; with less history, their average times 12; in the first
+    month of activity, the revenue of the month times 12."""
+    media_anualizada = receita_anterior / np.maximum(meses, 1) * 12
+    return np.where(meses == 0, receita_mes * 12, np.where(meses < 12, media_anualizada, receita_anterior))
+
+def calcular_das(rbt12: np.ndarray, receita_mes: np.ndarray, anexo: np.ndarray) -> tuple:
+    """DAS for whole arrays of companies.
+
+    rbt12 and receita_mes are amounts in reais; anexo holds annex indexes
+    (0 for Anexo I ... 4 for Anexo V). Returns (effective rate, DAS value).
+    """
+    faixa = np.minimum(np.searchsorted(FAIXAS_RBT12, rbt12, side="left"), FAIXAS_RBT12.size - 1)
+    aliquota = ALIQUOTAS_NOMINAIS[anexo, faixa]
+    deducao = PARCELAS_A_DEDUZIR[anexo, faixa]
+    # With no revenue at all (RBT12 of zero) the nominal rate applies
+    safe_rbt12 = np.where(rbt12 > 0, rbt12, 1.0)
+    efetiva = np.where(rbt12 > 0, (rbt12 * aliquota - deducao) / safe_rbt12, aliquota)
+    return efetiva, np.round(receita_mes * efetiva, 2)
+
+async def calcular_pgdas(competencia: str) -> dict:
+    """Compute the DAS of every Simples client for a competencia and store it
+    in the matching PGDAS obligation"""
+    clients_collection = await get_clients_collection()
+    anexos = {}
+    async for client_data in clients_collection.find(
+        {"status": "ativa", "tipo_regime": "simples"},
+        {"_id": 0, "id": 1, "anexo_simples": 1}
+    ):
+        anexos[client_data["id"]] = client_data.get("anexo_simples") or "I"
+
+    if not anexos:
+        return {"competencia": competencia, "calculadas": 0, "atualizadas": 0, "sem_receita": [], "resultados": []}
+
+    inicio = competencia_anterior(competencia, 12)
+    receitas_collection = await get_receitas_collection()
+    pipeline = [
+        {"$match": {
+            "empresa_id": {"$in": list(anexos)},
+            "competencia": {"$gte": inicio, "$lte": competencia}
+        }},
+        {"$group": {
+            "_id": "$empresa_id",
+            "receita_mes": {"$sum": {"$cond": [{"$eq": ["$competencia", competencia]}, "$valor", 0]}},
+            "receita_anterior": {"$sum": {"$cond": [{"$lt": ["$competencia", competencia]}, "$valor", 0]}},
+            "meses_anteriores": {"$sum": {"$cond": [{"$lt": ["$competencia", competencia]}, 1, 0]}},
+            "informada": {"$max": {"$eq": ["$competencia", competencia]}}
+        }}
+    ]
+    rows = []
+    async for row in receitas_collection.aggregate(pipeline):
+        # A missing month is not zero revenue: its PGDAS is left untouched
+        if row["informada"]:
+            rows.append(row)
+
+    empresa_ids: List[str] = [row["_id"] for row in rows]
+    receita_mes = np.array([row["receita_mes"] for row in rows], dtype=float)
+    receita_anterior = np.array([row["receita_anterior"] for row in rows], dtype=float)
+    meses = np.array([row["meses_anteriores"] for row in rows], dtype=float)
+    anexo = np.array([ANEXOS.index(anexos[empresa_id]) for empresa_id in empresa_ids], dtype=int)
+
+    rbt12 = calcular_rbt12(receita_mes, receita_anterior, meses)
+    efetiva, das = calcular_das(rbt12, receita_mes, anexo)
+
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"chave": f"{empresa_id}:pgdas:{competencia}"},
+            {"$set": {"valor": float(valor), "updated_at": now}}
+        )
+        for empresa_id, valor in zip(empresa_ids, das)
+    ]
+    atualizadas = 0
+    if operations:
+        fiscal_collection = await get_fiscal_collection()
+        result = await fiscal_collection.bulk_write(operations, ordered=False)
+        atualizadas = result.matched_count
+
+    return {
+        "competencia": competencia,
+        "calculadas": len(empresa_ids),
+        "atualizadas": atualizadas,
+        # Simples clients without a receita for the competencia, not computed
+        "sem_receita": sorted(anexos.keys() - set(empresa_ids)),
+        "resultados": [
+            {
+                "empresa_id": empresa_id,
+                "anexo": ANEXOS[anexo[index]],
+                "rbt12": round(float(rbt12[index]), 2),
+                "receita_mes": float(receita_mes[index]),
+                "aliquota_efetiva": round(float(efetiva[index]), 6),
+                "valor": float(das[index])
+            }
+            for index, empresa_id in enumerate(empresa_ids)
+        ]
+    }
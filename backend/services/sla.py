@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from datetime import datetime, time, timedelta
+from typing import Optional
+
+from database import get_atendimento_collection
+from services.business_calendar import MIN_BUSINESS_DAYS_PER_YEAR, business_calendar
+from services.config import get_configuracao
+from services.events import event_bus, ticket_event
+from services.timers import TimerHeap
+
+logger = logging.getLogger(__name__)
+
+CONFIG_SETOR = "atendimento"
+CONFIG_NOME = "sla"
+
+# Used while no `sla` document exists in configuracoes
+SLA_PADRAO = {
+    # Business hours in local time; tickets are stored in UTC
+    "inicio_expediente": "08:00",
+    "fim_expediente": "18:00",
+    "utc_offset_horas": -3,
+    # Target in business hours per prioridade
+    "prazos_horas": {"urgente": 4, "alta": 8, "media": 16, "baixa": 40}
+}
+
+# Bound of the business-day walk in calcular_sla; validated targets fit in
+# MIN_BUSINESS_DAYS_PER_YEAR full days, well inside it
+SLA_MAX_DIAS = 366
+
+# The SLA clock only matters while the ticket is with the team
+SLA_OPEN_STATUS = ["aberto", "em_andamento"]
+TICKET_SLA_FIELDS = {"_id": 0, "id": 1, "titulo": 1, "status": 1, "prioridade": 1,
+                     "responsavel": 1, "empresa": 1, "sla": 1}
+
+def parse_hora(value: str) -> time:
+    hour, minute = (int(part) for part in value.split(":"))
+    return time(hour, minute)
+
+def validar_config_sla(config: dict):
+    """Raise ValueError when calcular_sla cannot work with `config`"""
+    inicio = parse_hora(config["inicio_expediente"])
+    fim = parse_hora(config["fim_expediente"])
+    if inicio >= fim:
+        raise ValueError("inicio_expediente must be before fim_expediente")
+    if not -14 <= float(config["utc_offset_horas"]) <= 14:
+        raise ValueError("utc_offset_horas out of range")
+    horas_por_dia = (fim.hour - inicio.hour) + (fim.minute - inicio.minute) / 60
+    for prioridade, horas in config["prazos_horas"].items():
+        if isinstance(horas, bool) or not isinstance(horas, (int, float)):
+            raise ValueError(f"prazos_horas[{prioridade}] is not a number")
+        if not 0 < horas <= MIN_BUSINESS_DAYS_PER_YEAR * horas_por_dia:
+            raise ValueError(f"prazos_horas[{prioridade}] out of range")
+
+async def carregar_config_sla() -> dict:
+    """SLA settings from configuracoes over SLA_PADRAO. The document is
+    user-editable: an invalid one falls back to SLA_PADRAO as a whole."""
+    config = await get_configuracao(CONFIG_SETOR, CONFIG_NOME, default={})
+    try:
+        config = {
+            **SLA_PADRAO,
+            **config,
+            "prazos_horas": {**SLA_PADRAO["prazos_horas"], **config.get("prazos_horas", {})}
+        }
+        validar_config_sla(config)
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning("Invalid SLA configuration, using the defaults: %s", e)
+        return SLA_PADRAO
+    return config
+
+def calcular_sla(aberto_em: datetime, prioridade: str, config: dict, cidade: Optional[str] = None) -> datetime:
+    """Deadline (UTC) after the priority's target in business hours"""
+    offset = timedelta(hours=config["utc_offset_horas"])
+    inicio = parse_hora(config["inicio_expediente"])
+    fim = parse_hora(config["fim_expediente"])
+    restante = timedelta(hours=config["prazos_horas"][prioridade])
+    if inicio >= fim:
+        raise ValueError("inicio_expediente must be before fim_expediente")
+
+    atual = aberto_em + offset
+    limite = atual.date() + timedelta(days=SLA_MAX_DIAS)
+    while True:
+        dia = atual.date()
+        if dia > limite:
+            raise ValueError(f"SLA target of {prioridade} does not fit in {SLA_MAX_DIAS} days")
+        if not business_calendar.is_business_day(dia, cidade):
+            atual = datetime.combine(business_calendar.adjust(dia, cidade), inicio)
+            continue
+        if atual.time() >= fim:
+            atual = datetime.combine(business_calendar.add_business_days(dia, 1, cidade), inicio)
+            continue
+        if atual.time() < inicio:
+            atual = datetime.combine(dia, inicio)
+        disponivel = datetime.combine(dia, fim) - atual
+        if restante <= disponivel:
+            return (atual + restante - offset).replace(microsecond=0)
+        restante -= disponivel
+        atual = datetime.combine(dia, fim)
+
+class SLAMonitor:
+    """Flags tickets whose SLA expires while still open.
+
+    Open tickets sit in a heap ordered by sla, so the monitor sleeps until
+    the next deadline instead of scanning the collection.
+    """
+
+    def __init__(self):
+        self._timers = TimerHeap()
+        self._wakeup = asyncio.Event()
+
+    def schedule(self, ticket_data: dict):
+        """Track a created or updated ticket"""
+        if ticket_data.get("status") in SLA_OPEN_STATUS and not ticket_data.get("sla_violado"):
+            self._timers.push(ticket_data["id"], ticket_data["sla"], ticket_data)
+        else:
+            self._timers.cancel(ticket_data["id"])
+        self._wakeup.set()
+
+    async def load(self):
+        self._timers.clear()
+        atendimento_collection = await get_atendimento_collection()
+        query = {"status": {"$in": SLA_OPEN_STATUS}, "sla_violado": {"$ne": True}}
+        count = 0
+        async for ticket_data in atendimento_collection.find(query, TICKET_SLA_FIELDS):
+            self._timers.push(ticket_data["id"], ticket_data["sla"], ticket_data)
+            count += 1
+        logger.info("SLA monitor tracking %d open tickets", count)
+
+    async def _flag(self, ticket_data: dict, now: datetime):
+        atendimento_collection = await get_atendimento_collection()
+        # Guard on status/sla so a ticket resolved or re-prioritized meanwhile is left alone
+        result = await atendimento_collection.update_one(
+            {"id": ticket_data["id"], "status": {"$in": SLA_OPEN_STATUS},
+             "sla": ticket_data["sla"], "sla_violado": {"$ne": True}},
+            {"$set": {"sla_violado": True, "sla_violado_em": now}}
+        )
+        if result.modified_count:
+            await event_bus.publish(ticket_event("ticket.sla_violado", ticket_data))
+
+    async def run(self, max_sleep: float = 60.0):
+        """Flag breaches as they happen until cancelled"""
+        while True:
+            now = datetime.utcnow()
+            try:
+                for _, _, ticket_data in self._timers.pop_due(now):
+                    await self._flag(ticket_data, now)
+            except Exception:
+                logger.exception("SLA monitor tick failed")
+
+            next_deadline = self._timers.next_deadline()
+            timeout = max_sleep
+            if next_deadline is not None:
+                timeout = min(max_sleep, max((next_deadline - datetime.utcnow()).total_seconds(), 0))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+sla_monitor = SLAMonitor()
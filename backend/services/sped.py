@@ -0,0 +1,130 @@
+import mmap
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+# SPED files are ISO-8859-1 pipe-delimited text, one register per line
+ENCODING = "latin-1"
+MAX_ERROS = 100
+
+def iter_registros(buffer) -> Iterator[Tuple[int, List[bytes]]]:
+    """Yield (line number, fields) lazily from a bytes-like buffer (e.g. an mmap)"""
+    position = 0
+    size = len(buffer)
+    line_number = 0
+    while position < size:
+        end = buffer.find(b"\n", position)
+        if end == -1:
+            end = size
+        line = buffer[position:end].rstrip(b"\r")
+        position = end + 1
+        if not line:
+            continue
+        line_number += 1
+        yield line_number, line.split(b"|")
+
+def parse_valor(raw: bytes) -> float:
+    """'1234,56' -> 1234.56"""
+    if not raw:
+        return 0.0
+    return float(raw.replace(b".", b"").replace(b",", b"."))
+
+def is_data(raw: bytes) -> bool:
+    return len(raw) == 8 and raw.isdigit()
+
+def parse_cabecalho(fields: List[bytes]) -> dict:
+    """Register 0000; EFD ICMS/IPI and EFD-Contribuições place DT_INI differently"""
+    decoded = [field.decode(ENCODING) for field in fields]
+    if len(decoded) > 4 and is_data(fields[4]):
+        # |0000|COD_VER|COD_FIN|DT_INI|DT_FIN|NOME|CNPJ|...
+        return {"layout": "efd_icms_ipi", "dt_ini": decoded[4], "dt_fin": decoded[5],
+                "nome": decoded[6], "cnpj": decoded[7]}
+    # |0000|COD_VER|TIPO_ESCRIT|IND_SIT_ESP|NUM_REC_ANTERIOR|DT_INI|DT_FIN|NOME|CNPJ|...
+    return {"layout": "efd_contribuicoes", "dt_ini": decoded[6] if len(decoded) > 6 else None,
+            "dt_fin": decoded[7] if len(decoded) > 7 else None,
+            "nome": decoded[8] if len(decoded) > 8 else None,
+            "cnpj": decoded[9] if len(decoded) > 9 else None}
+
+def resumir_registros(registros: Iterator[Tuple[int, List[bytes]]]) -> dict:
+    """Per-block totals and structural validation in a single pass"""
+    erros: List[str] = []
+    total_erros = 0
+
+    def erro(mensagem: str):
+        nonlocal total_erros
+        total_erros += 1
+        if len(erros) < MAX_ERROS:
+            erros.append(mensagem)
+
+    cabecalho = {}
+    por_registro: Counter = Counter()
+    linhas_bloco: Counter = Counter()
+    declarado_bloco: Dict[str, int] = {}
+    declarado_registro: Dict[str, int] = {}
+    declarado_total = None
+    c100 = {"entradas": 0.0, "saidas": 0.0}
+    total_linhas = 0
+    primeiro = ultimo = None
+
+    for line_number, fields in registros:
+        total_linhas = line_number
+        if len(fields) < 3 or fields[0] != b"" or fields[-1] != b"":
+            erro(f"Linha {line_number}: registro fora do formato |REG|...|")
+            continue
+        registro = fields[1].decode(ENCODING)
+        bloco = registro[:1]
+        primeiro = primeiro or registro
+        ultimo = registro
+        por_registro[registro] += 1
+        linhas_bloco[bloco] += 1
+
+        try:
+            if registro == "0000":
+                cabecalho = parse_cabecalho(fields)
+            elif registro.endswith("990") and len(registro) == 4:
+                declarado_bloco[bloco] = int(fields[2])
+            elif registro == "9900":
+                declarado_registro[fields[2].decode(ENCODING)] = int(fields[3])
+            elif registro == "9999":
+                declarado_total = int(fields[2])
+            elif registro == "C100" and len(fields) > 12:
+                chave = "entradas" if fields[2] == b"0" else "saidas"
+                c100[chave] += parse_valor(fields[12])
+        except (ValueError, IndexError):
+            erro(f"Linha {line_number}: campos inválidos no registro {registro}")
+
+    if primeiro != "0000":
+        erro("Arquivo não inicia com o registro 0000")
+    if ultimo != "9999":
+        erro("Arquivo não termina com o registro 9999")
+    for bloco, declarado in sorted(declarado_bloco.items()):
+        if declarado != linhas_bloco[bloco]:
+            erro(f"Bloco {bloco}: {declarado} linhas declaradas, {linhas_bloco[bloco]} encontradas")
+    for registro, declarado in sorted(declarado_registro.items()):
+        if declarado != por_registro[registro]:
+            erro(f"Registro {registro}: {declarado} ocorrências declaradas no 9900, {por_registro[registro]} encontradas")
+    if declarado_total is not None and declarado_total != total_linhas:
+        erro(f"Registro 9999: {declarado_total} linhas declaradas, {total_linhas} encontradas")
+
+    return {
+        **cabecalho,
+        "total_linhas": total_linhas,
+        "blocos": {
+            bloco: {
+                "linhas": linhas,
+                "registros": {reg: qtd for reg, qtd in sorted(por_registro.items()) if reg.startswith(bloco)}
+            }
+            for bloco, linhas in sorted(linhas_bloco.items())
+        },
+        "totais_c100": {chave: round(valor, 2) for chave, valor in c100.items()},
+        "valido": total_erros == 0,
+        "total_erros": total_erros,
+        "erros": erros
+    }
+
+def resumir_arquivo_sped(path: str) -> dict:
+    """Summarize a SPED file without loading it in memory"""
+    with open(path, "rb") as file:
+        if file.seek(0, 2) == 0:
+            return resumir_registros(iter([]))
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return resumir_registros(iter_registros(buffer))
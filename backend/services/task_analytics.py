@@ -0,0 +1,138 @@
+from datetime import date, datetime, time
+from typing import Dict, List, Optional
+
+from database import get_tasks_collection
+from services.cache import TTLCache
+from services.user_directory import user_directory
+
+OPEN_TASK_STATUS = ["pendente", "em_andamento"]
+MS_PER_HOUR = 3600 * 1000
+
+# Keys include the day, so entries never outlive the day they were computed for
+analytics_cache = TTLCache(ttl=24 * 3600, maxsize=32)
+
+# Cycle times are counted in log-spaced buckets (16 per doubling, so a
+# percentile is within ~2% of the exact value) instead of pushing every
+# value: each group carries at most a few hundred counts, and counts of
+# different groups add up for the per-responsavel and overall figures.
+BUCKETS_PER_DOUBLING = 16
+# Shorter cycle times (including bad data with conclusao before criacao)
+# fall into the first bucket
+MIN_CYCLE_HOURS = 1 / 60
+
+def bucket_hours(bucket: int) -> float:
+    """Representative cycle time of a bucket (its geometric midpoint)"""
+    return 2 ** ((bucket + 0.5) / BUCKETS_PER_DOUBLING)
+
+def percentile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    """Percentile with linear interpolation over bucket counts"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    position = (total - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, total - 1)
+    fraction = position - lower
+    values = {}
+    seen = 0
+    for bucket in sorted(histogram):
+        count = histogram[bucket]
+        for rank in (lower, upper):
+            if rank not in values and rank < seen + count:
+                values[rank] = bucket_hours(bucket)
+        seen += count
+    return values[lower] + (values[upper] - values[lower]) * fraction
+
+def analytics_pipeline(today: date) -> List[dict]:
+    """One pass over tasks grouped by (responsavel_id, categoria)"""
+    today_start = datetime.combine(today, time.min)
+    is_open = {"$in": ["$status", OPEN_TASK_STATUS]}
+    is_done = {"$and": [{"$eq": ["$status", "concluida"]}, {"$gt": ["$data_conclusao", None]}]}
+    cycle_hours = {"$divide": [{"$subtract": ["$data_conclusao", "$data_criacao"]}, MS_PER_HOUR]}
+    cycle_bucket = {"$floor": {"$multiply": [
+        {"$log": [{"$max": [cycle_hours, MIN_CYCLE_HOURS]}, 2]}, BUCKETS_PER_DOUBLING
+    ]}}
+    return [
+        {"$group": {
+            "_id": {
+                "responsavel_id": "$responsavel_id",
+                "categoria": "$categoria",
+                "bucket": {"$cond": [is_done, cycle_bucket, None]}
+            },
+            "total": {"$sum": 1},
+            "abertas": {"$sum": {"$cond": [is_open, 1, 0]}},
+            "concluidas": {"$sum": {"$cond": [{"$eq": ["$status", "concluida"]}, 1, 0]}},
+            "atrasadas": {"$sum": {"$cond": [
+                {"$and": [is_open, {"$gt": ["$data_prazo", None]}, {"$lt": ["$data_prazo", today_start]}]}, 1, 0
+            ]}}
+        }},
+        {"$group": {
+            "_id": {"responsavel_id": "$_id.responsavel_id", "categoria": "$_id.categoria"},
+            "total": {"$sum": "$total"},
+            "abertas": {"$sum": "$abertas"},
+            "concluidas": {"$sum": "$concluidas"},
+            "atrasadas": {"$sum": "$atrasadas"},
+            "cycle_times": {"$push": {"$cond": [
+                {"$ne": ["$_id.bucket", None]},
+                {"bucket": "$_id.bucket", "count": "$total"},
+                "$$REMOVE"
+            ]}}
+        }}
+    ]
+
+def round_hours(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+def summarize(rows: List[dict]) -> dict:
+    cycle_times: Dict[int, int] = {}
+    for row in rows:
+        for entry in row["cycle_times"]:
+            bucket = int(entry["bucket"])
+            cycle_times[bucket] = cycle_times.get(bucket, 0) + entry["count"]
+    abertas = sum(row["abertas"] for row in rows)
+    atrasadas = sum(row["atrasadas"] for row in rows)
+    return {
+        "total": sum(row["total"] for row in rows),
+        "concluidas": sum(row["concluidas"] for row in rows),
+        "wip": abertas,
+        "atrasadas": atrasadas,
+        "overdue_ratio": round(atrasadas / abertas, 4) if abertas else 0.0,
+        "cycle_time_p50_horas": round_hours(percentile(cycle_times, 0.5)),
+        "cycle_time_p90_horas": round_hours(percentile(cycle_times, 0.9))
+    }
+
+async def compute_task_analytics(today: Optional[date] = None) -> dict:
+    """Workload and cycle-time analytics per responsavel and categoria"""
+    today = today or datetime.utcnow().date()
+    cached = analytics_cache.get(today)
+    if cached is not None:
+        return cached
+
+    tasks_collection = await get_tasks_collection()
+    rows = []
+    async for row in tasks_collection.aggregate(analytics_pipeline(today), allowDiskUse=True):
+        rows.append(row)
+
+    by_responsavel: Dict[str, List[dict]] = {}
+    by_categoria: Dict[str, List[dict]] = {}
+    for row in rows:
+        by_responsavel.setdefault(row["_id"]["responsavel_id"], []).append(row)
+        by_categoria.setdefault(row["_id"]["categoria"], []).append(row)
+
+    entries = await user_directory.resolve(by_responsavel.keys())
+    result = {
+        "data_referencia": today.isoformat(),
+        "geral": summarize(rows),
+        "por_responsavel": [
+            {
+                "responsavel_id": responsavel_id,
+                "responsavel_nome": entries[responsavel_id].name if responsavel_id in entries else None,
+                **summarize(group),
+                "por_categoria": {row["_id"]["categoria"]: summarize([row]) for row in group}
+            }
+            for responsavel_id, group in by_responsavel.items()
+        ],
+        "por_categoria": {categoria: summarize(group) for categoria, group in by_categoria.items()}
+    }
+    analytics_cache.set(today, result)
+    return result
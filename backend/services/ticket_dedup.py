@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import unicodedata
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from database import get_atendimento_collection
+
+logger = logging.getLogger(__name__)
+
+# 16 bands x 4 rows: a pair with Jaccard similarity s shares at least one band
+# with probability 1 - (1 - s^4)^16, about 64% at s = 0.5, 89% at 0.6 and 99%
+# at 0.7, so pairs just over the threshold are often missed
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+SHINGLE_SIZE = 5
+SIMILARITY_THRESHOLD = 0.5
+MAX_DUPLICADOS = 5
+
+DEDUP_OPEN_STATUS = ["aberto", "em_andamento", "aguardando_cliente"]
+TICKET_DEDUP_FIELDS = {"_id": 0, "id": 1, "empresa_id": 1, "titulo": 1, "descricao": 1, "status": 1, "updated_at": 1}
+
+# Universal hashing (a*x + b) mod p over 32-bit shingle hashes; products fit in uint64
+PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, (1 << 31) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, (1 << 31) - 1, size=NUM_PERM, dtype=np.uint64)
+
+def normalize_text(text: str) -> str:
+    """Lowercase, accents stripped, whitespace collapsed"""
+    normalized = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return " ".join(normalized.split())
+
+def shingles(text: str) -> np.ndarray:
+    text = normalize_text(text)
+    if len(text) <= SHINGLE_SIZE:
+        grams = {text} if text else set()
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature (NUM_PERM values), None for empty text"""
+    hashes = shingles(text)
+    if hashes.size == 0:
+        return None
+    return ((np.outer(_A, hashes) + _B[:, None]) % PRIME).min(axis=1)
+
+def ticket_text(ticket_data: dict) -> str:
+    return f"{ticket_data.get('titulo', '')} {ticket_data.get('descricao', '')}"
+
+BandKey = Tuple[str, int, bytes]
+
+class TicketDedupIndex:
+    """LSH index of open tickets, bucketed per empresa_id and band.
+
+    Per worker: tickets created or closed on another worker reach this
+    index only through refresh(), so a duplicate of a ticket opened
+    elsewhere less than one refresh interval ago is not flagged.
+    """
+
+    def __init__(self):
+        self._signatures: Dict[str, Tuple[str, np.ndarray]] = {}
+        self._buckets: Dict[BandKey, Set[str]] = {}
+        self._last_sync: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self._signatures)
+
+    @staticmethod
+    def _band_keys(empresa_id: str, sig: np.ndarray) -> List[BandKey]:
+        bands = sig.reshape(NUM_BANDS, ROWS_PER_BAND)
+        return [(empresa_id, band, bands[band].tobytes()) for band in range(NUM_BANDS)]
+
+    def add(self, ticket_data: dict, sig: Optional[np.ndarray] = None):
+        self.remove(ticket_data["id"])
+        sig = sig if sig is not None else signature(ticket_text(ticket_data))
+        if sig is None:
+            return
+        self._signatures[ticket_data["id"]] = (ticket_data["empresa_id"], sig)
+        for key in self._band_keys(ticket_data["empresa_id"], sig):
+            self._buckets.setdefault(key, set()).add(ticket_data["id"])
+
+    def remove(self, ticket_id: str):
+        entry = self._signatures.pop(ticket_id, None)
+        if entry is None:
+            return
+        for key in self._band_keys(*entry):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(ticket_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def track(self, ticket_data: dict):
+        """Index or drop a ticket after create/update according to its status"""
+        if ticket_data.get("status") in DEDUP_OPEN_STATUS:
+            self.add(ticket_data)
+        else:
+            self.remove(ticket_data["id"])
+
+    def query(self, empresa_id: str, sig: Optional[np.ndarray], exclude: Optional[str] = None) -> List[str]:
+        """Ids of open tickets of the company likely to describe the same issue"""
+        if sig is None:
+            return []
+        candidates: Set[str] = set()
+        for key in self._band_keys(empresa_id, sig):
+            candidates |= self._buckets.get(key, set())
+        candidates.discard(exclude)
+        scored = []
+        for ticket_id in candidates:
+            similarity = float(np.mean(self._signatures[ticket_id][1] == sig))
+            if similarity >= SIMILARITY_THRESHOLD:
+                scored.append((similarity, ticket_id))
+        scored.sort(reverse=True)
+        return [ticket_id for _, ticket_id in scored[:MAX_DUPLICADOS]]
+
+    def _advance(self, ticket_data: dict):
+        updated_at = ticket_data.get("updated_at")
+        if updated_at and (self._last_sync is None or updated_at > self._last_sync):
+            self._last_sync = updated_at
+
+    async def load(self):
+        """Rebuild the index from the open tickets"""
+        self._signatures = {}
+        self._buckets = {}
+        self._last_sync = None
+        atendimento_collection = await get_atendimento_collection()
+        async for ticket_data in atendimento_collection.find(
+            {"status": {"$in": DEDUP_OPEN_STATUS}}, TICKET_DEDUP_FIELDS
+        ):
+            self.add(ticket_data)
+            self._advance(ticket_data)
+        logger.info("Ticket dedup index loaded with %d tickets", len(self))
+
+    async def refresh(self):
+        """Pull tickets created, edited or closed since the last sync"""
+        if self._last_sync is None:
+            await self.load()
+            return
+        atendimento_collection = await get_atendimento_collection()
+        # $gte so writes sharing the last timestamp are not lost; track is idempotent
+        async for ticket_data in atendimento_collection.find(
+            {"updated_at": {"$gte": self._last_sync}}, TICKET_DEDUP_FIELDS
+        ):
+            self.track(ticket_data)
+            self._advance(ticket_data)
+
+    async def run(self, interval: float = 30.0):
+        """Poll for changes made by other workers until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Ticket dedup refresh failed")
+
+ticket_dedup = TicketDedupIndex()
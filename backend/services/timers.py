@@ -0,0 +1,73 @@
+import heapq
+import itertools
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+class TimerHeap:
+    """Min-heap of keyed timers with lazy cancellation.
+
+    Rescheduling a key bumps its generation; stale entries are dropped when
+    they reach the top of the heap instead of being searched for.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str, int, Any]] = []
+        self._generations: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._next_generation = itertools.count(1)
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, key: str):
+        return key in self._pending
+
+    def replace(self, key: str, timers: List[Tuple[datetime, Any]]):
+        """Replace all timers of a key"""
+        self.cancel(key)
+        if not timers:
+            return
+        generation = next(self._next_generation)
+        self._generations[key] = generation
+        self._pending[key] = len(timers)
+        for when, payload in timers:
+            heapq.heappush(self._heap, (when, next(self._counter), key, generation, payload))
+
+    def push(self, key: str, when: datetime, payload: Any = None):
+        """Schedule a single timer for a key, replacing previous ones"""
+        self.replace(key, [(when, payload)])
+
+    def cancel(self, key: str):
+        self._generations.pop(key, None)
+        self._pending.pop(key, None)
+
+    def clear(self):
+        self._heap = []
+        self._generations = {}
+        self._pending = {}
+
+    def _discard_stale(self):
+        while self._heap:
+            _, _, key, generation, _ = self._heap[0]
+            if self._generations.get(key) == generation:
+                return
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> Optional[datetime]:
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Tuple[str, datetime, Any]]:
+        """Pop every live timer due at or before now"""
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            when, _, key, _, payload = heapq.heappop(self._heap)
+            self._pending[key] -= 1
+            if self._pending[key] == 0:
+                self.cancel(key)
+            due.append((key, when, payload))
+        return due
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from database import get_users_collection
+
+logger = logging.getLogger(__name__)
+
+USER_DIRECTORY_FIELDS = {"_id": 0, "id": 1, "name": 1, "role": 1, "is_active": 1, "updated_at": 1}
+
+@dataclass(frozen=True)
+class DirectoryEntry:
+    id: str
+    name: str
+    role: str
+    is_active: bool
+
+class UserDirectory:
+    """Per-worker snapshot of the users collection (id -> name/role/active)"""
+
+    def __init__(self):
+        self._entries: Dict[str, DirectoryEntry] = {}
+        self._last_sync: Optional[datetime] = None
+
+    def upsert(self, user_data: dict):
+        """Store a user document in the snapshot.
+
+        Does not move the sync watermark: a local write says nothing about
+        older changes other workers made that refresh() has not pulled yet.
+        """
+        self._entries[user_data["id"]] = DirectoryEntry(
+            id=user_data["id"],
+            name=user_data["name"],
+            role=user_data["role"],
+            is_active=user_data.get("is_active", True)
+        )
+
+    def _advance(self, user_data: dict):
+        """Move the watermark to a document read from Mongo by load/refresh"""
+        updated_at = user_data.get("updated_at")
+        if updated_at and (self._last_sync is None or updated_at > self._last_sync):
+            self._last_sync = updated_at
+
+    async def load(self):
+        """Load the full directory (startup)"""
+        users_collection = await get_users_collection()
+        self._entries = {}
+        self._last_sync = None
+        async for user_data in users_collection.find({}, USER_DIRECTORY_FIELDS):
+            self.upsert(user_data)
+            self._advance(user_data)
+        logger.info("User directory loaded with %d users", len(self._entries))
+
+    async def refresh(self):
+        """Pull only users changed since the last sync"""
+        if self._last_sync is None:
+            await self.load()
+            return
+        users_collection = await get_users_collection()
+        # $gte so writes sharing the last timestamp are not lost; upsert is idempotent
+        query = {"updated_at": {"$gte": self._last_sync}}
+        async for user_data in users_collection.find(query, USER_DIRECTORY_FIELDS):
+            self.upsert(user_data)
+            self._advance(user_data)
+
+    async def run(self, interval: float = 30.0):
+        """Poll for changes until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("User directory refresh failed")
+
+    def get(self, user_id: str) -> Optional[DirectoryEntry]:
+        return self._entries.get(user_id)
+
+    def get_name(self, user_id: str, default: Optional[str] = None) -> Optional[str]:
+        entry = self._entries.get(user_id)
+        return entry.name if entry else default
+
+    async def resolve(self, ids: Iterable[str]) -> Dict[str, DirectoryEntry]:
+        """Resolve a batch of user ids; unknown ids are fetched in one query"""
+        wanted = set(i for i in ids if i)
+        missing = [i for i in wanted if i not in self._entries]
+        if missing:
+            users_collection = await get_users_collection()
+            async for user_data in users_collection.find({"id": {"$in": missing}}, USER_DIRECTORY_FIELDS):
+                self.upsert(user_data)
+        return {i: self._entries[i] for i in wanted if i in self._entries}
+
+user_directory = UserDirectory()
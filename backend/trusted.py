@@ -0,0 +1,43 @@
+import os
+from functools import lru_cache
+from typing import Any, List, Optional, Type, TypeVar
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from responses import JSON_MEDIA_TYPE, FastResponse, wants_msgpack
+
+M = TypeVar("M", bound=BaseModel)
+
+# Lists read from Mongo are validated once, in a single pydantic-core call, and
+# dumped straight to JSON bytes. Returned as models, FastAPI would check them
+# again against the route's response_model and encode them twice
+# (jsonable_encoder, then the response class). STRICT_READS=1 hands full lists
+# back to response_model, e.g. while debugging a response that looks wrong.
+STRICT_READS = os.getenv("STRICT_READS", "").lower() in ("1", "true", "yes")
+
+# Paged payloads ({"clients": [...], "total": n}): pydantic-core serializes the
+# models inside by their own class, still in one call
+_ENVELOPE_ADAPTER = TypeAdapter(Any)
+
+# Bounded: ?fields= builds partial models (fieldsets.partial_model, itself an
+# LRU of 256), and each one evicted there comes back as a new class
+@lru_cache(maxsize=512)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+def load_many(model: Type[M], docs: List[dict]) -> List[M]:
+    """Models of documents loaded from Mongo, validated in one batch"""
+    return _list_adapter(model).validate_python(docs)
+
+def list_response(model: Type[M], items: List[M], key: Optional[str] = None, **meta: Any) -> Response:
+    """Response of a list of `model`, serialized once (JSON bytes straight
+    from pydantic-core, or MessagePack when negotiated). With `key`, the
+    list is wrapped in an object next to the `meta` fields."""
+    if key is None:
+        adapter, content = _list_adapter(model), items
+    else:
+        adapter, content = _ENVELOPE_ADAPTER, {key: items, **meta}
+    if wants_msgpack():
+        return FastResponse(adapter.dump_python(content, mode="json"))
+    return Response(content=adapter.dump_json(content), media_type=JSON_MEDIA_TYPE, headers={"Vary": "Accept"})
@@ -24,7 +24,7 @@ import {
 } from 'lucide-react';
 
 const Atendimento = () => {
-  const { user, hasAccess } = useAuth();
+  const { hasAccess } = useAuth();
   const [tickets, setTickets] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
@@ -105,14 +105,10 @@ const Atendimento = () => {
     if (!novaConversa.trim()) return;
 
     try {
-      const conversaData = {
-        data: new Date().toISOString(),
-        usuario: user.name,
+      const response = await axios.post(`${API_URL}/api/atendimento/${selectedTicket.id}/conversas`, {
         mensagem: novaConversa
-      };
-
-      // Simular adição de conversa (implementação específica dependeria da API)
-      const updatedConversas = [...(selectedTicket.conversas || []), conversaData];
+      });
+      const updatedConversas = [...(selectedTicket.conversas || []), response.data];
       setSelectedTicket({...selectedTicket, conversas: updatedConversas});
       setNovaConversa('');
       toast.success('Conversa adicionada com sucesso!');
@@ -121,6 +117,17 @@ const Atendimento = () => {
     }
   };
 
+  const fetchConversas = async (ticket) => {
+    try {
+      const response = await axios.get(`${API_URL}/api/atendimento/${ticket.id}/conversas`);
+      // API returns newest first; the thread is displayed oldest first
+      setSelectedTicket({...ticket, conversas: [...response.data.conversas].reverse()});
+    } catch (error) {
+      console.error('Error fetching conversas:', error);
+      toast.error('Erro ao carregar conversas');
+    }
+  };
+
   const resetForm = () => {
     setFormData({
       empresa_id: '',
@@ -151,8 +158,9 @@ const Atendimento = () => {
   };
 
   const openConversaModal = (ticket) => {
-    setSelectedTicket(ticket);
+    setSelectedTicket({...ticket, conversas: []});
     setShowConversaModal(true);
+    fetchConversas(ticket);
   };
 
   const formatDate = (dateString) => {
@@ -24,6 +24,7 @@ import {
 const Fiscal = () => {
   const { user, hasAccess } = useAuth();
   const [obrigacoes, setObrigacoes] = useState([]);
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const [tipoFilter, setTipoFilter] = useState('');
@@ -55,6 +56,21 @@ const Fiscal = () => {
     }
   }, [searchTerm, tipoFilter, statusFilter]);
 
+  useEffect(() => {
+    if (hasAccess([], ['fiscal'])) {
+      fetchStats();
+    }
+  }, []);
+
+  const fetchStats = async () => {
+    try {
+      const response = await axios.get(`${API_URL}/api/fiscal/stats/dashboard`);
+      setStats(response.data);
+    } catch (error) {
+      console.error('Error fetching fiscal stats:', error);
+    }
+  };
+
   const fetchObrigacoes = async () => {
     try {
       setLoading(true);
@@ -92,6 +108,7 @@ const Fiscal = () => {
       setShowModal(false);
       resetForm();
       fetchObrigacoes();
+      fetchStats();
     } catch (error) {
       const message = error.response?.data?.detail || 'Erro ao salvar obrigação';
       toast.error(message);
@@ -107,6 +124,7 @@ const Fiscal = () => {
       await axios.delete(`${API_URL}/api/fiscal/${obrigacaoId}`);
       toast.success('Obrigação excluída com sucesso!');
       fetchObrigacoes();
+      fetchStats();
     } catch (error) {
       const message = error.response?.data?.detail || 'Erro ao excluir obrigação';
       toast.error(message);
@@ -316,7 +334,7 @@ const Fiscal = () => {
             <div>
               <p className="text-gray-400 text-sm">Pendentes</p>
               <p className="text-2xl font-bold text-yellow-400">
-                {obrigacoes.filter(o => o.status === 'pendente').length}
+                {stats?.status_stats?.pendente ?? 0}
               </p>
             </div>
             <div className="p-3 bg-yellow-500/20 rounded-xl">
@@ -330,7 +348,7 @@ const Fiscal = () => {
             <div>
               <p className="text-gray-400 text-sm">Em Andamento</p>
               <p className="text-2xl font-bold text-blue-400">
-                {obrigacoes.filter(o => o.status === 'em_andamento').length}
+                {stats?.status_stats?.em_andamento ?? 0}
               </p>
             </div>
             <div className="p-3 bg-blue-500/20 rounded-xl">
@@ -344,7 +362,7 @@ const Fiscal = () => {
             <div>
               <p className="text-gray-400 text-sm">Entregues</p>
               <p className="text-2xl font-bold text-green-400">
-                {obrigacoes.filter(o => o.status === 'entregue').length}
+                {stats?.status_stats?.entregue ?? 0}
               </p>
             </div>
             <div className="p-3 bg-green-500/20 rounded-xl">
@@ -358,7 +376,7 @@ const Fiscal = () => {
             <div>
               <p className="text-gray-400 text-sm">Atrasadas</p>
               <p className="text-2xl font-bold text-red-400">
-                {obrigacoes.filter(o => o.status === 'atrasado' || (o.status === 'pendente' && isVencimentoAtrasado(o.vencimento))).length}
+                {stats?.atrasadas ?? 0}
               </p>
             </div>
             <div className="p-3 bg-red-500/20 rounded-xl">
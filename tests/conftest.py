@@ -0,0 +1,24 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend runs from its own directory (flat imports) and reads these at import time
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+import database  # noqa: E402
+from tests.fake_mongo import FakeDatabase  # noqa: E402
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """A fresh in-memory database behind every get_*_collection()"""
+    fake = FakeDatabase()
+    monkeypatch.setattr(database.db, "database", fake)
+    return fake
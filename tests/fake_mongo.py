@@ -0,0 +1,214 @@
+"""In-memory stand-in for the motor database, covering the queries the
+inbound pipeline runs. Writes are recorded so tests can check how they
+were grouped."""
+import copy
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+_MISSING = object()
+
+def _values(doc: dict, field: str) -> List[Any]:
+    """Values a query on `field` compares against (array members included)"""
+    value = doc.get(field, _MISSING)
+    if value is _MISSING:
+        return []
+    if isinstance(value, list):
+        return value + [value]
+    return [value]
+
+def _matches_condition(doc: dict, field: str, condition: Any) -> bool:
+    values = _values(doc, field)
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return condition in values or (condition is None and not values)
+    for operator, operand in condition.items():
+        if operator == "$in":
+            ok = any(value in operand for value in values) or (None in operand and not values)
+        elif operator == "$ne":
+            ok = operand not in values and not (operand is None and not values)
+        elif operator == "$exists":
+            ok = bool(values) == operand
+        elif operator in ("$lt", "$lte", "$gt", "$gte"):
+            compare = {
+                "$lt": lambda a, b: a < b, "$lte": lambda a, b: a <= b,
+                "$gt": lambda a, b: a > b, "$gte": lambda a, b: a >= b
+            }[operator]
+            ok = any(value is not None and not isinstance(value, list) and compare(value, operand) for value in values)
+        else:
+            raise NotImplementedError(operator)
+        if not ok:
+            return False
+    return True
+
+def matches(doc: dict, query: Optional[dict]) -> bool:
+    for field, condition in (query or {}).items():
+        if field == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif field == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif not _matches_condition(doc, field, condition):
+            return False
+    return True
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    included = {field for field, flag in projection.items() if flag and field != "_id"}
+    if included:
+        return {field: value for field, value in doc.items() if field in included}
+    return {field: value for field, value in doc.items() if projection.get(field, 1)}
+
+def apply_update(doc: dict, update: dict, inserting: bool = False):
+    for operator, fields in update.items():
+        for field, value in fields.items():
+            if operator == "$set" or (operator == "$setOnInsert" and inserting):
+                doc[field] = copy.deepcopy(value)
+            elif operator == "$unset":
+                doc.pop(field, None)
+            elif operator == "$inc":
+                doc[field] = doc.get(field, 0) + value
+            elif operator == "$max":
+                if doc.get(field) is None or value > doc[field]:
+                    doc[field] = value
+            elif operator == "$push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                doc[field] = doc.get(field, []) + list(items)
+                if isinstance(value, dict) and "$slice" in value:
+                    doc[field] = doc[field][value["$slice"]:]
+            elif operator != "$setOnInsert":
+                raise NotImplementedError(operator)
+
+class FakeCursor:
+    def __init__(self, docs: List[dict]):
+        self._docs = docs
+
+    def sort(self, key, direction: int = 1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda doc: (doc.get(field) is not None, doc.get(field)), reverse=order < 0)
+        return self
+
+    def limit(self, count: int):
+        self._docs = self._docs[:count] if count else self._docs
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        return self._docs if length is None else self._docs[:length]
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self) -> dict:
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.docs: List[dict] = []
+        self.unique: List[str] = []
+        # Every bulk_write/insert_many call, as the list of its documents or operations
+        self.bulk_writes: List[list] = []
+        self.insert_manys: List[List[dict]] = []
+
+    async def create_index(self, keys, unique: bool = False, **kwargs):
+        if unique and isinstance(keys, str):
+            self.unique.append(keys)
+
+    def _check_unique(self, doc: dict):
+        for field in self.unique:
+            value = doc.get(field)
+            if value is not None and any(other.get(field) == value for other in self.docs):
+                raise DuplicateKeyError(f"E11000 duplicate key {field}: {value}", 11000)
+
+    def _insert(self, doc: dict):
+        self._check_unique(doc)
+        self.docs.append(copy.deepcopy(doc))
+
+    def _update(self, query: dict, update: dict, upsert: bool = False) -> bool:
+        for doc in self.docs:
+            if matches(doc, query):
+                apply_update(doc, update)
+                return True
+        if upsert:
+            doc = {field: value for field, value in query.items() if not field.startswith("$") and not isinstance(value, dict)}
+            apply_update(doc, update, inserting=True)
+            self._insert(doc)
+        return False
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None) -> FakeCursor:
+        return FakeCursor([project(doc, projection) for doc in self.docs if matches(doc, query)])
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None, sort=None) -> Optional[dict]:
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        docs = await cursor.to_list()
+        return docs[0] if docs else None
+
+    async def distinct(self, field: str, query: Optional[dict] = None) -> List[Any]:
+        values = []
+        for doc in self.docs:
+            if matches(doc, query) and doc.get(field) is not None and doc[field] not in values:
+                values.append(doc[field])
+        return values
+
+    async def count_documents(self, query: dict, **kwargs) -> int:
+        return sum(1 for doc in self.docs if matches(doc, query))
+
+    async def insert_one(self, doc: dict):
+        self._insert(doc)
+
+    async def insert_many(self, docs: List[dict], ordered: bool = True):
+        self.insert_manys.append(copy.deepcopy(docs))
+        errors = []
+        for index, doc in enumerate(docs):
+            try:
+                self._insert(doc)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        matched = self._update(query, update, upsert)
+        return SimpleNamespace(matched_count=int(matched), modified_count=int(matched))
+
+    async def delete_one(self, query: dict):
+        for index, doc in enumerate(self.docs):
+            if matches(doc, query):
+                del self.docs[index]
+                return
+
+    async def bulk_write(self, operations: list, ordered: bool = True):
+        self.bulk_writes.append(list(operations))
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                self._insert(operation._doc)
+            elif isinstance(operation, UpdateOne):
+                self._update(operation._filter, operation._doc, operation._upsert)
+            else:
+                raise NotImplementedError(type(operation).__name__)
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    __getitem__ = __getattr__
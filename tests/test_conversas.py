@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import pytest
+
+import database
+
+pytestmark = pytest.mark.anyio
+
+LEGACY_TICKET = {
+    "id": "ticket-1",
+    "titulo": "Guia do DAS",
+    "status": "aberto",
+    "conversas": [
+        {"id": "c1", "data": datetime(2026, 3, 2, 9, 0), "usuario": "Cliente", "mensagem": "Bom dia"},
+        {"data": datetime(2026, 3, 2, 9, 30), "usuario": "Ana", "mensagem": "Segue a guia"}
+    ]
+}
+
+async def test_embedded_conversas_move_to_their_collection_once(fake_db):
+    await database.create_indexes()
+    await fake_db.atendimento.insert_one(LEGACY_TICKET)
+    await fake_db.atendimento.insert_one({"id": "ticket-2", "titulo": "Novo", "status": "aberto", "conversas_count": 1})
+
+    assert await database.migrate_embedded_conversas() == 1
+    assert await database.migrate_embedded_conversas() == 0
+
+    ticket, novo = fake_db.atendimento.docs
+    assert "conversas" not in ticket
+    assert ticket["conversas_count"] == 2
+    assert ticket["last_interaction_at"] == datetime(2026, 3, 2, 9, 30)
+    assert novo["conversas_count"] == 1
+    conversas = fake_db.atendimento_conversas.docs
+    assert [conversa["mensagem"] for conversa in conversas] == ["Bom dia", "Segue a guia"]
+    # Messages without an id get a stable one, so a rerun cannot duplicate them
+    assert [conversa["id"] for conversa in conversas] == ["c1", "ticket-1:1"]
+    assert all(conversa["ticket_id"] == "ticket-1" for conversa in conversas)
+
+async def test_interrupted_migration_counts_messages_once(fake_db):
+    await database.create_indexes()
+    await fake_db.atendimento.insert_one(LEGACY_TICKET)
+    # Messages inserted, ticket not yet updated
+    await database.insert_many_idempotent(
+        fake_db.atendimento_conversas,
+        [{**LEGACY_TICKET["conversas"][0], "ticket_id": "ticket-1"}]
+    )
+
+    await database.migrate_embedded_conversas()
+
+    assert fake_db.atendimento.docs[0]["conversas_count"] == 2
+    assert len(fake_db.atendimento_conversas.docs) == 2
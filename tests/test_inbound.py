@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo import UpdateOne
+
+import database
+import routes.atendimento
+import server
+from services import inbound
+from services.inbound import InboundQueue, commit_batch, parse_fake, plan_batch, reprocessar_falhas, write_plan
+
+pytestmark = pytest.mark.anyio
+
+PADARIA = {
+    "id": "cliente-1",
+    "nome_empresa": "Padaria Central",
+    "cidade": "jacobina",
+    "status": "ativa",
+    "email": "contato@padaria.com",
+    "whatsapp": "+55 (74) 99123-4567"
+}
+
+def whatsapp(mensagem: str, externo_id: str, remetente: str = "5574991234567") -> dict:
+    return {"canal": "whatsapp", "remetente": remetente, "mensagem": mensagem, "externo_id": externo_id}
+
+def email(mensagem: str, externo_id: str, remetente: str = "alguem@desconhecido.com") -> dict:
+    return {"canal": "email", "remetente": remetente, "mensagem": mensagem, "assunto": "Boleto", "externo_id": externo_id}
+
+@pytest.fixture
+async def db(fake_db):
+    await database.create_indexes()
+    await fake_db.clients.insert_one(PADARIA)
+    inbound.contatos_cache.clear()
+    return fake_db
+
+def tickets_by_remetente(db) -> dict:
+    return {ticket["remetente"]: ticket for ticket in db.atendimento.docs}
+
+async def test_new_senders_open_tickets_and_known_senders_append(db):
+    result = await commit_batch(parse_fake([
+        whatsapp("Bom dia", "w1"),
+        whatsapp("Preciso da guia do DAS", "w2"),
+        email("Segunda via do boleto", "e1")
+    ]))
+
+    assert result == {"tickets": 2, "conversas": 3}
+    tickets = tickets_by_remetente(db)
+    # Phone numbers are matched on their last 8 digits
+    assert tickets["91234567"]["empresa_id"] == PADARIA["id"]
+    assert tickets["91234567"]["conversas_count"] == 2
+    assert tickets["alguem@desconhecido.com"]["empresa"] == inbound.NAO_IDENTIFICADO
+    assert tickets["alguem@desconhecido.com"]["titulo"] == "Boleto"
+
+    result = await commit_batch(parse_fake([whatsapp("Ainda aguardo", "w3", remetente="557491234567")]))
+
+    assert result == {"tickets": 0, "conversas": 1}
+    assert len(db.atendimento.docs) == 2
+    assert tickets_by_remetente(db)["91234567"]["conversas_count"] == 3
+    ticket_id = tickets["91234567"]["id"]
+    assert sorted(c["externo_id"] for c in db.atendimento_conversas.docs if c["ticket_id"] == ticket_id) == ["w1", "w2", "w3"]
+
+async def test_redelivered_messages_are_skipped(db):
+    await commit_batch(parse_fake([whatsapp("Bom dia", "w1")]))
+
+    result = await commit_batch(parse_fake([whatsapp("Bom dia", "w1"), whatsapp("Bom dia", "w1")]))
+
+    assert result == {"tickets": 0, "conversas": 0}
+    assert len(db.atendimento_conversas.docs) == 1
+    assert db.atendimento.docs[0]["conversas_count"] == 1
+
+async def test_batch_is_one_bulk_write_and_one_insert_many(db):
+    await commit_batch(parse_fake([whatsapp("Bom dia", "w1")]))
+    db.atendimento.bulk_writes.clear()
+    db.atendimento_conversas.insert_manys.clear()
+
+    await commit_batch(parse_fake([
+        whatsapp("Segue o comprovante", "w2"),
+        whatsapp("E a nota", "w3"),
+        email("Segunda via do boleto", "e1"),
+        email("Outro assunto", "e2", remetente="outro@desconhecido.com")
+    ]))
+
+    assert len(db.atendimento.bulk_writes) == 1
+    operations = db.atendimento.bulk_writes[0]
+    assert all(isinstance(operation, UpdateOne) for operation in operations)
+    upserts = [operation for operation in operations if operation._upsert]
+    increments = [operation for operation in operations if not operation._upsert]
+    # One upsert per new sender, one $inc per existing ticket however many messages it got
+    assert len(upserts) == 2
+    assert len(increments) == 1
+    assert increments[0]._doc["$inc"] == {"conversas_count": 2}
+    assert len(db.atendimento_conversas.insert_manys) == 1
+    assert len(db.atendimento_conversas.insert_manys[0]) == 4
+
+async def test_retried_plan_is_applied_once(db):
+    await commit_batch(parse_fake([whatsapp("Bom dia", "w1")]))
+    plan = await plan_batch(parse_fake([whatsapp("Segue o comprovante", "w2"), email("Boleto", "e1")]))
+
+    await write_plan(plan)
+    await write_plan(plan)
+
+    tickets = tickets_by_remetente(db)
+    assert len(tickets) == 2
+    assert tickets["91234567"]["conversas_count"] == 2
+    assert tickets["alguem@desconhecido.com"]["conversas_count"] == 1
+    assert len(db.atendimento_conversas.docs) == 3
+
+async def test_failed_batch_is_retried_then_dead_lettered_and_replayed(db, monkeypatch):
+    bulk_write = db.atendimento.bulk_write
+    calls = []
+
+    async def failing_bulk_write(operations, ordered=True):
+        calls.append(operations)
+        raise ConnectionError("mongo down")
+
+    monkeypatch.setattr(db.atendimento, "bulk_write", failing_bulk_write)
+    queue = InboundQueue(retries=2, backoff=0)
+
+    await queue._commit(parse_fake([whatsapp("Bom dia", "w1"), email("Boleto", "e1")]))
+
+    assert len(calls) == 3
+    assert db.atendimento.docs == []
+    [falha] = db.atendimento_inbound_falhas.docs
+    assert [message["externo_id"] for message in falha["mensagens"]] == ["w1", "e1"]
+    assert "mongo down" in falha["erro"]
+
+    monkeypatch.setattr(db.atendimento, "bulk_write", bulk_write)
+    assert await reprocessar_falhas() == {"reprocessadas": 1, "pendentes": 0}
+
+    assert db.atendimento_inbound_falhas.docs == []
+    assert len(db.atendimento.docs) == 2
+    # Replayed from the stored plan: same tickets and conversas as the failed attempt
+    assert {ticket["id"] for ticket in db.atendimento.docs} == {ticket["id"] for ticket in falha["plano"]["novos"]}
+    assert len(db.atendimento_conversas.docs) == 2
+
+async def test_queue_commits_offered_messages(db):
+    queue = InboundQueue(flush_interval=0)
+    assert queue.offer(parse_fake([whatsapp("Bom dia", "w1"), whatsapp("Tudo bem?", "w2")]))
+
+    task = asyncio.create_task(queue.run())
+    for _ in range(100):
+        if len(db.atendimento_conversas.docs) == 2:
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert len(db.atendimento.docs) == 1
+    assert db.atendimento.docs[0]["conversas_count"] == 2
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(routes.atendimento, "INBOUND_WEBHOOK_TOKEN", "segredo")
+    monkeypatch.setattr(routes.atendimento, "inbound_queue", InboundQueue(maxsize=3))
+    # No lifespan: the queue is not consumed, so it fills up
+    return TestClient(server.app)
+
+def post_fake(client, messages):
+    return client.post("/api/atendimento/inbound/fake", json=messages, headers={"X-Webhook-Token": "segredo"})
+
+def test_inbound_is_accepted_until_the_queue_is_full(client):
+    response = post_fake(client, [whatsapp("Bom dia", "w1"), whatsapp("Tudo bem?", "w2")])
+    assert response.status_code == 202
+    assert response.json() == {"recebidas": 2}
+
+    response = post_fake(client, [whatsapp("Oi", "w3"), whatsapp("Alô", "w4")])
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    assert post_fake(client, [whatsapp("Oi", "w3")]).status_code == 202
+
+def test_payload_larger_than_the_queue_is_rejected(client):
+    response = post_fake(client, [whatsapp(f"Mensagem {i}", f"w{i}") for i in range(4)])
+    assert response.status_code == 413
@@ -0,0 +1,17 @@
+import pytest
+
+from responses import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, negotiate
+
+@pytest.mark.parametrize("accept, expected", [
+    ("", JSON_MEDIA_TYPE),
+    ("*/*", JSON_MEDIA_TYPE),
+    ("application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=0, application/json", JSON_MEDIA_TYPE),
+    ("application/json, application/msgpack", JSON_MEDIA_TYPE),
+    ("application/json;q=0.5, application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/*;q=0.2, application/msgpack;q=0.9", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=0.1, */*", JSON_MEDIA_TYPE),
+    ("text/html", JSON_MEDIA_TYPE)
+])
+def test_negotiate_follows_accept_quality(accept, expected):
+    assert negotiate(accept) == expected
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from services.simples_nacional import ANEXOS, calcular_das, calcular_rbt12
+
+ANEXO_I = ANEXOS.index("I")
+ANEXO_III = ANEXOS.index("III")
+
+def das(rbt12: float, receita_mes: float, anexo: int) -> tuple:
+    efetiva, valor = calcular_das(np.array([rbt12]), np.array([receita_mes]), np.array([anexo]))
+    return float(efetiva[0]), float(valor[0])
+
+def test_bracket_upper_bound_is_inclusive_and_rates_are_continuous():
+    # "Até 180.000,00": the bound itself is still in the first bracket
+    assert das(180_000.00, 10_000.00, ANEXO_I) == (0.04, 400.00)
+    # Just above it the second bracket applies, and its parcela a deduzir
+    # keeps the effective rate continuous
+    efetiva, valor = das(180_000.01, 10_000.00, ANEXO_I)
+    assert efetiva == pytest.approx(0.04)
+    assert valor == 400.00
+    assert das(360_000.00, 10_000.00, ANEXO_I)[0] == pytest.approx((360_000 * 0.073 - 5_940) / 360_000)
+
+def test_effective_rate_inside_a_bracket():
+    efetiva, valor = das(500_000.00, 40_000.00, ANEXO_III)
+
+    assert efetiva == pytest.approx((500_000 * 0.135 - 17_640) / 500_000)
+    assert valor == 3_988.80
+
+def test_rbt12_uses_the_last_twelve_months():
+    rbt12 = calcular_rbt12(np.array([30_000.0]), np.array([420_000.0]), np.array([12]))
+
+    assert rbt12.tolist() == [420_000.0]
+
+def test_rbt12_is_proportional_with_less_than_twelve_months():
+    rbt12 = calcular_rbt12(np.array([30_000.0]), np.array([60_000.0]), np.array([3]))
+
+    assert rbt12.tolist() == [240_000.0]
+
+def test_first_month_annualizes_the_month_revenue():
+    rbt12 = calcular_rbt12(np.array([50_000.0]), np.array([0.0]), np.array([0]))
+    assert rbt12.tolist() == [600_000.0]
+
+    # Taxed in the third bracket, not at the first bracket's nominal rate
+    efetiva, valor = das(rbt12[0], 50_000.00, ANEXO_I)
+    assert efetiva == pytest.approx((600_000 * 0.095 - 13_860) / 600_000)
+    assert valor == 3_595.00
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+import services.sla
+from services.sla import SLA_PADRAO, calcular_sla, carregar_config_sla
+
+pytestmark = pytest.mark.anyio
+
+def stored_config(monkeypatch, config: dict):
+    async def get_configuracao(setor, nome, default=None):
+        return config
+    monkeypatch.setattr(services.sla, "get_configuracao", get_configuracao)
+
+async def test_stored_config_overrides_the_defaults(monkeypatch):
+    stored_config(monkeypatch, {"fim_expediente": "17:00", "prazos_horas": {"urgente": 2}})
+
+    config = await carregar_config_sla()
+
+    assert config["fim_expediente"] == "17:00"
+    assert config["prazos_horas"] == {**SLA_PADRAO["prazos_horas"], "urgente": 2}
+
+@pytest.mark.parametrize("config", [
+    {"inicio_expediente": "18:00", "fim_expediente": "08:00"},
+    {"inicio_expediente": "08:00", "fim_expediente": "08:00"},
+    {"fim_expediente": "25:00"},
+    {"inicio_expediente": 8},
+    {"utc_offset_horas": "abc"},
+    {"prazos_horas": {"media": 0}},
+    {"prazos_horas": {"alta": -4}},
+    {"prazos_horas": {"baixa": "40"}},
+    {"prazos_horas": {"baixa": 10 ** 9}},
+    {"prazos_horas": ["urgente"]}
+])
+async def test_invalid_config_falls_back_to_the_defaults(monkeypatch, config):
+    stored_config(monkeypatch, config)
+
+    assert await carregar_config_sla() == SLA_PADRAO
+
+def test_deadline_counts_business_hours_only():
+    # Friday 17:00 local (20:00 UTC): 1h left that day, 3h on Monday from 08:00
+    aberto_em = datetime(2026, 10, 16, 20, 0)
+
+    assert calcular_sla(aberto_em, "urgente", SLA_PADRAO) == datetime(2026, 10, 19, 14, 0)
+
+def test_inverted_business_hours_are_rejected_instead_of_looping():
+    config = {**SLA_PADRAO, "inicio_expediente": "18:00", "fim_expediente": "08:00"}
+
+    with pytest.raises(ValueError):
+        calcular_sla(datetime(2026, 10, 16, 12, 0), "media", config)
+
+def test_walk_is_bounded():
+    config = {**SLA_PADRAO, "prazos_horas": {"media": 10 ** 6}}
+
+    with pytest.raises(ValueError):
+        calcular_sla(datetime(2026, 10, 16, 12, 0), "media", config)